@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Performance benchmarks for tdparser.
+
+These are not part of the test suite; run them as modules from the root of
+the repository, e.g.::
+
+    $ python -m benchmarks.lex_scaling
+"""
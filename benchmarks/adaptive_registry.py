@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare TokenRegistry and AdaptiveTokenRegistry on skewed token streams.
+
+The grammar registers many keywords before identifiers and numbers, whereas
+the text is mostly made of identifiers and numbers.
+
+Usage::
+
+    $ python -m benchmarks.adaptive_registry
+"""
+
+from __future__ import print_function, unicode_literals
+
+import random
+import re
+
+import tdparser
+from tdparser import lexer as tdparser_lexer
+
+from . import common
+
+
+OPERATORS = ['+', '-', '*', '/', '**', '<', '<=', '>', '>=', '==', '!=', '=',
+    '(', ')', ',', ';', ':', '.']
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def make_grammar(nb_keywords, rng):
+    """Build the (token class, regexp) rules and keyword samples."""
+    keywords = set()
+    while len(keywords) < nb_keywords:
+        keywords.add(''.join(rng.choice(LETTERS) for _i in range(rng.randint(2, 6))))
+    keywords = sorted(keywords)
+
+    rules = keywords + [re.escape(op) for op in OPERATORS] + [
+        r'\d+(?:\.\d+)?',
+        r'[a-zA-Z_][a-zA-Z0-9_]*',
+    ]
+    classes = [type(str('Token%d' % i), (tdparser.Token,), {})
+        for i in range(len(rules))]
+    return list(zip(classes, rules)), keywords
+
+
+def make_text(keywords, size, rng, skew):
+    """Build a text where a `skew` fraction of tokens are identifiers or numbers."""
+    parts = []
+    length = 0
+    while length < size:
+        if rng.random() < skew:
+            if rng.random() < 0.7:
+                part = ''.join(rng.choice(LETTERS) for _i in range(rng.randint(4, 12)))
+            else:
+                part = '%d' % rng.randint(0, 100000)
+        elif rng.random() < 0.5:
+            part = rng.choice(keywords)
+        else:
+            part = rng.choice(OPERATORS)
+        parts.append(part)
+        length += len(part) + 1
+    return ' '.join(parts)
+
+
+def time_lookups(registry_class, rules, text, starts):
+    """Time the get_token() calls of lexing text, without building tokens."""
+    registry = registry_class()
+    for token_class, regexp in rules:
+        registry.register(token_class, regexp)
+
+    def lookups():
+        for start in starts:
+            registry.get_token(text, start)
+
+    lookups()
+    return common.best_of(lookups, repeat=5)
+
+
+def run(size=100 * 1024):
+    print("%8s %6s %20s %20s" % ("", "", "lex (s)", "get_token (s)"))
+    print("%8s %6s %10s %9s %10s %9s" % (
+        "keywords", "skew", "base", "adaptive", "base", "adaptive"))
+    for nb_keywords in (10, 50, 200):
+        rng = random.Random(nb_keywords)
+        rules, keywords = make_grammar(nb_keywords, rng)
+        for skew in (0.5, 0.9, 0.99):
+            text = make_text(keywords, size, random.Random(0), skew)
+
+            lex_timings = []
+            lookup_timings = []
+            results = []
+            for registry_class in (tdparser_lexer.TokenRegistry,
+                    tdparser_lexer.AdaptiveTokenRegistry):
+                lexer = tdparser.Lexer(registry_class=registry_class)
+                for token_class, regexp in rules:
+                    lexer.register_token(token_class, regexp)
+                tokens = list(lexer.lex(text))
+                results.append([(token.__class__, token.text) for token in tokens])
+                lex_timings.append(common.best_of(lambda: list(lexer.lex(text)), repeat=5))
+                starts = [token.start for token in tokens[:-1]]
+                lookup_timings.append(time_lookups(registry_class, rules, text, starts))
+
+            assert results[0] == results[1]
+            print("%8d %6.2f %10.3f %9.3f %10.3f %9.3f" % (
+                nb_keywords, skew, lex_timings[0], lex_timings[1],
+                lookup_timings[0], lookup_timings[1]))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Shared helpers for the benchmarks."""
+
+from __future__ import print_function, unicode_literals
+
+import timeit
+
+import tdparser
+
+
+class Integer(tdparser.Token):
+    regexp = r'\d+'
+
+    def nud(self, context):
+        return int(self.text)
+
+
+class Addition(tdparser.Token):
+    regexp = r'\+'
+    lbp = 10
+
+    def led(self, left, context):
+        return left + context.expression(self.lbp)
+
+
+class Substraction(tdparser.Token):
+    regexp = r'-'
+    lbp = 10
+
+    def nud(self, context):
+        return - context.expression(self.lbp)
+
+    def led(self, left, context):
+        return left - context.expression(self.lbp)
+
+
+class Multiplication(tdparser.Token):
+    regexp = r'\*'
+    lbp = 20
+
+    def led(self, left, context):
+        return left * context.expression(self.lbp)
+
+
+ARITHMETIC_TOKENS = (Integer, Addition, Substraction, Multiplication)
+
+
+def arithmetic_lexer(**kwargs):
+    """Build a Lexer for simple arithmetic expressions."""
+    lexer = tdparser.Lexer(with_parens=True, **kwargs)
+    lexer.register_tokens(*ARITHMETIC_TOKENS)
+    return lexer
+
+
+def arithmetic_text(size):
+    """Build an arithmetic expression of (about) `size` characters."""
+    chunk = '(12 + 3) * 45 - 6 * (78 - 9) + '
+    repeat = max(1, size // len(chunk))
+    return chunk * repeat + '1'
+
+
+def best_of(func, repeat=3):
+    """Run `func` `repeat` times, return the fastest wall-clock time."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def format_size(size):
+    """Human-readable version of a size in bytes."""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024.0
+    return '%.1f GB' % size
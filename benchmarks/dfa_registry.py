@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare the lexing throughput of token registries, including DFATokenRegistry.
+
+Two grammars are lexed:
+- log: log lines, where many regexps (dates, times, addresses, sizes, ...)
+  start with the same characters;
+- keywords: the benchmarks.registry_fusion grammar, where most token classes
+  are keywords.
+
+Usage::
+
+    $ python -m benchmarks.dfa_registry
+"""
+
+from __future__ import print_function, unicode_literals
+
+import random
+import time
+
+import tdparser
+from tdparser import dfa
+from tdparser import lexer as tdparser_lexer
+
+from . import common
+from . import registry_fusion
+
+
+LOG_RULES = [
+    (r'\d{4}-\d{2}-\d{2}', '2013-09-14'),
+    (r'\d{2}:\d{2}:\d{2}(?:\.\d+)?', '12:30:05.123'),
+    (r'\d+\.\d+\.\d+\.\d+(?::\d+)?', '10.0.0.1:8080'),
+    (r'\d+\.\d+\.\d+', '1.2.3'),
+    (r'0x[0-9a-f]+', '0xdeadbeef'),
+    (r'\d+\.\d+', '3.14'),
+    (r'\d+(?:ms|us|ns|s)', '25ms'),
+    (r'\d+[KMG]B', '512MB'),
+    (r'\d+%', '99%'),
+    (r'\d+', '42'),
+    (r'[A-Z][A-Z]+', 'ERROR'),
+    (r'[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)+', 'app.module.func'),
+    (r'[a-z_][a-zA-Z0-9_]*', 'user_id'),
+    (r'[A-Z][a-zA-Z0-9]*', 'Request'),
+    (r'"[^"]*"', '"GET /index.html"'),
+    (r'\[[^\]]*\]', '[worker-1]'),
+    (r'[-=:,/()]', '='),
+]
+
+REGISTRIES = (
+    ('TokenRegistry', tdparser_lexer.TokenRegistry),
+    ('Compiled', tdparser_lexer.CompiledTokenRegistry),
+    ('DFA', dfa.DFATokenRegistry),
+)
+
+
+def log_grammar(size):
+    rules = [(type(str('Log%d' % i), (tdparser.Token,), {}), regexp)
+        for i, (regexp, _sample) in enumerate(LOG_RULES)]
+    samples = [sample for _regexp, sample in LOG_RULES]
+    return rules, registry_fusion.make_text(samples, size, random.Random(0))
+
+
+def keywords_grammar(size):
+    rules, samples = registry_fusion.make_grammar(200, random.Random(200))
+    lexer = tdparser.Lexer()
+    for token_class, regexp in rules:
+        lexer.register_token(token_class, regexp)
+    lexable = [sample for sample in samples if lexer.tokens.get_token(sample)[0] is not None]
+    return rules, registry_fusion.make_text(lexable, size, random.Random(0))
+
+
+def run(size=100 * 1024):
+    print("%8s %14s %10s %10s %10s" % ("grammar", "registry", "build (ms)", "lex (s)", "MB/s"))
+    for name, grammar in (('log', log_grammar), ('keywords', keywords_grammar)):
+        rules, text = grammar(size)
+        results = []
+        for registry_name, registry_class in REGISTRIES:
+            lexer = tdparser.Lexer(registry_class=registry_class)
+            for token_class, regexp in rules:
+                lexer.register_token(token_class, regexp)
+
+            begin = time.time()
+            lexer.tokens.get_token('')
+            build = time.time() - begin
+
+            results.append([(token.__class__, token.text) for token in lexer.lex(text)])
+            timing = common.best_of(lambda: list(lexer.lex(text)))
+            print("%8s %14s %10.1f %10.3f %10.2f" % (
+                name, registry_name, build * 1000, timing, len(text) / timing / 1e6))
+            if registry_class is dfa.DFATokenRegistry:
+                for token_class, pattern, reason in lexer.tokens.fallbacks():
+                    print("    fallback: %s (%s)" % (pattern, reason))
+
+        assert all(result == results[0] for result in results)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare the lexing throughput of lexers and their frozen copies.
+
+The grammars are those of benchmarks.dfa_registry, and the ~150 regexps
+(mostly keywords followed by a lookahead) of benchmarks.grammar_cache.
+Freezing is timed along with lexing, as well as unpickling the frozen lexer
+for the latter grammar, whose token classes are importable; the tokens of
+both lexers are checked to be the same.
+
+Usage::
+
+    $ python -m benchmarks.frozen_lexer
+"""
+
+from __future__ import print_function, unicode_literals
+
+import pickle
+import random
+import time
+
+import tdparser
+from tdparser import lexer as tdparser_lexer
+
+from . import common
+from . import dfa_registry
+from . import grammar_cache
+from . import registry_fusion
+
+
+def regexps_grammar(size):
+    rules = list(zip(grammar_cache.TOKEN_CLASSES, grammar_cache.RULES))
+    samples = [regexp.split('(')[0] for regexp in grammar_cache.RULES
+        if regexp.endswith('(?![a-zA-Z0-9_])')]
+    samples += [sample for _regexp, sample in dfa_registry.LOG_RULES]
+    return rules, registry_fusion.make_text(samples, size, random.Random(0))
+
+
+def run(size=100 * 1024):
+    print("%8s %14s %11s %10s %10s %10s" % (
+        "grammar", "lexer", "build (ms)", "load (ms)", "lex (s)", "MB/s"))
+    for name, grammar in (('log', dfa_registry.log_grammar),
+            ('keywords', dfa_registry.keywords_grammar),
+            ('regexps', regexps_grammar)):
+        rules, text = grammar(size)
+        lexer = tdparser.Lexer(registry_class=tdparser_lexer.TokenRegistry)
+        for token_class, regexp in rules:
+            lexer.register_token(token_class, regexp)
+
+        begin = time.time()
+        lexer.tokens.get_token('')
+        build = time.time() - begin
+
+        begin = time.time()
+        frozen = lexer.freeze()
+        freeze = time.time() - begin
+
+        load = '-'
+        if name == 'regexps':
+            data = pickle.dumps(frozen)
+            load = '%.1f' % (common.best_of(lambda: pickle.loads(data)) * 1000)
+
+        results = []
+        for lexer_name, candidate, timing, loading in (('Lexer', lexer, build, '-'),
+                ('FrozenLexer', frozen, freeze, load)):
+            results.append([(token.__class__, token.text) for token in candidate.lex(text)])
+            lex = common.best_of(lambda: list(candidate.lex(text)))
+            print("%8s %14s %11.1f %10s %10.3f %10.2f" % (
+                name, lexer_name, timing * 1000, loading, lex, len(text) / lex / 1e6))
+        if frozen.tokens.conflicts:
+            print("    %d shadowed token classes" % len(frozen.tokens.conflicts))
+
+        assert results[0] == results[1]
+
+
+if __name__ == '__main__':
+    run()
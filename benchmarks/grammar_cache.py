@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare the cold-start time of a program building its lexer, with and without a GrammarCache.
+
+The baseline builds a plain Lexer; building a FrozenLexer without a cache
+is shown too. Each measure runs in a new Python process, so that no regexp
+is in the ``re`` module cache. The grammar holds about 150 token classes: log
+fields, operators and keywords.
+
+Usage::
+
+    $ python -m benchmarks.grammar_cache
+"""
+
+from __future__ import print_function, unicode_literals
+
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import tdparser
+
+from . import dfa_registry
+from . import registry_fusion
+
+
+def _make_rules():
+    rules = [regexp for regexp, _sample in dfa_registry.LOG_RULES]
+    rules += [re.escape(op) for op in registry_fusion.OPERATORS]
+    rng = random.Random(150)
+    keywords = set()
+    while len(rules) + len(keywords) < 150:
+        keywords.add(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz')
+            for _i in range(rng.randint(2, 8))))
+    # Keywords may end with any char but letters and digits.
+    return [r'%s(?![a-zA-Z0-9_])' % keyword for keyword in sorted(keywords)] + rules
+
+
+RULES = _make_rules()
+
+# Token classes must be importable to be cached.
+TOKEN_CLASSES = []
+for _index in range(len(RULES)):
+    _name = str('Token%d' % _index)
+    globals()[_name] = type(_name, (tdparser.Token,), {'__module__': __name__})
+    TOKEN_CLASSES.append(globals()[_name])
+
+SAMPLE = ' '.join(sample for _regexp, sample in dfa_registry.LOG_RULES)
+
+
+def build_lexer():
+    lexer = tdparser.Lexer(with_parens=True)
+    for token_class, regexp in zip(TOKEN_CLASSES, RULES):
+        lexer.register_token(token_class, regexp)
+    return lexer
+
+
+def startup(mode, directory=None):
+    """Build the lexer as a program would on start-up.
+
+    Args:
+        mode (str): 'plain' for a Lexer, 'frozen' for a FrozenLexer, 'cache'
+            for a FrozenLexer loaded from a GrammarCache in directory
+    """
+    if mode == 'plain':
+        return build_lexer()
+    elif mode == 'frozen':
+        return build_lexer().freeze()
+    return tdparser.GrammarCache(directory).get('benchmark', build_lexer)
+
+
+_SCRIPT = """
+import sys, time
+begin = time.time()
+from benchmarks import grammar_cache
+imported = time.time()
+lexer = grammar_cache.startup(sys.argv[1], sys.argv[2])
+ready = time.time()
+list(lexer.lex(grammar_cache.SAMPLE))
+print(imported - begin, ready - imported, time.time() - ready)
+"""
+
+
+def measure(mode, directory, repeat=5):
+    """Run a new process starting up, return the best (import, startup, first lex) times."""
+    timings = []
+    for _i in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', _SCRIPT, mode, directory])
+        timings.append([float(value) for value in output.split()])
+    return [min(column) for column in zip(*timings)]
+
+
+def run():
+    directory = tempfile.mkdtemp()
+    try:
+        # Fill the cache.
+        measure('cache', directory, repeat=1)
+
+        print("%14s %12s %13s %15s" % ("", "import (ms)", "startup (ms)", "first lex (ms)"))
+        for name, mode in (('Lexer', 'plain'), ('Lexer.freeze', 'frozen'),
+                ('GrammarCache', 'cache')):
+            timings = measure(mode, directory)
+            print("%14s %12.1f %13.1f %15.1f" % ((name,) + tuple(t * 1000 for t in timings)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run()
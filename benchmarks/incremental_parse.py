@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare a full parse with an incremental one after a single keystroke.
+
+The incremental parse re-lexes the text with Lexer.relex, then parses it
+with an IncrementalParser, reusing the subexpressions of the previous parse.
+
+Usage::
+
+    $ python -m benchmarks.incremental_parse
+"""
+
+from __future__ import print_function, unicode_literals
+
+import timeit
+
+import tdparser
+
+from . import common
+
+
+def flat_text(groups):
+    """A long chain of short parenthesized groups."""
+    return ' + '.join(['(1 + 2 * 3 - 4 * 5)'] * groups)
+
+
+def chain_text(operands):
+    """A long chain of left-associative additions."""
+    return ' + '.join(['1'] * operands)
+
+
+def nested_text(depth):
+    """Deeply nested parenthesized additions: 1 + (1 + (...))."""
+    return '1 + (' * depth + '1' + ')' * depth
+
+
+def balanced_text(depth):
+    """A balanced tree of parenthesized additions."""
+    if depth == 0:
+        return '1 * 2'
+    subtree = balanced_text(depth - 1)
+    return '(%s) + (%s)' % (subtree, subtree)
+
+
+def run():
+    lexer = common.arithmetic_lexer()
+    print("%10s %10s %12s %18s %8s" % (
+        "shape", "tokens", "full (ms)", "incremental (ms)", "speedup"))
+    for shape, text in (('flat', flat_text(5000)), ('chain', chain_text(20000)),
+            ('nested', nested_text(200)), ('balanced', balanced_text(14))):
+        tokens = list(lexer.lex(text))
+        parser = tdparser.IncrementalParser(tokens)
+        parser.parse()
+        subtrees = parser.subtrees
+
+        # Replace a digit in the middle of the text, then restore it, so that
+        # each run starts from the same tokens.
+        offset = text.index('1', len(text) // 2)
+        edited = text[:offset] + '7' + text[offset + 1:]
+
+        def full():
+            tdparser.Parser(lexer.lex(edited)).parse()
+
+        def incremental():
+            new_tokens = lexer.relex(tokens, edited, offset, 1, '7')
+            tdparser.IncrementalParser(new_tokens, subtrees).parse()
+            old_tokens = lexer.relex(new_tokens, text, offset, 1, '1')
+            tdparser.IncrementalParser(old_tokens, subtrees).parse()
+
+        full_time = min(timeit.repeat(full, number=1, repeat=3))
+        incremental_time = min(timeit.repeat(incremental, number=5, repeat=3)) / 10
+        print("%10s %10d %12.2f %18.2f %7.0fx" % (
+            shape, len(tokens), full_time * 1000, incremental_time * 1000,
+            full_time / incremental_time))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare ways of lexing keywords on growing keyword sets.
+
+- regexp: one regexp per keyword, registered before identifiers
+- literal: keywords registered through Lexer.register_literal
+- promotion: keywords declared in the `keywords` table of the identifier token
+
+Usage::
+
+    $ python -m benchmarks.keywords
+"""
+
+from __future__ import print_function, unicode_literals
+
+import random
+
+import tdparser
+
+from . import common
+
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class Number(tdparser.Token):
+    regexp = r'\d+'
+
+
+class Operator(tdparser.Token):
+    regexp = r'[-+*/=<>]'
+
+
+def make_keywords(nb_keywords, rng):
+    words = set()
+    while len(words) < nb_keywords:
+        words.add(''.join(rng.choice(LETTERS) for _i in range(rng.randint(2, 8))))
+    words = sorted(words)
+    classes = [type(str('Keyword%d' % i), (tdparser.Token,), {})
+        for i in range(len(words))]
+    return list(zip(words, classes))
+
+
+def make_lexer(mode, keywords):
+    identifier = type(str('Identifier'), (tdparser.Token,), {
+        'regexp': r'[a-z_][a-z0-9_]*',
+        'keywords': dict(keywords) if mode == 'promotion' else None,
+    })
+    lexer = tdparser.Lexer()
+    if mode == 'regexp':
+        for word, keyword_class in keywords:
+            lexer.register_token(keyword_class, r'%s\b' % word)
+    elif mode == 'literal':
+        for word, keyword_class in keywords:
+            lexer.register_literal(keyword_class, word)
+    lexer.register_tokens(identifier, Number, Operator)
+    return lexer
+
+
+def make_text(keywords, size, rng):
+    """Build a text where one token in five is a keyword."""
+    parts = []
+    length = 0
+    while length < size:
+        choice = rng.random()
+        if choice < 0.2:
+            part = rng.choice(keywords)[0]
+        elif choice < 0.6:
+            part = ''.join(rng.choice(LETTERS) for _i in range(rng.randint(3, 10)))
+        elif choice < 0.8:
+            part = '%d' % rng.randint(0, 1000)
+        else:
+            part = rng.choice('-+*/=<>')
+        parts.append(part)
+        length += len(part) + 1
+    return ' '.join(parts)
+
+
+def run(size=100 * 1024):
+    modes = ('regexp', 'literal', 'promotion')
+    print("%8s %s" % ("keywords", ' '.join('%12s' % mode for mode in modes)))
+    for nb_keywords in (10, 100, 500):
+        rng = random.Random(nb_keywords)
+        keywords = make_keywords(nb_keywords, rng)
+        text = make_text(keywords, size, rng)
+
+        timings = []
+        results = []
+        for mode in modes:
+            lexer = make_lexer(mode, keywords)
+            results.append([(token.__class__.__name__, token.text)
+                for token in lexer.lex(text)])
+            timings.append(common.best_of(lambda: list(lexer.lex(text))))
+
+        assert results[0] == results[1] == results[2]
+        print("%8d %s" % (nb_keywords, ' '.join('%11.3fs' % timing for timing in timings)))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Check that Lexer.lex scales linearly with the size of its input.
+
+Usage::
+
+    $ python -m benchmarks.lex_scaling [max_size_in_kb]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import sys
+
+from . import common
+
+
+SIZES = [1024 * 10 ** i for i in range(5)]  # 1 KB to 10 MB
+
+
+def run(max_size=SIZES[-1]):
+    lexer = common.arithmetic_lexer()
+
+    print("%10s %12s %10s %14s" % ("size", "tokens", "time (s)", "ns / char"))
+    for size in SIZES:
+        if size > max_size:
+            break
+        text = common.arithmetic_text(size)
+        # The token count is only needed for reporting.
+        nb_tokens = [0]
+
+        def lex():
+            nb_tokens[0] = sum(1 for _token in lexer.lex(text))
+
+        duration = common.best_of(lex, repeat=3 if size < 1024 ** 2 else 1)
+        print("%10s %12d %10.3f %14.1f" % (
+            common.format_size(len(text)), nb_tokens[0], duration,
+            duration * 1e9 / len(text)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]) * 1024)
+    else:
+        run()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Parsing time of deeply nested expressions, with Parser and IterativeParser.
+
+Usage::
+
+    $ python -m benchmarks.nesting_depth
+"""
+
+from __future__ import print_function, unicode_literals
+
+import tdparser
+
+from . import common
+
+
+class Integer(tdparser.Token):
+    def nud(self, context):
+        return int(self.text)
+
+
+class Power(tdparser.Token):
+    lbp = 30
+    rbp = 29
+
+    def apply_infix(self, left, right):
+        return left
+
+
+def parens(depth):
+    return ([tdparser.LeftParen('(') for _i in range(depth)]
+        + [Integer('1')]
+        + [tdparser.RightParen(')') for _i in range(depth)])
+
+
+def power_chain(depth):
+    tokens = [Integer('1')]
+    for _i in range(depth):
+        tokens.extend([Power('**'), Integer('1')])
+    return tokens
+
+
+def measure(parser_class, tokens):
+    tokens = tokens + [tdparser.EndToken()]
+    try:
+        return '%.4fs' % common.best_of(lambda: parser_class(tokens).parse())
+    except RuntimeError:
+        # RecursionError
+        return 'recursion'
+
+
+def run():
+    print("%8s %22s %22s" % ("", "( ( ... ) )", "a ** b ** ..."))
+    print("%8s %10s %11s %10s %11s" % (
+        "depth", "Parser", "Iterative", "Parser", "Iterative"))
+    for depth in (10, 100, 1000, 10000, 100000):
+        print("%8d %10s %11s %10s %11s" % (
+            depth,
+            measure(tdparser.Parser, parens(depth)),
+            measure(tdparser.IterativeParser, parens(depth)),
+            measure(tdparser.Parser, power_chain(depth)),
+            measure(tdparser.IterativeParser, power_chain(depth)),
+        ))
+
+
+if __name__ == '__main__':
+    run()
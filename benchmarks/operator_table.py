@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare hand-written Token subclasses with an OperatorTable.
+
+Both grammars describe the same arithmetic expressions; parsing time is
+measured on pre-lexed tokens, and end-to-end through Lexer.parse.
+
+Usage::
+
+    $ python -m benchmarks.operator_table
+"""
+
+from __future__ import print_function, unicode_literals
+
+import operator
+
+import tdparser
+
+from . import common
+
+
+def table_lexer():
+    table = tdparser.OperatorTable()
+    table.atom(r'\d+', int, name='Integer')
+    table.infix_left(r'\+', 10, operator.add, name='Addition')
+    minus = table.infix_left(r'-', 10, operator.sub, name='Substraction')
+    table.prefix(minus, 10, operator.neg)
+    table.infix_left(r'\*', 20, operator.mul, name='Multiplication')
+    table.group(r'\(', r'\)')
+
+    lexer = tdparser.Lexer(parser_class=table.parser)
+    lexer.register_tokens(*table.token_classes)
+    return lexer
+
+
+def run(size=100 * 1024):
+    text = common.arithmetic_text(size)
+    print("%28s %12s %12s" % ("grammar", "parse (s)", "lex+parse (s)"))
+    for name, lexer in (
+            ('Token subclasses, Parser', common.arithmetic_lexer()),
+            ('Token subclasses, Iterative', common.arithmetic_lexer(
+                parser_class=tdparser.IterativeParser)),
+            ('OperatorTable', table_lexer())):
+        tokens = list(lexer.lex(text))
+        parse = common.best_of(lambda: lexer.parser_class(tokens).parse())
+        full = common.best_of(lambda: lexer.parse(text))
+        print("%28s %12.3f %12.3f" % (name, parse, full))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare Lexer.parse_all with splitting a text and parsing each piece.
+
+Usage::
+
+    $ python -m benchmarks.parse_all [expressions]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import sys
+
+import tdparser
+
+from . import common
+
+
+class Semicolon(tdparser.Token):
+    regexp = r';'
+
+
+def run(expressions=20000):
+    lexer = common.arithmetic_lexer(blank_chars=(' ', '\n'))
+    lexer.register_token(Semicolon)
+    text = ';\n'.join(['(12 + 3) * 45 - 6 * (78 - 9)'] * expressions)
+
+    def split():
+        return [lexer.parse(piece) for piece in text.split(';')]
+
+    def parse_all():
+        return list(lexer.parse_all(text, separator=Semicolon))
+
+    assert split() == parse_all()
+
+    print("%12s %10s" % ("method", "time (s)"))
+    for name, func in (('split', split), ('parse_all', parse_all)):
+        print("%12s %10.3f" % (name, common.best_of(func)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
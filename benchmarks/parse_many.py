@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare sequential parsing with Lexer.parse_many over process pools.
+
+Usage::
+
+    $ python -m benchmarks.parse_many [nb_texts]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import multiprocessing
+import random
+import sys
+import time
+
+from . import common
+
+
+def make_texts(nb_texts, rng):
+    texts = []
+    for _i in range(nb_texts):
+        size = rng.randint(50, 500)
+        texts.append(common.arithmetic_text(size))
+    return texts
+
+
+def run(nb_texts=20000):
+    lexer = common.arithmetic_lexer()
+    texts = make_texts(nb_texts, random.Random(0))
+
+    start = time.time()
+    expected = [lexer.parse(text) for text in texts]
+    reference = time.time() - start
+    print("%12s %10s %10s" % ("workers", "time (s)", "speedup"))
+    print("%12s %10.2f %10s" % ("sequential", reference, "1.0x"))
+
+    workers = 2
+    while workers <= max(2, multiprocessing.cpu_count()):
+        start = time.time()
+        results = lexer.parse_many(texts, workers=workers, chunksize=500)
+        duration = time.time() - start
+        assert results == expected
+        print("%12d %10.2f %9.1fx" % (workers, duration, reference / duration))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare TokenRegistry and CompiledTokenRegistry on growing grammars.
+
+Usage::
+
+    $ python -m benchmarks.registry_fusion
+"""
+
+from __future__ import print_function, unicode_literals
+
+import random
+import re
+
+import tdparser
+from tdparser import lexer as tdparser_lexer
+
+from . import common
+
+
+OPERATORS = ['+', '-', '*', '/', '**', '<', '<=', '>', '>=', '==', '!=', '=',
+    '&', '|', '^', '%', '~', ',', ';', ':', '.', '[', ']', '{', '}', '@']
+
+BASE_RULES = [
+    r'\d+(?:\.\d+)?',
+    r'[a-zA-Z_][a-zA-Z0-9_]*',
+    r'"[^"]*"',
+]
+
+
+def make_grammar(nb_classes, rng):
+    """Build nb_classes (token class, regexp, sample text) triplets.
+
+    The grammar holds numbers, identifiers, strings, operators and keywords;
+    keywords are the bulk of the token classes for larger grammars.
+    """
+    samples = ['42', '3.14', 'some_name', 'x1', '"a string"']
+    rules = list(BASE_RULES) + [re.escape(op) for op in OPERATORS]
+    samples += OPERATORS
+    keywords = set()
+    while len(rules) + len(keywords) < nb_classes:
+        keywords.add(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz')
+            for _i in range(rng.randint(2, 8))))
+    rules += sorted(keywords)
+    samples += sorted(keywords)
+    rules = rules[:nb_classes]
+
+    classes = [type(str('Token%d' % i), (tdparser.Token,), {})
+        for i in range(len(rules))]
+    return list(zip(classes, rules)), samples
+
+
+def make_text(samples, size, rng):
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(samples)
+        parts.append(part)
+        length += len(part) + 1
+    return ' '.join(parts)
+
+
+def run(size=100 * 1024):
+    print("%8s %16s %16s %8s" % ("classes", "TokenRegistry", "Compiled", "speedup"))
+    for nb_classes in (5, 50, 200):
+        rng = random.Random(nb_classes)
+        rules, samples = make_grammar(nb_classes, rng)
+
+        timings = []
+        for registry_class in (tdparser_lexer.TokenRegistry,
+                tdparser_lexer.CompiledTokenRegistry):
+            lexer = tdparser.Lexer(registry_class=registry_class)
+            for token_class, regexp in rules:
+                lexer.register_token(token_class, regexp)
+            # Only keep samples that this grammar can lex.
+            lexable = [sample for sample in samples
+                if lexer.tokens.get_token(sample)[0] is not None]
+            text = make_text(lexable, size, random.Random(0))
+
+            timings.append(common.best_of(lambda: list(lexer.lex(text))))
+
+        print("%8d %14.3fs %14.3fs %7.1fx" % (
+            nb_classes, timings[0], timings[1], timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare Lexer.relex after a single keystroke with a full Lexer.lex.
+
+Usage::
+
+    $ python -m benchmarks.relex
+"""
+
+from __future__ import print_function, unicode_literals
+
+import timeit
+
+from . import common
+
+
+def run():
+    lexer = common.arithmetic_lexer()
+    print("%12s %12s %12s %10s" % ("text size", "lex (ms)", "relex (ms)", "speedup"))
+    for size in (10 * 1024, 100 * 1024, 1024 * 1024):
+        text = common.arithmetic_text(size)
+        tokens = list(lexer.lex(text))
+
+        # Insert a digit in the middle of the text, then remove it, so that
+        # each run starts from the same tokens.
+        offset = len(text) // 2
+        edited = text[:offset] + '7' + text[offset:]
+
+        def edit():
+            new_tokens = lexer.relex(tokens, edited, offset, 0, '7')
+            lexer.relex(new_tokens, text, offset, 1, '')
+
+        full = min(timeit.repeat(lambda: list(lexer.lex(edited)), number=1, repeat=3))
+        incremental = min(timeit.repeat(edit, number=10, repeat=3)) / 20
+        print("%12s %12.3f %12.3f %9.0fx" % (
+            common.format_size(size), full * 1000, incremental * 1000,
+            full / incremental))
+
+
+if __name__ == '__main__':
+    run()
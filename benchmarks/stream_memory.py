@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Compare peak memory of Lexer.lex on a whole file and Lexer.lex_file.
+
+Usage::
+
+    $ python -m benchmarks.stream_memory [size_in_mb]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import common
+
+
+def lex_whole(lexer, path):
+    with io.open(path, encoding='utf-8') as f:
+        return sum(1 for _token in lexer.lex(f.read()))
+
+
+def lex_file(lexer, path):
+    return sum(1 for _token in lexer.lex_file(path, encoding='utf-8'))
+
+
+def run(size=2 * 1024 * 1024):
+    lexer = common.arithmetic_lexer()
+    fd, path = tempfile.mkstemp()
+    try:
+        with io.open(fd, 'w', encoding='utf-8') as f:
+            f.write(common.arithmetic_text(size))
+
+        print("%12s %10s %10s %16s" % ("method", "tokens", "time (s)", "peak memory"))
+        for name, func in (('lex', lex_whole), ('lex_file', lex_file)):
+            start = time.time()
+            nb_tokens = func(lexer, path)
+            duration = time.time() - start
+
+            # tracemalloc slows down execution: measure memory separately.
+            tracemalloc.start()
+            try:
+                func(lexer, path)
+                _size, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            print("%12s %10d %10.2f %16s" % (
+                name, nb_tokens, duration, common.format_size(peak)))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]) * 1024 * 1024)
+    else:
+        run()
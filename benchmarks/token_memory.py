@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Measure the memory used by lexed tokens, in bytes per token.
+
+Compares tokens with a per-instance __dict__ (the pre-1.2 representation)
+to slotted tokens, with and without text interning, and to the arrays built
+by Lexer.lex_columnar.
+
+Usage::
+
+    $ python -m benchmarks.token_memory
+"""
+
+from __future__ import print_function, unicode_literals
+
+import tracemalloc
+
+import tdparser
+
+from . import common
+
+
+class DictToken(tdparser.Token):
+    """Same as the old tdparser.Token: all attributes in a __dict__."""
+
+
+class SlottedToken(tdparser.Token):
+    __slots__ = ()
+
+
+class InternedToken(tdparser.Token):
+    __slots__ = ()
+    intern_text = True
+
+
+def make_lexer(base):
+    """Build an arithmetic lexer whose tokens derive from `base`."""
+    lexer = tdparser.Lexer(with_parens=True)
+    for token_class in common.ARITHMETIC_TOKENS:
+        lexer.register_token(
+            type(token_class.__name__, (base,), {'__slots__': ()}),
+            token_class.regexp)
+    return lexer
+
+
+def measure(lexer, text, columnar=False):
+    """Lex text, returning the number of tokens and the bytes they use."""
+    tracemalloc.start()
+    try:
+        if columnar:
+            tokens = lexer.lex_columnar(text)
+        else:
+            tokens = list(lexer.lex(text))
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(tokens), size
+
+
+def run(size=1024 * 1024):
+    text = common.arithmetic_text(size)
+    print("%16s %10s %16s" % ("representation", "tokens", "bytes / token"))
+    for name, base in (
+            ('__dict__', DictToken),
+            ('__slots__', SlottedToken),
+            ('__slots__+intern', InternedToken)):
+        nb_tokens, memory = measure(make_lexer(base), text)
+        print("%16s %10d %16.1f" % (name, nb_tokens, float(memory) / nb_tokens))
+
+    nb_tokens, memory = measure(make_lexer(SlottedToken), text, columnar=True)
+    print("%16s %10d %16.1f" % ('columnar', nb_tokens, float(memory) / nb_tokens))
+
+
+if __name__ == '__main__':
+    run()
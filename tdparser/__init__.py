@@ -5,21 +5,77 @@
 # Python3
 from __future__ import unicode_literals
 
+import sys
+
 __version__ = '1.1.6'
 __author__ = "Raphaël Barrois <raphael.barrois+tdparser@polytechnique.org>"
 
 
-from .topdown import (
-    Token, EndToken,
-    LeftParen, RightParen,
+# The public API, by module; modules are only imported when one of their
+# names is first accessed, so that e.g parsing a pre-tokenized stream
+# doesn't import the lexer (and the re module).
+_EXPORTS = {
+    'topdown': (
+        'Token', 'EndToken', 'ErrorToken',
+        'LeftParen', 'RightParen',
+
+        'Parser', 'IterativeParser', 'IncrementalParser',
+
+        'LineIndex',
+
+        'Error', 'ParserError', 'InvalidTokenError', 'MissingTokensError',
+    ),
+    'lexer': (
+        'Lexer',
+        'FrozenLexer',
+
+        'LexerError',
+    ),
+    'operators': (
+        'OperatorTable',
+        'TableParser',
+    ),
+    'cache': (
+        'ParseCache',
+        'CachedLexer',
+    ),
+    'grammar_cache': (
+        'GrammarCache',
+    ),
+    'profiling': (
+        'Profiler',
+        'TokenStats',
+    ),
+}
+
+_MODULES = dict((name, module) for module, names in _EXPORTS.items() for name in names)
+
+__all__ = sorted(str(name) for name in _MODULES)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        # A submodule, e.g tdparser.lexer
+        module, name = name, None
+    else:
+        try:
+            module = _MODULES[name]
+        except KeyError:
+            raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module_name = '%s.%s' % (__name__, module)
+    __import__(module_name)
+    if name is None:
+        return sys.modules[module_name]
+    value = getattr(sys.modules[module_name], name)
+    globals()[name] = value
+    return value
 
-    Parser,
 
-    Error, ParserError, InvalidTokenError, MissingTokensError,
-)
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
-from .lexer import (
-    Lexer,
 
-    LexerError,
-)
+if sys.version_info < (3, 7):  # pragma: no cover
+    # No module-level __getattr__ (PEP 562): import everything.
+    for _name in __all__:
+        __getattr__(_name)
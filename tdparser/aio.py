@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Parsing text received asynchronously, e.g from an asyncio stream.
+
+This module requires Python 3.5 or later; it is only imported by
+Lexer.aparse().
+"""
+
+from __future__ import unicode_literals
+
+import asyncio
+import codecs
+import queue
+import threading
+
+from .lexer import _StreamScanner, _STREAM_CHUNK_SIZE, _STREAM_MAX_TOKEN_SIZE
+
+
+class _Cancelled(Exception):
+    """Raised within the parsing thread when parsing is abandoned."""
+
+
+# Markers put in the token queue after the last batch of tokens.
+_END = object()
+_CANCEL = object()
+
+# Maximum number of batches of tokens (one per chunk) waiting for the parser;
+# reading chunks is suspended while the queue is full.
+_MAX_PENDING_BATCHES = 16
+
+
+class _QueuedTokens(object):
+    """Iterate over batches of tokens put in a queue, until an _END marker.
+
+    A _CANCEL marker, or the `cancelled` event, means that parsing is
+    abandoned.
+    """
+
+    def __init__(self, token_queue, cancelled):
+        self.queue = token_queue
+        self.cancelled = cancelled
+        self.batch = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            for token in self.batch:
+                return token
+
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            batch = self.queue.get()
+            if batch is _END:
+                raise StopIteration()
+            elif batch is _CANCEL:
+                raise _Cancelled()
+            self.batch = iter(batch)
+
+
+def _parse_queue(lexer, token_queue, cancelled):
+    try:
+        return lexer.parser_class(_QueuedTokens(token_queue, cancelled)).parse()
+    except _Cancelled:
+        return None
+    finally:
+        # Release a producer waiting for room in the queue.
+        while True:
+            try:
+                token_queue.get_nowait()
+            except queue.Empty:
+                break
+
+
+async def _put(loop, token_queue, batch, parsing):
+    """Queue a batch of tokens, waiting for room without blocking the loop.
+
+    Returns:
+        bool: whether the batch was queued; False if the parser stopped.
+    """
+    try:
+        token_queue.put_nowait(batch)
+        return True
+    except queue.Full:
+        pass
+    putting = loop.run_in_executor(None, token_queue.put, batch)
+    await asyncio.wait([putting, parsing], return_when=asyncio.FIRST_COMPLETED)
+    return putting.done()
+
+
+async def aparse(lexer, chunks, encoding=None, lookahead=_STREAM_CHUNK_SIZE,
+        max_token_size=None):
+    """Lex and parse a text received chunk by chunk.
+
+    Chunks are lexed as they arrive, within the event loop; tokens are sent
+    to the lexer's parser_class, running in the loop's default executor.
+    The event loop thus isn't blocked while parsing. Reading chunks is
+    suspended while the tokens of _MAX_PENDING_BATCHES chunks wait for the
+    parser: only these tokens are held in memory.
+
+    Reading chunks stops as soon as the parser fails; and if the calling
+    task is cancelled, or if lexing fails, the parser is stopped. The text
+    isn't kept: errors only carry their position, and aren't located.
+
+    Args:
+        lexer (Lexer): the lexer
+        chunks (async iterable of str): the text
+        encoding (str): if set, chunks are bytes in this encoding
+        lookahead (int): the number of characters required after a token's
+            start before matching it; see Lexer.lex_stream
+        max_token_size (int): the number of characters read ahead when no
+            token matches; see Lexer.lex_stream
+
+    Returns:
+        object: the result of the parser
+    """
+    if encoding is not None:
+        decoder = codecs.getincrementaldecoder(encoding)()
+    else:
+        decoder = None
+
+    # Python 3.7+
+    loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)()
+    token_queue = queue.Queue(maxsize=_MAX_PENDING_BATCHES)
+    cancelled = threading.Event()
+    parsing = loop.run_in_executor(None, _parse_queue, lexer, token_queue, cancelled)
+    if max_token_size is None:
+        max_token_size = max(_STREAM_MAX_TOKEN_SIZE, 4 * lookahead)
+    scanner = _StreamScanner(lexer, lookahead, max_token_size)
+    chunk_iterator = chunks.__aiter__()
+    next_chunk = None
+
+    try:
+        while True:
+            # Wait for the next chunk, unless the parser fails before.
+            next_chunk = asyncio.ensure_future(chunk_iterator.__anext__())
+            await asyncio.wait([next_chunk, parsing],
+                return_when=asyncio.FIRST_COMPLETED)
+            if parsing.done():
+                break
+
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                batches = [list(scanner.close()), _END]
+                if decoder is not None:
+                    batches.insert(0, list(scanner.feed(decoder.decode(b'', final=True))))
+                for batch in batches:
+                    if not await _put(loop, token_queue, batch, parsing):
+                        break
+                break
+
+            if decoder is not None:
+                chunk = decoder.decode(chunk)
+            tokens = list(scanner.feed(chunk))
+            if tokens and not await _put(loop, token_queue, tokens, parsing):
+                break
+
+        return await parsing
+
+    except BaseException:
+        # The queue may be full: the parser also checks the event before
+        # waiting for the next batch.
+        cancelled.set()
+        try:
+            token_queue.put_nowait(_CANCEL)
+        except queue.Full:
+            pass
+        raise
+
+    finally:
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.cancel()
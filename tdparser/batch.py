@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Parsing batches of texts in a pool of processes.
+
+Worker processes require concurrent.futures (Python 3.2+, or the futures
+backport); texts are parsed in-process without it. Before Python 3.7,
+ProcessPoolExecutor has no initializer: the lexer is then sent along with
+each chunk instead of once per worker.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+
+
+# The lexer of the current worker process, set by _init_worker.
+_worker_lexer = None
+
+
+def _init_worker(lexer):
+    global _worker_lexer
+    _worker_lexer = lexer
+
+
+def _parse_one(lexer, text):
+    """Parse a text, returning the raised exception on failure."""
+    try:
+        return lexer.parse(text)
+    except Exception as e:
+        return e
+
+
+def _parse_chunk(texts, lexer=None):
+    if lexer is None:
+        lexer = _worker_lexer
+    return [_parse_one(lexer, text) for text in texts]
+
+
+def parse_many(lexer, texts, workers=None, chunksize=100):
+    """Parse a batch of texts; see Lexer.parse_many."""
+    texts = list(texts)
+    chunksize = max(1, chunksize)
+    if not workers or workers < 2 or len(texts) <= chunksize:
+        return [_parse_one(lexer, text) for text in texts]
+
+    from concurrent import futures
+
+    chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+    results = []
+    if sys.version_info >= (3, 7):
+        executor = futures.ProcessPoolExecutor(max_workers=workers,
+            initializer=_init_worker, initargs=(lexer,))
+        chunk_lexer = None
+    else:  # pragma: no cover
+        executor = futures.ProcessPoolExecutor(max_workers=workers)
+        chunk_lexer = lexer
+    with executor:
+        pending = [executor.submit(_parse_chunk, chunk, chunk_lexer) for chunk in chunks]
+        for chunk, future in zip(chunks, pending):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                # The whole chunk failed, e.g unpicklable results.
+                results.extend([e] * len(chunk))
+    return results
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Memoization of parse results."""
+
+from __future__ import unicode_literals
+
+import collections
+import threading
+
+
+class ParseCache(object):
+    """A bounded LRU cache of parse results, keyed by the parsed text.
+
+    Attributes:
+        max_entries (int): maximum number of cached results, None for no limit
+        max_size (int): maximum total length of cached texts, None for no limit
+        size (int): total length of currently cached texts
+        hits (int): number of lookups answered from the cache
+        misses (int): number of lookups which required parsing
+        evictions (int): number of results dropped to honor the limits
+        invalidations (int): number of times the cache was cleared because
+            the grammar changed
+        grammar_version (int): the version of the grammar for cached results
+    """
+
+    def __init__(self, max_entries=1024, max_size=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.grammar_version = None
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, text):
+        return text in self._entries
+
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def get(self, text, parse, grammar_version=None):
+        """Retrieve the result of parse(text), from the cache if possible.
+
+        Errors raised by parse() are not cached.
+
+        Args:
+            text (str): the text to parse
+            parse (callable): computes the result for a text
+            grammar_version (int): the version of the grammar used by parse;
+                the cache is cleared whenever it changes.
+
+        Returns:
+            object: the (possibly shared) result of parse(text).
+        """
+        with self._lock:
+            if grammar_version != self.grammar_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.size = 0
+                self.grammar_version = grammar_version
+
+            try:
+                result = self._entries.pop(text)
+            except KeyError:
+                self.misses += 1
+            else:
+                # Move it to the most recently used end.
+                self._entries[text] = result
+                self.hits += 1
+                return result
+
+        result = parse(text)
+
+        with self._lock:
+            if grammar_version == self.grammar_version:
+                self._store(text, result)
+        return result
+
+    def _store(self, text, result):
+        """Add a result to the cache, evicting old entries if needed."""
+        if self.max_size is not None and len(text) > self.max_size:
+            return
+        if text in self._entries:
+            # Computed concurrently by another thread.
+            return
+
+        self._entries[text] = result
+        self.size += len(text)
+
+        while ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_size is not None and self.size > self.max_size)):
+            old_text, _old_result = self._entries.popitem(last=False)
+            self.size -= len(old_text)
+            self.evictions += 1
+
+
+class CachedLexer(object):
+    """Wraps a Lexer, memoizing the results of its parse() method.
+
+    All other attributes are those of the wrapped Lexer.
+
+    Attributes:
+        lexer (Lexer): the wrapped lexer
+        cache (ParseCache): the cache of parse results
+    """
+
+    def __init__(self, lexer, max_entries=1024, max_size=None):
+        self.lexer = lexer
+        self.cache = ParseCache(max_entries=max_entries, max_size=max_size)
+
+    def parse(self, text):
+        """Parse a text, or retrieve the result of a previous parse."""
+        return self.cache.get(text, self.lexer.parse,
+            grammar_version=self.lexer.grammar_version)
+
+    def __getattr__(self, name):
+        return getattr(self.lexer, name)
@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Lexing through a deterministic finite automaton.
+
+A DFATokenRegistry compiles the registered regexps into a single automaton
+over characters, which finds in one pass over the text which regexps may
+match, and how far:
+
+    lexer = Lexer(registry_class=DFATokenRegistry)
+
+Regexps aren't matched by the longest alternative, but by the first one
+(``a|ab`` matches ``a``); the automaton thus only bounds their matches. The
+candidate regexps are then confirmed with ``re``, longest bound first, until
+no remaining one may provide a better match: this is usually a single
+``re`` call per token.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from .lexer import (TokenRegistry, sre_parse, unichr, _ATOMIC_GROUP, _MAXREPEAT,
+    _RE_ASCII, _REPEATS, _subpattern)
+
+
+# Flags affecting which characters a single-character regexp matches
+_CHAR_FLAGS = re.IGNORECASE | re.DOTALL | re.UNICODE | _RE_ASCII
+
+_CATEGORY_CLASSES = {
+    'CATEGORY_DIGIT': r'\d',
+    'CATEGORY_NOT_DIGIT': r'\D',
+    'CATEGORY_SPACE': r'\s',
+    'CATEGORY_NOT_SPACE': r'\S',
+    'CATEGORY_WORD': r'\w',
+    'CATEGORY_NOT_WORD': r'\W',
+}
+
+# Repetitions of more than this many items are approximated by unbounded ones
+_MAX_EXPANDED_REPEAT = 64
+
+
+class _Unsupported(Exception):
+    """Raised for regexps which can't be compiled into an automaton."""
+
+
+def _escape(code):
+    return re.escape(unichr(code))
+
+
+class _NFA(object):
+    """A non-deterministic automaton, built from sre_parse trees.
+
+    Attributes:
+        moves (list of (callable, int) list): for each state, the
+            (character predicate, target state) transitions
+        epsilons (int list list): for each state, the states reachable
+            without consuming a character
+        accepting (dict(int => int)): for accepting states, the index of the
+            regexp they accept
+        owners (int list): for each state, the index of the regexp it was
+            built for; -1 for states shared by several regexps
+    """
+
+    def __init__(self):
+        self.moves = []
+        self.epsilons = []
+        self.accepting = {}
+        self.owners = []
+        self._predicates = {}
+
+    def new_state(self):
+        self.moves.append([])
+        self.epsilons.append([])
+        self.owners.append(-1)
+        return len(self.moves) - 1
+
+    def add_regexp(self, start, index, regexp):
+        """Add the states matching a compiled regexp, from a start state.
+
+        Raises:
+            _Unsupported: if the regexp can't be compiled
+        """
+        if not isinstance(regexp.pattern, type('')):
+            raise _Unsupported("bytes pattern")
+        if regexp.flags & re.LOCALE:
+            raise _Unsupported("LOCALE flag")
+        try:
+            parsed = sre_parse.parse(regexp.pattern, regexp.flags)
+        except Exception:  # pragma: no cover
+            raise _Unsupported("unparsable pattern")
+
+        size = len(self.moves)
+        # Each regexp gets its own start state, so that zero-width regexps
+        # (e.g '$') don't accept the shared start state for each other.
+        regexp_start = self.new_state()
+        self.epsilons[start].append(regexp_start)
+        try:
+            end = self._add_sequence(regexp_start, parsed, regexp.flags)
+        except _Unsupported:
+            # Drop the states added for the regexp, and links to them.
+            del self.moves[size:]
+            del self.epsilons[size:]
+            del self.owners[size:]
+            self.moves[start] = [move for move in self.moves[start] if move[1] < size]
+            self.epsilons[start] = [target for target in self.epsilons[start]
+                if target < size]
+            raise
+        for state in range(size, len(self.owners)):
+            self.owners[state] = index
+        self.accepting[end] = index
+
+    def _predicate(self, source, flags):
+        """Build a predicate on characters from a single-character regexp."""
+        key = (source, flags & _CHAR_FLAGS)
+        try:
+            return self._predicates[key]
+        except KeyError:
+            predicate = self._predicates[key] = re.compile(*key).match
+            return predicate
+
+    def _char_class(self, items):
+        parts = []
+        for op, av in items:
+            if op is sre_parse.NEGATE:
+                parts.append('^')
+            elif op is sre_parse.LITERAL:
+                parts.append(_escape(av))
+            elif op is sre_parse.RANGE:
+                parts.append('%s-%s' % (_escape(av[0]), _escape(av[1])))
+            elif op is sre_parse.CATEGORY and str(av).upper() in _CATEGORY_CLASSES:
+                # Python 2 names categories in lower case
+                parts.append(_CATEGORY_CLASSES[str(av).upper()])
+            else:
+                raise _Unsupported("character set item %s" % op)
+        return '[%s]' % ''.join(parts)
+
+    def _add_char(self, state, source, flags):
+        target = self.new_state()
+        self.moves[state].append((self._predicate(source, flags), target))
+        return target
+
+    def _add_sequence(self, state, subpattern, flags):
+        """Add the states for a sequence of sre_parse items.
+
+        Returns:
+            int: the state reached at the end of the sequence.
+        """
+        for op, av in subpattern:
+            state = self._add_item(state, op, av, flags)
+        return state
+
+    def _add_item(self, state, op, av, flags):
+        if op is sre_parse.LITERAL:
+            return self._add_char(state, _escape(av), flags)
+        elif op is sre_parse.NOT_LITERAL:
+            return self._add_char(state, '[^%s]' % _escape(av), flags)
+        elif op is sre_parse.ANY:
+            return self._add_char(state, '.', flags)
+        elif op is sre_parse.IN:
+            return self._add_char(state, self._char_class(av), flags)
+
+        elif op is sre_parse.SUBPATTERN:
+            add_flags, del_flags, content = _subpattern(av)
+            if (add_flags | del_flags) & re.LOCALE:
+                raise _Unsupported("LOCALE flag")
+            return self._add_sequence(state, content, (flags | add_flags) & ~del_flags)
+        elif op is _ATOMIC_GROUP:
+            # Atomic groups may match less than their content.
+            return self._add_sequence(state, av, flags)
+
+        elif op is sre_parse.BRANCH:
+            end = self.new_state()
+            for branch in av[1]:
+                branch_start = self.new_state()
+                self.epsilons[state].append(branch_start)
+                self.epsilons[self._add_sequence(branch_start, branch, flags)].append(end)
+            return end
+
+        elif op in _REPEATS:
+            # Lazy and possessive repetitions may match less than greedy ones.
+            min_repeat, max_repeat, repeated = av
+            if max_repeat - min_repeat > _MAX_EXPANDED_REPEAT:
+                max_repeat = _MAXREPEAT
+            min_repeat = min(min_repeat, _MAX_EXPANDED_REPEAT)
+
+            for _i in range(min_repeat):
+                state = self._add_sequence(state, repeated, flags)
+            if max_repeat >= _MAXREPEAT:
+                loop = self.new_state()
+                self.epsilons[state].append(loop)
+                self.epsilons[self._add_sequence(loop, repeated, flags)].append(loop)
+                return loop
+
+            end = self.new_state()
+            self.epsilons[state].append(end)
+            for _i in range(max_repeat - min_repeat):
+                state = self._add_sequence(state, repeated, flags)
+                self.epsilons[state].append(end)
+            return end
+
+        elif op is sre_parse.AT:
+            # Anchors (^, $, \b, ...) may prevent a match.
+            return state
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            raise _Unsupported("lookaround assertion")
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            raise _Unsupported("group reference")
+        else:
+            raise _Unsupported("%s item" % op)
+
+    def closure(self, states):
+        """Compute the states reachable from a set of states without moving."""
+        result = set(states)
+        pending = list(states)
+        while pending:
+            for target in self.epsilons[pending.pop()]:
+                if target not in result:
+                    result.add(target)
+                    pending.append(target)
+        return frozenset(result)
+
+
+class _DFA(object):
+    """A deterministic automaton, built lazily from a _NFA.
+
+    DFA states are the sets of NFA states reachable after some characters.
+    State 0 is the dead state, matching nothing; state 1 is the start state.
+
+    Attributes:
+        transitions (dict list): for each state, the known
+            character => next state transitions
+        accepts (int tuple list): for each state, the sorted indexes of the
+            regexps it accepts
+        exits (tuple list): for each state from which at most one regexp
+            may match more characters, a tuple of the index of that regexp
+            (if any); None for other states
+        max_states (int): when more states are needed, known states are
+            dropped and rebuilt as needed
+    """
+
+    start = 1
+
+    def __init__(self, nfa, nfa_start, max_states=10000):
+        self.nfa = nfa
+        self.nfa_start = nfa_start
+        self.max_states = max_states
+        self.transitions = []
+        self.accepts = []
+        self.exits = []
+        self._sets = []
+        self._ids = {}
+        self._reset()
+
+    def __len__(self):
+        return len(self.transitions)
+
+    def _reset(self):
+        del self.transitions[:]
+        del self.accepts[:]
+        del self.exits[:]
+        del self._sets[:]
+        self._ids.clear()
+        self._intern(frozenset())
+        self._intern(self.nfa.closure([self.nfa_start]))
+
+    def _intern(self, nfa_states):
+        try:
+            return self._ids[nfa_states]
+        except KeyError:
+            pass
+        state = len(self.transitions)
+        self._ids[nfa_states] = state
+        self._sets.append(nfa_states)
+        self.transitions.append({})
+        accepting = self.nfa.accepting
+        self.accepts.append(tuple(sorted(
+            accepting[nfa_state] for nfa_state in nfa_states if nfa_state in accepting)))
+        live = set(self.nfa.owners[nfa_state] for nfa_state in nfa_states
+            if self.nfa.moves[nfa_state])
+        if len(live) <= 1 and -1 not in live:
+            self.exits.append(tuple(live))
+        else:
+            self.exits.append(None)
+        return state
+
+    def step(self, state, char):
+        """Compute (and remember) the transition from a state on a character."""
+        moves = self.nfa.moves
+        targets = set()
+        for nfa_state in self._sets[state]:
+            for predicate, target in moves[nfa_state]:
+                if predicate(char):
+                    targets.add(target)
+        targets = self.nfa.closure(targets)
+
+        if targets not in self._ids and len(self.transitions) >= self.max_states:
+            self._reset()
+            return self._intern(targets)
+        target = self._intern(targets)
+        self.transitions[state][char] = target
+        return target
+
+    def explore(self, alphabet):
+        """Build all states reachable from the start through some characters."""
+        pending = [self.start]
+        seen = set(pending)
+        while pending:
+            state = pending.pop()
+            for char in alphabet:
+                if len(self.transitions) >= self.max_states:
+                    # Further states would reset the automaton.
+                    return
+                target = self.step(state, char)
+                if target not in seen:
+                    seen.add(target)
+                    pending.append(target)
+
+
+class DFATokenRegistry(TokenRegistry):
+    """A TokenRegistry matching its regexps through a single automaton.
+
+    The automaton is built on the first lookup: all states reachable through
+    ASCII characters are computed upfront, other ones when first needed.
+    This only pays off when many regexps may start with the same characters
+    (e.g numbers, dates and addresses in log lines); otherwise, e.g for
+    keywords, the first-character index of the TokenRegistry is faster, and
+    builds much quicker.
+
+    Regexps using features beyond regular languages (lookaround assertions,
+    group references) or the LOCALE flag are tried one at a time; see
+    fallbacks().
+
+    Attributes:
+        max_states (int): the maximum number of automaton states kept
+        _dfa (_DFA): the automaton, None until built
+        _fallbacks ((int, str) list): the indexes in _tokens of regexps
+            missing from the automaton, and why
+        _fallback_index (dict(str => (int, Token, re) list)): for each
+            possible first character, the fallback regexps to try
+    """
+
+    max_states = 10000
+
+    def __init__(self):
+        super(DFATokenRegistry, self).__init__()
+        self._reset()
+
+    def _reset(self):
+        self._dfa = None
+        self._fallbacks = None
+        self._fallback_index = self._fallback_default = self._fallback_at_end = None
+
+    def register(self, token, regexp):
+        super(DFATokenRegistry, self).register(token, regexp)
+        self._reset()
+
+    def _prepare(self):
+        """Build the automaton."""
+        if self._index is None:
+            self._build_index()
+
+        nfa = _NFA()
+        start = nfa.new_state()
+        fallbacks = []
+        for index, (_token_class, regexp) in enumerate(self._tokens):
+            try:
+                nfa.add_regexp(start, index, regexp)
+            except _Unsupported as e:
+                fallbacks.append((index, '%s' % e))
+
+        fallback_indexes = set(index for index, _reason in fallbacks)
+
+        def select(candidates):
+            return [entry for entry in candidates if entry[0] in fallback_indexes]
+
+        self._fallback_index = dict((key, select(candidates))
+            for key, candidates in self._regexp_index.items())
+        self._fallback_default = select(self._regexp_default)
+        self._fallback_at_end = select(self._regexp_at_end)
+        self._fallbacks = fallbacks
+
+        dfa = _DFA(nfa, start, max_states=self.max_states)
+        dfa.explore([unichr(code) for code in range(128)])
+        self._dfa = dfa
+
+    def fallbacks(self):
+        """List the regexps matched with ``re`` instead of the automaton.
+
+        Returns:
+            (Token, str, str) list: the token class, regexp pattern and
+                reason for each such regexp.
+        """
+        if self._dfa is None:
+            self._prepare()
+        return [(self._tokens[index][0], self._tokens[index][1].pattern, reason)
+            for index, reason in self._fallbacks]
+
+    def _possible_ends(self, text, start, limit):
+        """Run the automaton, listing the possible matches ending before limit.
+
+        Returns:
+            (int, int tuple) list: the possible ends of matches and the
+                indexes of the regexps which may end there, longest first.
+        """
+        dfa = self._dfa
+        state = dfa.start
+        ends = []
+        if dfa.accepts[state] and start < limit:
+            ends.append((start, dfa.accepts[state]))
+        for pos in range(start, min(limit, len(text))):
+            state = dfa.step(state, text[pos])
+            if not state:
+                break
+            if dfa.accepts[state] and pos + 1 < limit:
+                ends.append((pos + 1, dfa.accepts[state]))
+        ends.reverse()
+        return ends
+
+    def _confirm(self, text, start, bounds, best, tried):
+        """Match candidate regexps with ``re``, while they may beat the best match.
+
+        Args:
+            bounds ((int, int tuple) list): the longest possible match of
+                candidate regexps, and their indexes; longest first
+            best ((int, int, re.Match)): the index, end and match of the best
+                match so far
+            tried (int list): the indexes of regexps already matched
+
+        Returns:
+            (int, int, re.Match): the new best match.
+        """
+        best_index, best_end, best_match = best
+        for bound, indexes in bounds:
+            if bound < best_end:
+                break
+            for index in indexes:
+                if bound == best_end and index > best_index:
+                    break
+                if index in tried:
+                    continue
+                tried.append(index)
+                match = self._tokens[index][1].match(text, start)
+                if match is None:
+                    continue
+                end = match.end()
+                if end > best_end or (end == best_end and index < best_index):
+                    best_index, best_end, best_match = index, end, match
+        return best_index, best_end, best_match
+
+    def get_token(self, text, start=0):
+        if self._dfa is None:
+            self._prepare()
+        dfa = self._dfa
+        transitions = dfa.transitions
+        accepts = dfa.accepts
+        exits = dfa.exits
+
+        # Run the automaton until at most one regexp may match further,
+        # remembering the last accepted regexps; state numbers may change
+        # when the automaton is reset.
+        state = dfa.start
+        last_end = -1
+        if accepts[state]:
+            last_end, last_accepts = start, accepts[state]
+        exit = exits[state]
+        pos = start
+        length = len(text)
+        while exit is None and pos < length:
+            try:
+                state = transitions[state][text[pos]]
+            except KeyError:
+                state = dfa.step(state, text[pos])
+            if not state:
+                break
+            pos += 1
+            if accepts[state]:
+                last_end, last_accepts = pos, accepts[state]
+            exit = exits[state]
+
+        if not self._fallbacks:
+            # Fast path: the top candidate matches as far as possible.
+            if exit:
+                token_class, regexp = self._tokens[exit[0]]
+                match = regexp.match(text, start)
+                if match is not None and match.end() > last_end:
+                    return token_class, match
+            elif last_end >= 0:
+                token_class, regexp = self._tokens[last_accepts[0]]
+                match = regexp.match(text, start)
+                if match is not None and match.end() == last_end:
+                    return token_class, match
+
+        best = (-1, -1, None)
+        if self._fallbacks:
+            if start >= length:
+                candidates = self._fallback_at_end
+            else:
+                candidates = self._fallback_index.get(text[start], self._fallback_default)
+            best = self._confirm(text, start,
+                [(length, (index,)) for index, _token_class, _regexp in candidates],
+                best, [])
+
+        # Confirm candidates, from the longest possible match, until none
+        # may provide a better match than the best confirmed one.
+        bounds = []
+        if exit:
+            # The remaining regexp may match up to the end of the text.
+            bounds.append((length, exit))
+        if last_end >= 0:
+            bounds.append((last_end, last_accepts))
+        tried = []
+        best = self._confirm(text, start, bounds, best, tried)
+        if best[1] < last_end:
+            # Shorter matches are needed; this is rare, as regexps usually
+            # match as far as possible.
+            best = self._confirm(text, start,
+                self._possible_ends(text, start, last_end), best, tried)
+
+        if best[2] is None:
+            return None, None
+        return self._tokens[best[0]][0], best[2]
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""On-disk cache of frozen lexers, to cut the start-up time of programs."""
+
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import os
+import pickle
+import re
+import sys
+import tempfile
+
+from . import lexer as tdparser_lexer
+
+
+# Bumped whenever the layout of cached lexers changes.
+_FORMAT_VERSION = 3
+
+_PATTERN_TYPE = type(re.compile(''))
+
+# Python 2 has no os.replace; there, os.rename replaces files on POSIX only.
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _reduce_regexp(regexp):
+    return (tdparser_lexer._LazyRegexp, (regexp.pattern, regexp.flags))
+
+
+def _declared_regexps(lexer):
+    """List the regexps declared by the registered token classes of a lexer.
+
+    Returns:
+        (str, str, int) list: the import path of each registered token class,
+            and the pattern and flags of its `regexp` attribute
+    """
+    declared = []
+    for token_class, _regexp in lexer.tokens._tokens:
+        regexp = token_class.regexp
+        declared.append((
+            '%s.%s' % (token_class.__module__,
+                getattr(token_class, '__qualname__', token_class.__name__)),
+            getattr(regexp, 'pattern', regexp),
+            getattr(regexp, 'flags', 0),
+        ))
+    return declared
+
+
+class GrammarCache(object):
+    """Stores frozen lexers in a directory, to load them instead of building them.
+
+    A cached lexer holds the analysis of its FrozenTokenRegistry: the source
+    of its regexps, its dispatch tables, and its token classes by import path
+    (they must thus be importable). Its regexps, and the alternations of
+    fused regexps, are only compiled when first used.
+
+    Entries are keyed by a string chosen by the caller, which must change
+    whenever the grammar does, e.g a version number or a hash of the module
+    defining the grammar; the tdparser and Python versions are added to it.
+    A cached lexer is also checked on load against the `regexp` attribute of
+    its token classes, and rebuilt if one changed; regexps passed explicitly
+    when registering tokens, literals and trivia aren't checked.
+
+    Cached lexers are pickles: loading them runs arbitrary code. The directory
+    must only be writable by trusted users; it is created with mode 0o700.
+
+    Attributes:
+        directory (str): the directory holding cached lexers
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _fingerprint(self, key):
+        from . import __version__
+        return '%d:%s:%d.%d:%s' % (_FORMAT_VERSION, __version__,
+            sys.version_info[0], sys.version_info[1], key)
+
+    def path(self, key):
+        """Retrieve the path of the file caching the lexer for a key."""
+        digest = hashlib.sha1(self._fingerprint(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'tdparser-%s.grammar' % digest)
+
+    def load(self, key):
+        """Load a cached lexer.
+
+        Args:
+            key (str): the key of the grammar
+
+        Returns:
+            FrozenLexer: the cached lexer, None if missing, stale or unreadable
+                (e.g when a token class was moved).
+        """
+        try:
+            with io.open(self.path(key), 'rb') as f:
+                fingerprint, declared, lexer = pickle.load(f)
+        except Exception:
+            return None
+        if fingerprint != self._fingerprint(key) or not isinstance(
+                lexer, tdparser_lexer.FrozenLexer):
+            return None
+        if declared != _declared_regexps(lexer):
+            # A token class was modified, with the same key.
+            return None
+        return lexer
+
+    def save(self, key, lexer):
+        """Store a lexer, frozen if needed.
+
+        The file is written atomically; failing to write it (e.g in a
+        read-only directory) isn't an error.
+
+        Args:
+            key (str): the key of the grammar
+            lexer (Lexer): the lexer to store
+
+        Returns:
+            FrozenLexer: the stored lexer
+        """
+        lexer = lexer.freeze()
+        data = io.BytesIO()
+        pickler = pickle.Pickler(data, pickle.HIGHEST_PROTOCOL)
+        pickler.dispatch_table = {_PATTERN_TYPE: _reduce_regexp}
+        pickler.dump((self._fingerprint(key), _declared_regexps(lexer), lexer))
+
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data.getvalue())
+                _replace(tmp_path, self.path(key))
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+        return lexer
+
+    def get(self, key, build):
+        """Load a cached lexer, or build and store it.
+
+        Args:
+            key (str): the key of the grammar
+            build (callable): builds the Lexer when it isn't cached
+
+        Returns:
+            FrozenLexer: the lexer
+        """
+        lexer = self.load(key)
+        if lexer is None:
+            lexer = self.save(key, build())
+        return lexer
+
@@ -5,15 +5,356 @@
 
 from __future__ import unicode_literals
 
+import array
+import io
+import itertools
 import re
 
-from .topdown import Error, Parser, LeftParen, RightParen, EndToken
+try:  # pragma: no cover
+    # Python 3.11+
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+from .topdown import Error, LineIndex, Parser, LeftParen, RightParen, EndToken, ErrorToken
+
+
+try:  # pragma: no cover
+    unichr = unichr
+except NameError:  # pragma: no cover
+    # Python3
+    unichr = chr
+
+_RE_ASCII = getattr(re, 'ASCII', 0)
+_ATOMIC_GROUP = getattr(sre_parse, 'ATOMIC_GROUP', None)
+_REPEATS = tuple(getattr(sre_parse, name) for name in (
+    'MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT') if hasattr(sre_parse, name))
+_MAXREPEAT = getattr(sre_parse, 'MAXREPEAT', 65535)
+
+# Text patterns: str, and unicode on Python 2
+_TEXT_TYPES = (str, type(''))
+
+# Matches a run of invalid text, up to the endpos given to match()
+_ERROR_RUN = re.compile(r'.+', re.DOTALL)
 
 
 class LexerError(Error):
-    def __init__(self, *args, **kwargs):
-        self.position = kwargs.pop('position', None)
-        super(LexerError, self).__init__(*args, **kwargs)
+    """When the text holds characters no token matches."""
+
+
+def _iter_subpatterns(parsed):
+    """Walk a sre_parse.SubPattern, yielding all nested (op, av) pairs."""
+    for op, av in parsed:
+        yield op, av
+        pending = [av]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, sre_parse.SubPattern):
+                for nested in _iter_subpatterns(item):
+                    yield nested
+            elif isinstance(item, (tuple, list)):
+                pending.extend(item)
+
+
+# Prefix of the names of the groups marking the alternatives of fused regexps.
+_MARKER_PREFIX = '_tdparser_'
+
+
+def _is_fusable(regexp):
+    """Whether a compiled regexp may be embedded in a larger alternation.
+
+    This excludes regexps using non-default flags (they would apply to the
+    whole alternation), regexps holding group references (they would point
+    to the wrong groups), and regexps using the names of marker groups.
+    """
+    if regexp.flags != re.compile(regexp.pattern[:0]).flags:
+        return False
+    if any(name.startswith(_MARKER_PREFIX) for name in regexp.groupindex):
+        return False
+    try:
+        parsed = sre_parse.parse(regexp.pattern)
+    except Exception:  # pragma: no cover
+        return False
+    for op, _av in _iter_subpatterns(parsed):
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return False
+    return True
+
+
+def _subpattern(av):
+    """Split the argument of a SUBPATTERN item.
+
+    Returns:
+        (int, int, sre_parse.SubPattern): the flags added and removed by the
+            group, and its content.
+    """
+    if len(av) == 2:
+        # Python < 3.6: (group, content)
+        return 0, 0, av[1]
+    return av[1], av[2], av[3]
+
+
+def _ascii_matching(regexp):
+    return frozenset(char for char in (unichr(code) for code in range(128))
+        if re.match(regexp, char))
+
+
+# ASCII characters matched by regexp categories; these categories may also
+# match non-ASCII characters.
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: _ascii_matching(r'\d'),
+    sre_parse.CATEGORY_SPACE: _ascii_matching(r'\s'),
+    sre_parse.CATEGORY_WORD: _ascii_matching(r'\w'),
+}
+
+# Largest character range to enumerate in first-character sets
+_MAX_RANGE = 256
+
+
+def _first_chars_set(items, flags):
+    """Retrieve the first characters of a set of chars, a sre_parse IN.
+
+    Returns:
+        (frozenset, bool): the characters, and whether any non-ASCII char
+            may also match. None if unknown or too large.
+    """
+    chars = set()
+    non_ascii = False
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            chars.add(unichr(av))
+        elif op is sre_parse.RANGE:
+            low, high = av
+            if high - low > _MAX_RANGE:
+                return None
+            chars.update(unichr(code) for code in range(low, high + 1))
+        elif op is sre_parse.CATEGORY:
+            if av not in _CATEGORIES:
+                return None
+            chars.update(_CATEGORIES[av])
+            # Categories only match non-ASCII chars in unicode mode, implied
+            # for text patterns on Python 3.
+            non_ascii = non_ascii or bool(flags & re.UNICODE and not flags & _RE_ASCII)
+        else:
+            # NEGATE, ...
+            return None
+    return chars, non_ascii
+
+
+def _first_chars_seq(subpattern, flags):
+    """Retrieve the first characters of a sequence of sre_parse items.
+
+    Returns:
+        (frozenset, bool, bool): the possible first characters, whether any
+            non-ASCII char may also be matched first, and whether the
+            sequence may match the empty string.
+            None if these chars can't be computed.
+    """
+    chars = set()
+    non_ascii = False
+    for op, av in subpattern:
+        if op is sre_parse.LITERAL:
+            item = (set([unichr(av)]), False, False)
+        elif op is sre_parse.IN:
+            item = _first_chars_set(av, flags)
+            if item is not None:
+                item = item + (False,)
+        elif op is sre_parse.SUBPATTERN:
+            add_flags, del_flags, content = _subpattern(av)
+            if add_flags or del_flags:
+                return None
+            item = _first_chars_seq(content, flags)
+        elif op is _ATOMIC_GROUP:
+            item = _first_chars_seq(av, flags)
+        elif op is sre_parse.BRANCH:
+            item = (set(), False, False)
+            for branch in av[1]:
+                branch_item = _first_chars_seq(branch, flags)
+                if branch_item is None:
+                    return None
+                item = (
+                    item[0] | branch_item[0],
+                    item[1] or branch_item[1],
+                    item[2] or branch_item[2],
+                )
+        elif op in _REPEATS:
+            min_repeat, _max_repeat, repeated = av
+            item = _first_chars_seq(repeated, flags)
+            if item is not None and min_repeat == 0:
+                item = item[:2] + (True,)
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            # Zero-width items
+            item = (set(), False, True)
+        else:
+            # ANY, NOT_LITERAL, GROUPREF, ...
+            return None
+
+        if item is None:
+            return None
+        chars.update(item[0])
+        non_ascii = non_ascii or item[1]
+        if not item[2]:
+            return chars, non_ascii, False
+
+    return chars, non_ascii, True
+
+
+def _first_chars(regexp):
+    """Compute the set of characters a compiled regexp may start with.
+
+    Returns:
+        (frozenset, bool): the possible first characters, and whether any
+            non-ASCII char may also be matched first.
+            None if this set can't be computed, or if the regexp may match
+            the empty string.
+    """
+    if not isinstance(regexp.pattern, _TEXT_TYPES) or regexp.flags & re.LOCALE:
+        return None
+    try:
+        parsed = sre_parse.parse(regexp.pattern, regexp.flags)
+    except Exception:  # pragma: no cover
+        return None
+
+    result = _first_chars_seq(parsed, regexp.flags)
+    if result is None or result[2]:
+        return None
+    chars, non_ascii = result[0], result[1]
+
+    if any(ord(char) >= 128 for char in chars):
+        if regexp.flags & re.IGNORECASE or not isinstance(regexp.pattern, type('')):
+            # Non-ASCII chars may match ASCII chars while ignoring case
+            # (e.g the Kelvin sign and 'k'); and non-ASCII bytes of native
+            # Python 2 strings aren't unicode chars.
+            return None
+    if regexp.flags & re.IGNORECASE:
+        # Some non-ASCII chars match ASCII letters while ignoring case
+        # (e.g 'k' and the Kelvin sign).
+        chars = set(chars) | set(char.lower() for char in chars) | set(
+            char.upper() for char in chars)
+        non_ascii = True
+    return frozenset(chars), non_ascii
+
+
+def _max_width(regexp):
+    """Compute the maximum length of the matches of a compiled regexp.
+
+    Returns:
+        int: the maximum length, or None if it is unbounded or can't be
+            computed.
+    """
+    try:
+        width = sre_parse.parse(regexp.pattern, regexp.flags).getwidth()[1]
+    except Exception:  # pragma: no cover
+        return None
+    if width >= _MAXREPEAT - 1:
+        return None
+    return width
+
+
+def _literal_text(regexp):
+    """Retrieve the fixed string matched by a compiled regexp, if any.
+
+    Returns:
+        str: the only text the regexp matches; None if it may match other
+            texts, uses non-default flags, or matches the empty string.
+    """
+    if regexp.flags != re.compile(regexp.pattern[:0]).flags:
+        return None
+    try:
+        parsed = sre_parse.parse(regexp.pattern)
+    except Exception:  # pragma: no cover
+        return None
+    chars = []
+    for op, av in parsed:
+        if op is not sre_parse.LITERAL:
+            return None
+        chars.append(unichr(av))
+    return ''.join(chars) or None
+
+
+# Leading inline flags, e.g (?i), followed by an anchor at the start of the text
+_LEADING_ANCHOR = re.compile(r'((?:\(\?[a-zA-Z]+\))*)(?:\^|\\A)')
+
+
+def _unanchored(regexp):
+    """Remove the anchor at the start of a compiled regexp, if any.
+
+    Tokens are matched with regexp.match(text, pos), which already anchors
+    them at pos; whereas '^' and '\\A' only match at the start of the text.
+    In MULTILINE regexps, '^' is kept: it also matches after newlines.
+
+    Returns:
+        re: the regexp without its leading anchor.
+    """
+    if not isinstance(regexp.pattern, _TEXT_TYPES):
+        return regexp
+    try:
+        parsed = sre_parse.parse(regexp.pattern, regexp.flags)
+    except Exception:  # pragma: no cover
+        return regexp
+    if not len(parsed) or parsed[0][0] is not sre_parse.AT:
+        return regexp
+    anchor = parsed[0][1]
+    if not (anchor is sre_parse.AT_BEGINNING_STRING or (
+            anchor is sre_parse.AT_BEGINNING and not regexp.flags & re.MULTILINE)):
+        return regexp
+    match = _LEADING_ANCHOR.match(regexp.pattern)
+    if match is None:
+        return regexp
+    return re.compile(match.group(1) + regexp.pattern[match.end():], regexp.flags)
+
+
+def _longest_match(candidates, text, start, best_index, best_end, best_match):
+    """Try regexps at start, keeping the longest (or earliest registered) match.
+
+    Args:
+        candidates ((int, Token, re) list): the regexps, with their index in
+            the registry
+        text (str): the text
+        start (int): the position in the text
+        best_index, best_end, best_match: the best match so far
+
+    Returns:
+        (int, re.Match): the index and match of the best match
+    """
+    for index, _token_class, regexp in candidates:
+        match = regexp.match(text, start)
+        if match is None:
+            continue
+        end = match.end()
+        if end > best_end or (end == best_end and index < best_index):
+            best_index, best_end, best_match = index, end, match
+    return best_index, best_match
+
+
+class _LazyRegexp(object):
+    """A regexp compiled on first use.
+
+    Attributes of the compiled regexp (e.g `match`) are copied to the
+    instance when first accessed, so that later lookups are direct.
+
+    Attributes:
+        pattern (str): the source of the regexp
+        flags (int): its flags
+    """
+
+    def __init__(self, pattern, flags):
+        self.pattern = pattern
+        self.flags = flags
+
+    def __getattr__(self, name):
+        # Only called for missing attributes.
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, value)
+        return value
+
+    def __reduce__(self):
+        return (_LazyRegexp, (self.pattern, self.flags))
+
+    def __repr__(self):
+        return '<_LazyRegexp: %r>' % self.pattern
 
 
 class TokenRegistry(object):
@@ -21,19 +362,127 @@ class TokenRegistry(object):
 
     Attributes:
         _tokens ((Token, re) list): the registered tokens.
+        _literals (dict(int => str)): the fixed strings of the tokens
+            registered through register_literal(), by index in _tokens.
+        _index (dict(str => (Token, re) list)): for each possible first
+            character, the registered tokens that may start with it.
+            Built lazily, and reset by register().
+        _default ((Token, re) list): the tokens that may start with a
+            character missing from _index.
+        _at_end ((Token, re) list): the tokens that may match at the end of
+            the text.
+        _regexp_index, _regexp_default, _regexp_at_end: same as _index,
+            _default and _at_end, as (index in _tokens, Token, re) and
+            without the literals.
+        _trie ([dict, int]): the literals, as nested [children, index] nodes;
+            index is that of the earliest registered literal ending at that
+            node, or None.
     """
 
     def __init__(self):
         self._tokens = []
+        self._literals = {}
+        self._index = self._default = self._at_end = None
+        self._regexp_index = self._regexp_default = self._regexp_at_end = None
+        self._trie = None
 
     def register(self, token, regexp):
         """Register a token.
 
+        Tokens are matched at the current position of the text: a leading
+        '^' or '\\A' anchor is dropped (see _unanchored).
+
         Args:
             token (Token): the token class to register
             regexp (str): the regexp for that token
         """
-        self._tokens.append((token, re.compile(regexp)))
+        self._tokens.append((token, _unanchored(re.compile(regexp))))
+        self._index = self._default = self._at_end = None
+
+    def register_literal(self, token, literal):
+        """Register a token matching a fixed string.
+
+        Literals are looked up in a trie, walking the text once, instead of
+        being tried one by one; they still compete with other tokens for the
+        longest match.
+
+        Args:
+            token (Token): the token class to register
+            literal (str): the text of that token
+        """
+        if not literal:
+            raise ValueError("A literal token can't be empty.")
+        self.register(token, re.escape(literal))
+        self._literals[len(self._tokens) - 1] = literal
+
+    def __getstate__(self):
+        # The index is rebuilt lazily: no need to pickle it.
+        return {'_tokens': self._tokens, '_literals': self._literals}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._tokens = state['_tokens']
+        self._literals = state['_literals']
+
+    def _build_index(self):
+        """Build the first character => candidate tokens index.
+
+        Tokens whose regexp can't be analysed (see _first_chars) are candidates
+        for all characters.
+        """
+        first_chars = [_first_chars(regexp) for _token, regexp in self._tokens]
+
+        keys = set(unichr(code) for code in range(128))
+        for item in first_chars:
+            if item is not None:
+                keys.update(item[0])
+
+        def select(predicate):
+            indexes = [index for index, item in enumerate(first_chars) if predicate(item)]
+            return (
+                [self._tokens[index] for index in indexes],
+                [(index,) + self._tokens[index] for index in indexes
+                    if index not in self._literals],
+            )
+
+        index = {}
+        regexp_index = {}
+        for key in keys:
+            is_ascii = ord(key) < 128
+            index[key], regexp_index[key] = select(lambda item:
+                item is None or key in item[0] or (item[1] and not is_ascii))
+
+        self._index = index
+        self._regexp_index = regexp_index
+        self._default, self._regexp_default = select(
+            lambda item: item is None or item[1])
+        self._at_end, self._regexp_at_end = select(lambda item: item is None)
+
+        trie = [{}, None]
+        for position, literal in sorted(self._literals.items()):
+            node = trie
+            for char in literal:
+                node = node[0].setdefault(char, [{}, None])
+            if node[1] is None:
+                node[1] = position
+        self._trie = trie
+
+    def candidate_tokens(self, text, start=0):
+        """Retrieve token definitions which may match a text at start.
+
+        Args:
+            text (str): the text to test
+            start (int): the position in the text
+
+        Returns:
+            (Token, re) list: the candidate token definitions, in registration
+                order
+        """
+        if self._index is None:
+            self._build_index()
+        if start >= len(text):
+            return self._at_end
+        return self._index.get(text[start], self._default)
 
     def matching_tokens(self, text, start=0):
         """Retrieve all token definitions matching the beginning of a text.
@@ -47,7 +496,7 @@ class TokenRegistry(object):
             (token_class, re.Match): all token class whose regexp matches the
                 text, and the related re.Match object.
         """
-        for token_class, regexp in self._tokens:
+        for token_class, regexp in self.candidate_tokens(text, start):
             match = regexp.match(text, pos=start)
             if match:
                 yield token_class, match
@@ -55,32 +504,603 @@ class TokenRegistry(object):
     def get_token(self, text, start=0):
         """Retrieve the next token from some text.
 
+        The longest match wins; among matches of the same length, the first
+        registered token wins.
+
         Args:
             text (str): the text from which tokens should be extracted
+            start (int): the position where matches should be searched in the
+                string (see re.match(rx, txt, pos))
 
         Returns:
             (token_kind, token_text): the token kind and its content.
         """
-        best_class = best_match = None
+        if self._index is None:
+            self._build_index()
+
+        best_index = best_end = -1
+        length = len(text)
+        if self._literals:
+            # Longest literal
+            node = self._trie
+            pos = start
+            while pos < length:
+                node = node[0].get(text[pos])
+                if node is None:
+                    break
+                pos += 1
+                if node[1] is not None:
+                    best_index, best_end = node[1], pos
+
+        best_index, best_match = self._match_regexps(text, start, best_index, best_end)
+        if best_index < 0:
+            return None, None
+        token_class, regexp = self._tokens[best_index]
+        if best_match is None:
+            best_match = regexp.match(text, start)
+        return token_class, best_match
+
+    def _match_regexps(self, text, start, best_index, best_end):
+        """Try the candidate regexps at start, against the best match so far.
 
-        for token_class, match in self.matching_tokens(text):
-            if best_match and best_match.end() >= match.end():
-                continue
-            best_match = match
-            best_class = token_class
+        Args:
+            text (str): the text
+            start (int): the position in the text
+            best_index (int): the index in _tokens of the best match so far,
+                -1 if none
+            best_end (int): the end of that match
 
-        return best_class, best_match
+        Returns:
+            (int, re.Match): the index of the best match, and the match
+                if found by a regexp (None for literals).
+        """
+        if start >= len(text):
+            candidates = self._regexp_at_end
+        else:
+            candidates = self._regexp_index.get(text[start], self._regexp_default)
+        return _longest_match(candidates, text, start, best_index, best_end, None)
 
     def __len__(self):
         return len(self._tokens)
 
 
+class CompiledTokenRegistry(TokenRegistry):
+    """A TokenRegistry fusing its regexps into alternations.
+
+    As in TokenRegistry, literals are looked up in a trie, and regexps are
+    indexed by their possible first characters; regexps matching a fixed
+    string (e.g ``\\+\\+``) are also moved to the trie.
+    The fusable regexps among the candidates for a character are embedded in
+    an alternation as ``(?:regexp)(?P<_tdparser_N>)``; the empty trailing
+    group marks which alternative matched, and keeps the regexp's first
+    character visible to the regexp engine for its fast paths.
+
+    A regexp alternation returns the first alternative that matches, whereas
+    get_token must return the longest match.
+    After a match on alternative k, matching resumes on the alternation of
+    alternatives k+1..n, until no further alternative matches. Each of these
+    alternations is only compiled when first needed.
+
+    Regexps that can't be fused (see _is_fusable) are tried one at a time.
+
+    Attributes:
+        _buckets (dict(str => ((int, Token, re) list, dict, (int, Token, re) list))):
+            for each key of _regexp_index, its fused candidates, the
+            alternations of these candidates from each position onwards (as
+            (re, dict(int => int)) pairs mapping marker group numbers to
+            positions), and its other candidates. Keys with the same
+            candidates share their bucket. Built along with the index;
+            alternations are compiled when first needed.
+        _bucket_default, _bucket_at_end: the buckets of _regexp_default and
+            _regexp_at_end.
+    """
+
+    def __init__(self):
+        super(CompiledTokenRegistry, self).__init__()
+        self._buckets = self._bucket_default = self._bucket_at_end = None
+
+    def _build_index(self):
+        """Build the index, then split the candidates of each of its keys between fused and other ones.
+
+        Regexps matching a fixed string are moved to the trie of literals.
+        """
+        for index, (_token_class, regexp) in enumerate(self._tokens):
+            if index not in self._literals:
+                literal = _literal_text(regexp)
+                if literal is not None:
+                    self._literals[index] = literal
+        super(CompiledTokenRegistry, self)._build_index()
+
+        # Keys of the index often share the same candidates (e.g all letters
+        # for identifiers): share their alternations.
+        buckets = {}
+        fusable = dict((index, _is_fusable(regexp))
+            for index, (_token_class, regexp) in enumerate(self._tokens)
+            if index not in self._literals)
+
+        def bucket(candidates):
+            key = tuple(index for index, _token_class, _regexp in candidates)
+            if key not in buckets:
+                buckets[key] = self._build_bucket(candidates, fusable)
+            return buckets[key]
+
+        self._bucket_default = bucket(self._regexp_default)
+        self._bucket_at_end = bucket(self._regexp_at_end)
+        self._buckets = dict((key, bucket(candidates))
+            for key, candidates in self._regexp_index.items())
+
+    def _build_bucket(self, candidates, fusable):
+        fused = []
+        others = []
+        group_names = set()
+        for entry in candidates:
+            regexp = entry[2]
+            if fusable[entry[0]] and not group_names & set(regexp.groupindex):
+                fused.append(entry)
+                group_names.update(regexp.groupindex)
+            else:
+                others.append(entry)
+        if len(fused) < 2:
+            return [], {}, list(candidates)
+        return fused, {}, others
+
+    def _get_tail(self, bucket, first):
+        """Retrieve (and compile) the alternation of the fused regexps of a bucket from first."""
+        fused, tails, _others = bucket
+        try:
+            return tails[first]
+        except KeyError:
+            pass
+
+        # Named markers: only the source of the fused regexps is needed, they
+        # aren't compiled if lazy.
+        alternation = re.compile('|'.join('(?:%s)(?P<%s%d>)' % (
+                fused[position][2].pattern, _MARKER_PREFIX, position)
+            for position in range(first, len(fused))))
+        markers = dict((group, int(name[len(_MARKER_PREFIX):]))
+            for name, group in alternation.groupindex.items()
+            if name.startswith(_MARKER_PREFIX))
+
+        tail = (alternation, markers)
+        # Concurrent lookups may compile the same tail: either one is kept.
+        tails[first] = tail
+        return tail
+
+    def _match_regexps(self, text, start, best_index, best_end):
+        if start >= len(text):
+            bucket = self._bucket_at_end
+        else:
+            bucket = self._buckets.get(text[start], self._bucket_default)
+        fused, tails, others = bucket
+
+        position = 0
+        nb_fused = len(fused)
+        while position < nb_fused:
+            tail = tails.get(position)
+            if tail is None:
+                tail = self._get_tail(bucket, position)
+            match = tail[0].match(text, start)
+            if match is None:
+                break
+            position = tail[1][match.lastindex]
+            index = fused[position][0]
+            end = match.end()
+            if end > best_end or (end == best_end and index < best_index):
+                best_index, best_end = index, end
+            position += 1
+
+        # Matches of fused regexps are redone by get_token, on the selected
+        # regexp only.
+        return _longest_match(others, text, start, best_index, best_end, None)
+
+
+class AdaptiveTokenRegistry(TokenRegistry):
+    """A TokenRegistry trying first the regexps which are selected most often.
+
+    The number of times each regexp provides the selected token is counted;
+    every reorder_interval lookups, candidate regexps are sorted by
+    decreasing count, and the interval is doubled.
+
+    Once a regexp matched, the other candidates are only tried if they may
+    provide a better match: a longer one, or one as long from a token
+    registered earlier. This relies on the maximum length of their matches,
+    computed from their structure; e.g a literal has a fixed length, whereas
+    a regexp with an unbounded repetition is always tried.
+
+    The selected tokens are those TokenRegistry would select.
+
+    Attributes:
+        hits (int list): for each registered token, the number of times it
+            was selected
+        reorder_interval (int): the number of lookups before the next
+            reordering
+        _ordered (dict(str => (int, re, int, int) list)): for each key of
+            _index, the (index in _tokens, regexp, maximum match length,
+            maximum match length of the next candidates) of its candidates,
+            most selected first. Built lazily, and reset by register().
+    """
+
+    reorder_interval = 1000
+    max_reorder_interval = 1 << 20
+
+    def __init__(self):
+        super(AdaptiveTokenRegistry, self).__init__()
+        self.hits = []
+        self._lookups = 0
+        self._ordered = self._ordered_default = self._ordered_at_end = None
+
+    def register(self, token, regexp):
+        super(AdaptiveTokenRegistry, self).register(token, regexp)
+        self._ordered = self._ordered_default = self._ordered_at_end = None
+
+    def __setstate__(self, state):
+        super(AdaptiveTokenRegistry, self).__setstate__(state)
+        self.hits = [0] * len(self._tokens)
+
+    def hit_rates(self):
+        """Compute the share of lookups won by each token.
+
+        Returns:
+            (Token, float) list: for each registered token, the fraction of
+                selected tokens it provided.
+        """
+        total = sum(self.hits) or 1
+        return [(token_class, hits / float(total))
+            for (token_class, _regexp), hits in zip(self._tokens, self.hits)]
+
+    def _build_ordered(self):
+        if self._index is None:
+            self._build_index()
+        self.hits.extend([0] * (len(self._tokens) - len(self.hits)))
+        positions = dict((id(entry), index) for index, entry in enumerate(self._tokens))
+        widths = []
+        for _token_class, regexp in self._tokens:
+            width = _max_width(regexp)
+            widths.append(float('inf') if width is None else width)
+
+        def ordered(candidates):
+            entries = []
+            for entry in candidates:
+                index = positions[id(entry)]
+                entries.append((index, entry[1], widths[index], None))
+            self._sort_candidates(entries)
+            return entries
+
+        self._ordered = dict((key, ordered(candidates))
+            for key, candidates in self._index.items())
+        self._ordered_default = ordered(self._default)
+        self._ordered_at_end = ordered(self._at_end)
+
+    def _sort_candidates(self, candidates):
+        """Sort candidates by decreasing number of hits, in place.
+
+        The last item of each entry is the maximum match length of the
+        following candidates.
+        """
+        hits = self.hits
+        candidates.sort(key=lambda entry: (-hits[entry[0]], entry[0]))
+        rest_width = -1
+        for position in range(len(candidates) - 1, -1, -1):
+            index, regexp, max_width, _rest_width = candidates[position]
+            candidates[position] = (index, regexp, max_width, rest_width)
+            rest_width = max(rest_width, max_width)
+
+    def _reorder(self):
+        for candidates in self._ordered.values():
+            self._sort_candidates(candidates)
+        self._sort_candidates(self._ordered_default)
+        self._sort_candidates(self._ordered_at_end)
+        self._lookups = 0
+        self.reorder_interval = min(2 * self.reorder_interval, self.max_reorder_interval)
+
+    def get_token(self, text, start=0):
+        if self._ordered is None:
+            self._build_ordered()
+        self._lookups += 1
+        if self._lookups >= self.reorder_interval:
+            self._reorder()
+
+        if start >= len(text):
+            candidates = self._ordered_at_end
+        else:
+            candidates = self._ordered.get(text[start], self._ordered_default)
+
+        best_index = best_width = -1
+        best_match = None
+        for index, regexp, max_width, rest_width in candidates:
+            if max_width > best_width or (max_width == best_width and index < best_index):
+                match = regexp.match(text, start)
+                if match is not None:
+                    width = match.end() - start
+                    if width > best_width or (width == best_width and index < best_index):
+                        best_index, best_width, best_match = index, width, match
+            if rest_width < best_width:
+                # No other candidate may provide a longer match.
+                break
+
+        if best_match is None:
+            return None, None
+        self.hits[best_index] += 1
+        return self._tokens[best_index][0], best_match
+
+
+class FrozenTokenRegistry(CompiledTokenRegistry):
+    """An immutable CompiledTokenRegistry, analysed once when built.
+
+    Built from the tokens of another registry, it selects the same tokens:
+    - Regexps matching a fixed string are moved to the trie of literals
+    - The first character => candidates index, and the split of each set of
+      candidates between fused and other regexps, are built upfront
+    - As in CompiledTokenRegistry, the alternations of the fused regexps are
+      compiled when first needed
+
+    Lookups only fill the cache of alternations: the registry may be shared
+    between threads. It is pickled along with its analysis, but without the
+    alternations; once unpickled, each regexp is only compiled when first
+    used (see _LazyRegexp).
+
+    Attributes:
+        conflicts ((Token, Token) list): pairs of (shadowed, shadowing) token
+            classes, where a literal is matched as long by a regexp or
+            literal registered earlier, and thus never selected
+    """
+
+    def __init__(self, registry=None):
+        super(FrozenTokenRegistry, self).__init__()
+        self.conflicts = []
+        if registry is not None:
+            self._tokens = list(registry._tokens)
+            self._literals = dict(registry._literals)
+            self._analyse()
+
+    def register(self, token, regexp):
+        raise TypeError("A FrozenTokenRegistry can't be modified.")
+
+    def __getstate__(self):
+        # Keep the analysis, so that unpickling doesn't redo it; but not the
+        # compiled alternations, and replace regexps by lazy ones.
+        if self._index is None:
+            self._analyse()
+        lazy = {}
+        lists = {}
+        buckets = {}
+
+        def entries(items):
+            """Copy a list of (..., re) tuples, sharing equal lists."""
+            key = tuple(items)
+            if key not in lists:
+                copy = []
+                for item in items:
+                    regexp = item[-1]
+                    if regexp not in lazy:
+                        lazy[regexp] = regexp if isinstance(regexp, _LazyRegexp) else (
+                            _LazyRegexp(regexp.pattern, regexp.flags))
+                    copy.append(item[:-1] + (lazy[regexp],))
+                lists[key] = copy
+            return lists[key]
+
+        def bucket(value):
+            if id(value) not in buckets:
+                fused, _tails, others = value
+                buckets[id(value)] = (entries(fused), {}, entries(others))
+            return buckets[id(value)]
+
+        state = dict(self.__dict__)
+        state['_tokens'] = entries(self._tokens)
+        for name in ('_index', '_regexp_index'):
+            state[name] = dict((key, entries(items))
+                for key, items in state[name].items())
+        for name in ('_default', '_at_end', '_regexp_default', '_regexp_at_end'):
+            state[name] = entries(state[name])
+        state['_buckets'] = dict((key, bucket(value))
+            for key, value in self._buckets.items())
+        state['_bucket_default'] = bucket(self._bucket_default)
+        state['_bucket_at_end'] = bucket(self._bucket_at_end)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _analyse(self):
+        self._build_index()
+        self.conflicts = self._find_conflicts()
+
+    def _find_conflicts(self):
+        conflicts = []
+        for index, literal in sorted(self._literals.items()):
+            for previous in range(index):
+                regexp = self._tokens[previous][1]
+                match = regexp.match(literal)
+                if match is not None and match.end() == len(literal):
+                    conflicts.append((self._tokens[index][0], self._tokens[previous][0]))
+                    break
+        return conflicts
+
+
+class ColumnarTokens(object):
+    """A compact sequence of lexed tokens.
+
+    Tokens are stored as their kind (an index in token_classes) and offsets
+    in the text; Token instances are only built when accessed.
+
+    Attributes:
+        text (str): the lexed text
+        token_classes (Token list): the classes of tokens, indexed by kind
+        kinds (array of int): for each token, the index of its class
+        starts (array of int): for each token, the offset of its start
+        ends (array of int): for each token, the offset of its end
+    """
+
+    def __init__(self, text, token_classes, kinds, starts, ends):
+        self.text = text
+        self.token_classes = token_classes
+        self.kinds = kinds
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def token_class(self, index):
+        """Retrieve the class of the index-th token, without building it."""
+        return self.token_classes[self.kinds[index]]
+
+    def token_text(self, index):
+        """Retrieve the text of the index-th token, without building it."""
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start = self.starts[index]
+        end = self.ends[index]
+        token = self.token_classes[self.kinds[index]](self.text[start:end])
+        token.start = start
+        token.end = end
+        return token
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return '<ColumnarTokens: %d tokens>' % len(self)
+
+
+# Default number of characters read at once by Lexer.lex_stream
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Default limit on the text read ahead by Lexer.lex_stream when no token
+# matches; at least this many characters, or four chunks.
+_STREAM_MAX_TOKEN_SIZE = 4 * _STREAM_CHUNK_SIZE
+
+# Number of consumed characters kept before the current position when
+# streaming, for look-behind assertions.
+_STREAM_CONTEXT = 64
+
+
+class _StreamScanner(object):
+    """Lex a text received chunk by chunk.
+
+    Tokens are only matched once at least `lookahead` characters are
+    available after the current position; and if a match reaches the end of
+    the available text, matching is retried once more text is available.
+    If no token matches, matching is also retried once twice as much text
+    is available, as a token may be longer than the available text; the
+    LexerError is only raised when the whole text, or max_token_size
+    characters after the current position, are available. Blank chars are
+    likewise only skipped then, as a token may start with them.
+    Only the text after the last token, and a few characters before it, are
+    kept.
+
+    Attributes:
+        lexer (Lexer): the lexer whose tokens are matched
+        lookahead (int): the number of characters required after the current
+            position before matching
+        max_token_size (int): the number of characters after the current
+            position beyond which no more text is read when no token matches
+        text (str): the available text
+        offset (int): the offset of text in the whole text
+        pos (int): the current position within text
+        _retry ((int, int)): the position where no token matched, and the
+            number of characters required after it before matching again
+    """
+
+    def __init__(self, lexer, lookahead, max_token_size, text=''):
+        self.lexer = lexer
+        self.lookahead = lookahead
+        self.max_token_size = max_token_size
+        self.text = text
+        self.offset = 0
+        self.pos = 0
+        self._retry = (None, lookahead)
+        self._skipper = lexer._get_skipper()
+
+    def feed(self, chunk):
+        """Add a chunk of text.
+
+        The returned tokens must be consumed before feeding the next chunk.
+
+        Yields:
+            Token: the tokens which could be matched.
+        """
+        # Drop the consumed text, but keep some context for look-behind
+        # assertions.
+        drop = max(0, self.pos - _STREAM_CONTEXT)
+        self.text = self.text[drop:] + chunk
+        self.offset += drop
+        self.pos -= drop
+        if self._retry[0] is not None:
+            self._retry = (self._retry[0] - drop, self._retry[1])
+        return self._scan(eof=False)
+
+    def close(self):
+        """Signal the end of the text.
+
+        Yields:
+            Token: the remaining tokens, including the end token.
+        """
+        for token in self._scan(eof=True):
+            yield token
+        end_token = self.lexer.end_token()
+        end_token.start = end_token.end = self.offset + len(self.text)
+        yield end_token
+
+    def _scan(self, eof):
+        skipper = self._skipper
+        get_token = self.lexer.tokens.get_token
+        blank_chars = self.lexer.blank_chars
+        text = self.text
+        length = len(text)
+        offset = self.offset
+        pos = self.pos
+        retry_pos, retry_lookahead = self._retry
+
+        while pos < length and (eof or length - pos >= (
+                retry_lookahead if pos == retry_pos else self.lookahead)):
+            if skipper is not None:
+                match = skipper.match(text, pos)
+                if match and match.end() > pos:
+                    if match.end() == length and not eof:
+                        break
+                    pos = match.end()
+                    continue
+
+            token_class, match = get_token(text, pos)
+            if token_class is not None:
+                if match.end() == length and not eof:
+                    break
+                token_text = match.group()
+                if token_class.keywords:
+                    token_class = token_class.keywords.get(token_text, token_class)
+                token = token_class(token_text)
+                token.start = offset + pos
+                token.end = offset + match.end()
+                pos = self.pos = match.end()
+                yield token
+            elif not eof and length - pos < self.max_token_size:
+                # A token may be longer than the available text.
+                self._retry = (pos, min(2 * (length - pos), self.max_token_size))
+                break
+            elif text[pos] in blank_chars:
+                pos += 1
+            else:
+                self.pos = pos
+                raise LexerError(
+                        'Invalid character %s in %s' % (
+                            text[pos], text[pos:pos + _STREAM_CONTEXT]),
+                        position=offset + pos)
+
+        self.pos = pos
+
+
 class Lexer(object):
     """The core lexer.
 
     From its list of tokens (provided through the TOKENS class attribute or
     overridden in the _tokens method), it will parse the given text, with the
     following rules:
+    - Skip any run of trivia and of blank characters no token may start with
     - For each (token, regexp) pair, try to match the regexp at the beginning
       of the text
     - If this matches, add token_class(match) to the list of tokens and continue
@@ -88,14 +1108,28 @@ class Lexer(object):
     - Otherwise, raise a LexerError.
 
     Attributes:
-        tokens (Token, re) list: The known tokens, as a (token class, regexp) list.
+        tokens (TokenRegistry): The known tokens; registry_class selects the
+            TokenRegistry implementation (e.g CompiledTokenRegistry).
+        trivia (re list): regexps for text to skip, such as comments
+        grammar_version (int): incremented whenever tokens or trivia are
+            registered, to invalidate cached data
+        parse_cache (ParseCache): if set, parse() results are memoized there
+        parser_class (Parser): the class of parser used by parse()
+        _skipper ((frozenset, re)): the blank chars covered by the compiled
+            regexp skipping blank chars and trivia.
     """
 
     def __init__(self, with_parens=False, blank_chars=(' ', '\t'), end_token=EndToken,
+        registry_class=TokenRegistry, parse_cache=None, parser_class=Parser,
         *args, **kwargs):
-        self.tokens = TokenRegistry()
+        self.tokens = registry_class()
+        self.parser_class = parser_class
         self.blank_chars = set(blank_chars)
         self.end_token = end_token
+        self.trivia = []
+        self.grammar_version = 0
+        self.parse_cache = parse_cache
+        self._skipper = None
 
         if with_parens:
             self.register_token(LeftParen, re.compile(r'\('))
@@ -103,6 +1137,23 @@ class Lexer(object):
 
         super(Lexer, self).__init__(*args, **kwargs)
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # Caches aren't shared with copies of the lexer.
+        state['parse_cache'] = None
+        state['_skipper'] = None
+        return state
+
+    def freeze(self):
+        """Build an immutable copy of this lexer, analysing its tokens once.
+
+        The copy isn't affected by later changes to this lexer.
+
+        Returns:
+            FrozenLexer: the frozen lexer
+        """
+        return FrozenLexer(self)
+
     def register_token(self, token_class, regexp=None):
         """Register a token class.
 
@@ -115,6 +1166,23 @@ class Lexer(object):
             regexp = token_class.regexp
 
         self.tokens.register(token_class, regexp)
+        self.grammar_version += 1
+
+    def register_literal(self, token_class, *strings):
+        """Register a token class matching fixed strings, e.g keywords or operators.
+
+        With the default TokenRegistry, literals are looked up in a trie
+        instead of being tried one regexp at a time. They compete with other
+        tokens as regexps would: e.g '**' wins over '*', and the first
+        registered token wins among matches of the same length.
+
+        Args:
+            token_class (tdparser.Token): the token class to register
+            strings (str list): the texts of that token
+        """
+        for literal in strings:
+            self.tokens.register_literal(token_class, literal)
+        self.grammar_version += 1
 
     def register_tokens(self, *token_classes):
         """Helper for registering a set of token classes.
@@ -124,42 +1192,456 @@ class Lexer(object):
         for token_class in token_classes:
             self.register_token(token_class)
 
-    def lex(self, text):
-        """Split self.text into a list of tokens.
+    def register_trivia(self, regexp):
+        """Register a regexp for text to skip, e.g comments or newlines.
+
+        Trivia are skipped before looking for tokens, along with blank chars.
 
         Args:
-            text (str): text to parse
+            regexp (str): the regexp for the skipped text; it will be embedded
+                in a larger regexp, and thus can't use flags or group
+                references.
+        """
+        regexp = _unanchored(re.compile(regexp))
+        if not _is_fusable(regexp):
+            raise ValueError("Trivia regexp %r can't use flags or group references."
+                % regexp.pattern)
+        self.trivia.append(regexp)
+        self._skipper = None
+        self.grammar_version += 1
+
+    def _get_skipper(self):
+        """Retrieve the regexp matching runs of blank chars and trivia.
+
+        Blank chars which may start a token aren't included: those are only
+        skipped if no token matches.
+
+        Returns:
+            re: the compiled regexp, None if there is nothing to skip.
+        """
+        blank_chars = frozenset(char for char in self.blank_chars
+            if not self.tokens.candidate_tokens(char))
+        if self._skipper is None or self._skipper[0] != blank_chars:
+            alternatives = ['(?:%s)' % trivia.pattern for trivia in self.trivia]
+            if blank_chars:
+                alternatives.insert(0, '[%s]+' % ''.join(
+                    re.escape(char) for char in sorted(blank_chars)))
+            if alternatives:
+                skipper = re.compile('(?:%s)+' % '|'.join(alternatives))
+            else:
+                skipper = None
+            self._skipper = (blank_chars, skipper)
+        return self._skipper[1]
+
+    def _scan(self, text, pos=0, recover=False):
+        """Walk a text, finding its tokens.
+
+        Args:
+            text (str): text to lex
+            pos (int): the position where lexing should start
+            recover (bool): whether to yield ErrorToken for runs of invalid
+                text, instead of raising a LexerError
 
         Yields:
-            Token: the tokens generated from the given text.
+            (token_class, re.Match): the class and match of each token.
         """
-        pos = 0
-        while text:
-            token_class, match = self.tokens.get_token(text)
+        # Walk the text by offset rather than slicing it: slicing would copy
+        # the remaining text after each token, which is quadratic.
+        skipper = self._get_skipper()
+        get_token = self.tokens.get_token
+        length = len(text)
+        while pos < length:
+            if skipper is not None:
+                match = skipper.match(text, pos)
+                if match:
+                    pos = match.end()
+                    if pos >= length:
+                        break
+
+            token_class, match = get_token(text, pos)
             if token_class is not None:
-                matched_text = text[match.start():match.end()]
-                yield token_class(matched_text)
-                text = text[match.end():]
-                pos += match.end()
-            elif text[0] in self.blank_chars:
-                text = text[1:]
+                if token_class.keywords:
+                    token_class = token_class.keywords.get(match.group(), token_class)
+                yield token_class, match
+                pos = match.end()
+            elif text[pos] in self.blank_chars:
                 pos += 1
+            elif recover:
+                end = self._error_end(text, pos + 1, skipper)
+                yield ErrorToken, _ERROR_RUN.match(text, pos, end)
+                pos = end
             else:
                 raise LexerError(
-                        'Invalid character %s in %s' % (text[0], text),
+                        'Invalid character %s in %s' % (text[pos], text[pos:]),
                         position=pos)
 
-        yield self.end_token()
+    def _error_end(self, text, pos, skipper):
+        """Find the end of a run of invalid text.
+
+        The run stops at the first blank char, trivia or token.
+        """
+        get_token = self.tokens.get_token
+        length = len(text)
+        while pos < length:
+            if text[pos] in self.blank_chars:
+                break
+            if skipper is not None:
+                match = skipper.match(text, pos)
+                if match and match.end() > pos:
+                    break
+            if get_token(text, pos)[0] is not None:
+                break
+            pos += 1
+        return pos
+
+    def lex(self, text, recover=False):
+        """Split self.text into a list of tokens.
+
+        Args:
+            text (str): text to parse
+            recover (bool): whether to emit an ErrorToken for each run of
+                invalid text and go on, instead of raising a LexerError; the
+                LexerError is available as the token's `error`.
+
+        Yields:
+            Token: the tokens generated from the given text, with their
+                start and end offsets.
+
+        Raises:
+            LexerError: on invalid text, with its line and column.
+        """
+        lines = LineIndex(text)
+        try:
+            for token_class, match in self._scan(text, recover=recover):
+                token = token_class(match.group())
+                token.start, token.end = match.span()
+                if token_class is ErrorToken:
+                    token.error = LexerError('Invalid text %s' % token.text,
+                        position=token.start).locate(lines)
+                yield token
+        except LexerError as e:
+            e.locate(lines)
+            raise
+
+        end_token = self.end_token()
+        end_token.start = end_token.end = len(text)
+        yield end_token
+
+    def lex_stream(self, stream, chunk_size=_STREAM_CHUNK_SIZE, max_token_size=None):
+        """Lex text read from a file-like object, chunk by chunk.
+
+        Before matching a token, at least chunk_size characters are read
+        after the current position; if a match reaches the end of the
+        available text, or if no token matches, more text is read and
+        matching is tried again, up to max_token_size characters.
+        This yields the same tokens as lex(stream.read()) for tokens shorter
+        than chunk_size, or whose beginning no other token matches and
+        shorter than max_token_size, while only holding a few chunks in
+        memory.
+
+        Args:
+            stream (file): a file-like object, opened in text mode
+            chunk_size (int): the number of characters to read at once
+            max_token_size (int): the number of characters read ahead when
+                no token matches, before raising a LexerError; defaults to
+                four chunks, and at least 256k characters
+
+        Yields:
+            Token: the tokens generated from the text, with their offsets
+                in the whole stream.
+        """
+        if max_token_size is None:
+            max_token_size = max(_STREAM_MAX_TOKEN_SIZE, 4 * chunk_size)
+        scanner = _StreamScanner(self, lookahead=chunk_size,
+            max_token_size=max_token_size, text=stream.read(0))
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            for token in scanner.feed(chunk):
+                yield token
+
+        for token in scanner.close():
+            yield token
+
+    def lex_file(self, path, encoding=None, chunk_size=_STREAM_CHUNK_SIZE,
+            max_token_size=None):
+        """Lex the content of a file, without loading it at once.
+
+        Args:
+            path (str): the path to the file
+            encoding (str): the encoding of the file
+            chunk_size (int): the number of characters to read at once
+            max_token_size (int): the number of characters read ahead when
+                no token matches; see lex_stream
+
+        Yields:
+            Token: the tokens generated from the file; see lex_stream.
+        """
+        with io.open(path, encoding=encoding) as stream:
+            for token in self.lex_stream(stream, chunk_size, max_token_size):
+                yield token
+
+    def lex_columnar(self, text):
+        """Lex a text into arrays of token kinds and offsets.
+
+        This avoids building a Token for each lexed token; see ColumnarTokens.
+
+        Args:
+            text (str): text to lex
+
+        Returns:
+            ColumnarTokens: the lexed tokens (without the final end token).
+        """
+        token_classes = []
+        class_indexes = {}
+        for token_class, _regexp in self.tokens._tokens:
+            for kind_class in [token_class] + list((token_class.keywords or {}).values()):
+                if kind_class not in class_indexes:
+                    class_indexes[kind_class] = len(token_classes)
+                    token_classes.append(kind_class)
+
+        kinds = array.array(str('H'))
+        starts = array.array(str('l'))
+        ends = array.array(str('l'))
+        for token_class, match in self._scan(text):
+            kinds.append(class_indexes[token_class])
+            starts.append(match.start())
+            ends.append(match.end())
+
+        return ColumnarTokens(text, token_classes, kinds, starts, ends)
+
+    def relex(self, tokens, text, offset, removed, inserted):
+        """Update the tokens of a text after an edit.
+
+        Only the part of the text around the edit is lexed again: lexing
+        restarts before the last token preceding the edit, and stops as soon
+        as a token ends where a previous token ended, after the edit; the
+        following tokens are reused, with their offsets shifted and the edit
+        counted on them, for IncrementalParser.
+
+        Lexing is thus proportional to the size of the edit; updating the
+        following tokens is still linear in their number, but much cheaper
+        than lexing them again.
+
+        This assumes that tokens don't depend on text before their start or
+        beyond the start of the next token (e.g through look-around
+        assertions).
+
+        Args:
+            tokens (Token list): the result of lex() on the text before the
+                edit, including the end token
+            text (str): the text after the edit
+            offset (int): the position of the edit
+            removed (int): the number of removed characters at offset
+            inserted (str): the text inserted at offset
+
+        Returns:
+            Token list: the tokens of the new text, as lex() would return;
+                this is the given list, updated in place. Tokens of unchanged
+                text are kept; those after the edit are shifted in place, and
+                count one more edit before them (see IncrementalParser).
+        """
+        delta = len(inserted) - removed
+        inserted_end = offset + len(inserted)
+        last = len(tokens) - 1
+
+        # Find the first token which doesn't end before the edit, and restart
+        # from the token preceding it: the edit may have changed its match.
+        lo, hi = 0, last
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tokens[mid].end < offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        first = max(0, lo - 1)
+        pos = tokens[first - 1].end if first else 0
+
+        new_tokens = []
+        resync = None
+        index = first
+        for token_class, match in self._scan(text, pos):
+            token = token_class(match.group())
+            token.start, token.end = match.span()
+            new_tokens.append(token)
+
+            if token.end >= inserted_end:
+                # Look for a previous token ending at the same place.
+                old_end = token.end - delta
+                while index < last and tokens[index].end < old_end:
+                    index += 1
+                if index < last and tokens[index].end == old_end:
+                    resync = index + 1
+                    break
+
+        if resync is None:
+            end_token = self.end_token()
+            end_token.start = end_token.end = len(text)
+            new_tokens.append(end_token)
+            resync = len(tokens)
+        else:
+            for token in itertools.islice(tokens, resync, None):
+                token.start += delta
+                token.end += delta
+                token._edits = getattr(token, '_edits', 0) + 1
+
+        tokens[first:resync] = new_tokens
+        return tokens
 
     def parse(self, text):
         """Parse self.text.
 
+        If a parse_cache is set, results are memoized there.
+
         Args:
             text (str): the text to lex
 
         Returns:
             object: a node representing the current rule.
         """
+        if self.parse_cache is not None:
+            return self.parse_cache.get(text, self._parse,
+                grammar_version=self.grammar_version)
+        return self._parse(text)
+
+    def parse_all(self, text, separator=None):
+        """Parse all successive expressions of a text.
+
+        Tokens are lexed as the parser needs them, and results are yielded as
+        soon as each expression is parsed.
+
+        Args:
+            text (str): the text to parse
+            separator (Token subclass): if set, the class of tokens separating
+                expressions; see Parser.parse_sequence.
+
+        Yields:
+            object: the result of each expression.
+        """
+        parser = self.parser_class(self.lex(text))
+        lines = LineIndex(text)
+        try:
+            for result in parser.parse_sequence(separator):
+                yield result
+        except Error as e:
+            e.locate(lines)
+            raise
+
+    def parse_recovering(self, text, sync_tokens=()):
+        """Parse a text, collecting all errors instead of stopping at the first.
+
+        Runs of invalid text are lexed into ErrorToken, and the parser skips
+        to the next synchronization token after each error; see
+        Parser.parse_recovering.
+
+        Args:
+            text (str): the text to parse
+            sync_tokens (Token subclass tuple): the classes of tokens at which
+                parsing resumes after an error, e.g statement terminators
+
+        Returns:
+            (list, Error list): the evaluation of each correct expression, and
+                all lexing and parsing errors, with their line and column.
+        """
+        parser = self.parser_class(self.lex(text, recover=True))
+        results, errors = parser.parse_recovering(sync_tokens)
+        lines = LineIndex(text)
+        for error in errors:
+            error.locate(lines)
+        return results, errors
+
+    def parse_many(self, texts, workers=None, chunksize=100):
+        """Parse a batch of texts, possibly in parallel.
+
+        Texts are sent by chunks to a pool of `workers` processes; the lexer
+        is pickled once for each worker, thus its token classes must be
+        importable (i.e not defined within a function).
+
+        Batches of a single chunk, or with less than 2 workers, are parsed
+        in the current process.
+
+        Args:
+            texts (str iterable): the texts to parse
+            workers (int): the number of worker processes
+            chunksize (int): the number of texts sent to a worker at once
+
+        Returns:
+            list: for each text, in the same order, either the parse result or
+                the exception raised while parsing it.
+        """
+        from . import batch
+        return batch.parse_many(self, texts, workers=workers, chunksize=chunksize)
+
+    def aparse(self, chunks, encoding=None, lookahead=_STREAM_CHUNK_SIZE,
+            max_token_size=None):
+        """Parse a text received asynchronously, chunk by chunk.
+
+        This returns a coroutine, for use with asyncio (Python 3.5+):
+
+            result = await lexer.aparse(chunks)
+
+        Chunks are lexed in the event loop as they arrive, and parsed in a
+        thread of the loop's default executor, so that large texts don't
+        block the event loop. Cancelling the awaiting task stops the parser.
+        Errors only carry their position: the text isn't kept to locate them.
+
+        Args:
+            chunks (async iterable of str): the text to parse
+            encoding (str): if set, chunks are bytes in this encoding
+            lookahead (int): the number of characters to receive after the
+                start of a token before matching it; see lex_stream
+            max_token_size (int): the number of characters to receive when
+                no token matches, before failing; see lex_stream
+
+        Returns:
+            coroutine: the result of parsing the text
+        """
+        from . import aio
+        return aio.aparse(self, chunks, encoding=encoding, lookahead=lookahead,
+            max_token_size=max_token_size)
+
+    def _parse(self, text):
         tokens = self.lex(text)
-        parser = Parser(tokens)
-        return parser.parse()
+        parser = self.parser_class(tokens)
+        try:
+            return parser.parse()
+        except Error as e:
+            # Errors only hold an offset; the line index is built on demand.
+            e.locate(LineIndex(text))
+            raise
+
+
+class FrozenLexer(Lexer):
+    """An immutable Lexer, built by Lexer.freeze().
+
+    Its tokens are held in a FrozenTokenRegistry, analysed once; tokens and
+    trivia can't be registered anymore. Lexing and parsing don't modify it:
+    it may be shared between threads, and pickled (e.g for parse_many)
+    along with its analysis.
+
+    A FrozenLexer has no parse_cache: ParseCache isn't thread-safe.
+    """
+
+    def __init__(self, lexer):
+        # Lexer.__init__ isn't called: it would build a new registry.
+        self.tokens = FrozenTokenRegistry(lexer.tokens)
+        self.parser_class = lexer.parser_class
+        self.blank_chars = frozenset(lexer.blank_chars)
+        self.end_token = lexer.end_token
+        self.trivia = tuple(lexer.trivia)
+        self.grammar_version = lexer.grammar_version
+        self.parse_cache = None
+        self._skipper = None
+        self._get_skipper()
+
+    def __getstate__(self):
+        return dict(self.__dict__)
+
+    def _refuse(self, *args, **kwargs):
+        raise TypeError("A FrozenLexer can't be modified.")
+
+    register_token = register_literal = register_trivia = _refuse
+
+    def freeze(self):
+        return self
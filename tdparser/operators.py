@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Declarative operator tables.
+
+Instead of writing a Token subclass with nud()/led() methods for each
+operator, a grammar may be described as a table of operators:
+
+    table = OperatorTable()
+    Integer = table.atom(r'\\d+', int, name='Integer')
+    Add = table.infix_left(r'\\+', 10, operator.add)
+    Minus = table.infix_left(r'-', 10, operator.sub)
+    table.prefix(Minus, 100, operator.neg)
+    table.group(r'\\(', r'\\)')
+
+    lexer = Lexer(parser_class=table.parser)
+    lexer.register_tokens(*table.token_classes)
+
+The TableParser then parses expressions through a precedence climbing loop
+driven by lookups in the table, without calling methods on tokens.
+"""
+
+from __future__ import unicode_literals
+
+from .topdown import Token, Parser, MissingTokensError
+
+
+# Kinds of table entries
+_ATOM = 0
+_PREFIX = 1
+_GROUP = 2
+_INFIX = 3
+_POSTFIX = 4
+
+
+def _identity(value):
+    return value
+
+
+class OperatorTable(object):
+    """A set of operators, with their precedence and actions.
+
+    Each method takes either a Token subclass or a regexp; for a regexp, a
+    new Token subclass is created (and returned), with that regexp and
+    attributes describing the operator, so that it also works with the
+    Parser and IterativeParser.  Token subclasses provided by the caller are
+    left untouched.
+
+    A token class may be declared both as a prefix operator and as an infix
+    or postfix operator (e.g the '-' sign).
+
+    Attributes:
+        token_classes (Token list): the token classes of the table, in
+            declaration order
+        atoms (dict(Token => callable)): action for atoms
+        prefixes (dict(Token => (int, callable))): rbp and action for prefix
+            operators
+        infixes (dict(Token => (int, int, callable))): lbp, rbp and action for
+            infix operators
+        postfixes (dict(Token => (int, callable))): lbp and action for
+            postfix operators
+        groups (dict(Token => Token)): closing token class for groups
+    """
+
+    def __init__(self):
+        self.token_classes = []
+        self.atoms = {}
+        self.prefixes = {}
+        self.infixes = {}
+        self.postfixes = {}
+        self.groups = {}
+        self._built_classes = set()
+        self._compiled = None
+
+    def _token_class(self, token, name, attrs):
+        """Retrieve (or build) the token class for an operator.
+
+        Args:
+            token (Token subclass or str): the token class, or its regexp
+            name (str): the name of the class to build
+            attrs (dict): attributes for the built class
+        """
+        if isinstance(token, type) and issubclass(token, Token):
+            token_class = token
+            if token_class in self._built_classes:
+                for attr, value in attrs.items():
+                    setattr(token_class, attr, value)
+        else:
+            attrs = dict(attrs, regexp=token, __slots__=())
+            token_class = type(str(name or 'Token%d' % len(self.token_classes)),
+                (Token,), attrs)
+            self._built_classes.add(token_class)
+
+        if token_class not in self.token_classes:
+            self.token_classes.append(token_class)
+        return token_class
+
+    def atom(self, token, action=_identity, name=None):
+        """Declare an atom, whose value is action(text) for the token's text."""
+        token_class = self._token_class(token, name,
+            {'nud': lambda self, context: action(self.text)})
+        self.atoms[token_class] = action
+        self._compiled = None
+        return token_class
+
+    def prefix(self, token, rbp, action, name=None):
+        """Declare a prefix operator, whose value is action(operand)."""
+        token_class = self._token_class(token, name, {
+            'prefix_rbp': rbp,
+            'apply_prefix': lambda self, operand: action(operand),
+        })
+        self.prefixes[token_class] = (rbp, action)
+        self._compiled = None
+        return token_class
+
+    def _infix(self, token, lbp, rbp, action, name):
+        token_class = self._token_class(token, name, {
+            'lbp': lbp,
+            'rbp': rbp,
+            'apply_infix': lambda self, left, right: action(left, right),
+        })
+        self.infixes[token_class] = (lbp, rbp, action)
+        self._compiled = None
+        return token_class
+
+    def infix_left(self, token, lbp, action, name=None):
+        """Declare a left-associative infix operator.
+
+        Its value is action(left, right).
+        """
+        return self._infix(token, lbp, lbp, action, name)
+
+    def infix_right(self, token, lbp, action, name=None):
+        """Declare a right-associative infix operator.
+
+        Its value is action(left, right).
+        """
+        return self._infix(token, lbp, lbp - 1, action, name)
+
+    def postfix(self, token, lbp, action, name=None):
+        """Declare a postfix operator, whose value is action(operand)."""
+        token_class = self._token_class(token, name, {
+            'lbp': lbp,
+            'postfix': True,
+            'apply_postfix': lambda self, operand: action(operand),
+        })
+        self.postfixes[token_class] = (lbp, action)
+        self._compiled = None
+        return token_class
+
+    def group(self, opening, closing, name=None, closing_name=None):
+        """Declare a group, e.g parentheses.
+
+        Its value is the value of the enclosed expression.
+
+        Returns:
+            (Token, Token): the opening and closing token classes
+        """
+        closing_class = self._token_class(closing, closing_name, {})
+        opening_class = self._token_class(opening, name, {
+            'nud': _group_nud(closing_class),
+        })
+        self.groups[opening_class] = closing_class
+        self._compiled = None
+        return opening_class, closing_class
+
+    def compile(self):
+        """Merge the tables into the lookup tables used by the TableParser.
+
+        Returns:
+            (dict, dict): for each token class, how to handle it at the
+                beginning of an expression, as (kind, action, rbp); and within
+                an expression, as (lbp, kind, rbp, action).
+        """
+        if self._compiled is None:
+            nulls = {}
+            for token_class, action in self.atoms.items():
+                nulls[token_class] = (_ATOM, action, None)
+            for token_class, (rbp, action) in self.prefixes.items():
+                nulls[token_class] = (_PREFIX, action, rbp)
+            for token_class, closing_class in self.groups.items():
+                nulls[token_class] = (_GROUP, closing_class, 0)
+
+            lefts = {}
+            for token_class, (lbp, action) in self.postfixes.items():
+                lefts[token_class] = (lbp, _POSTFIX, None, action)
+            for token_class, (lbp, rbp, action) in self.infixes.items():
+                lefts[token_class] = (lbp, _INFIX, rbp, action)
+
+            self._compiled = (nulls, lefts)
+        return self._compiled
+
+    def parser(self, tokens):
+        """Build a TableParser for a flow of tokens, using this table.
+
+        This can be used as the parser_class of a Lexer.
+        """
+        return TableParser(tokens, self)
+
+
+def _group_nud(closing_class):
+    def nud(self, context):
+        expr = context.expression()
+        context.consume(expect_class=closing_class)
+        return expr
+    return nud
+
+
+class TableParser(Parser):
+    """A Parser driven by an OperatorTable.
+
+    Operators from the table are handled without recursion, through table
+    lookups; other tokens' nud() and led() methods are called as usual.
+
+    Attributes:
+        table (OperatorTable): the table of operators
+    """
+
+    def __init__(self, tokens, table):
+        super(TableParser, self).__init__(tokens)
+        self.table = table
+
+    def expression(self, rbp=0):
+        nulls, lefts = self.table.compile()
+        tokens = self.tokens
+
+        # The current token and position are kept in local variables, and only
+        # synchronized with self.current_token/self.current_pos around calls
+        # to nud(), led() and consume().
+        current = self.current_token
+        pos = self.current_pos
+
+        # Pending operators, as (kind, action, rbp, left) tuples
+        stack = []
+
+        while True:
+            # Beginning of an expression
+            token = current
+            try:
+                current = next(tokens)
+            except StopIteration:
+                raise MissingTokensError("Unexpected end of token stream.",
+                    position=getattr(token, 'end', None))
+            pos += 1
+
+            null = nulls.get(token.__class__)
+            if null is None:
+                self.current_token, self.current_pos = current, pos
+                left = token.nud(context=self)
+                current, pos = self.current_token, self.current_pos
+            elif null[0] == _ATOM:
+                left = null[1](token.text)
+            else:
+                # Prefix operator, or group
+                stack.append((null[0], null[1], rbp, None))
+                rbp = null[2]
+                continue
+
+            # Within the expression
+            while True:
+                entry = lefts.get(current.__class__)
+                if entry is None:
+                    lbp = current.lbp
+                else:
+                    lbp = entry[0]
+
+                if rbp < lbp:
+                    token = current
+                    try:
+                        current = next(tokens)
+                    except StopIteration:
+                        raise MissingTokensError("Unexpected end of token stream.",
+                            position=getattr(token, 'end', None))
+                    pos += 1
+
+                    if entry is None:
+                        self.current_token, self.current_pos = current, pos
+                        left = token.led(left, context=self)
+                        current, pos = self.current_token, self.current_pos
+                    elif entry[1] == _INFIX:
+                        stack.append((_INFIX, entry[3], rbp, left))
+                        rbp = entry[2]
+                        # Parse the right operand.
+                        break
+                    else:
+                        left = entry[3](left)
+
+                elif stack:
+                    # The operand of the last pending operator is complete.
+                    kind, action, rbp, operand = stack.pop()
+                    if kind == _INFIX:
+                        left = action(operand, left)
+                    elif kind == _PREFIX:
+                        left = action(left)
+                    else:
+                        self.current_token, self.current_pos = current, pos
+                        self.consume(expect_class=action)
+                        current, pos = self.current_token, self.current_pos
+
+                else:
+                    self.current_token, self.current_pos = current, pos
+                    return left
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Profiling of lexing and parsing.
+
+A Profiler collects, for each token class, the time spent matching its
+regexp, building its instances and running their nud() and led() methods:
+
+    profiler = Profiler()
+    with profiler.profile(lexer):
+        lexer.parse(text)
+    print(profiler.report())
+
+Nothing is recorded, and no overhead is added, outside of profile() blocks.
+"""
+
+from __future__ import unicode_literals
+
+import contextlib
+import time
+
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+# The methods of token classes instrumented by Profiler.profile()
+_PROFILED_METHODS = (('init', '__init__'), ('nud', 'nud'), ('led', 'led'))
+
+# Marks methods inherited by a token class, rather than defined in it
+_INHERITED = object()
+
+
+class TokenStats(object):
+    """Profiling data for a token class.
+
+    Times are in seconds, and exclude the time spent in nested profiled
+    calls (e.g nud() of the tokens of a subexpression).
+
+    Attributes:
+        attempts (int): the number of times the token's regexp was tried
+        matches (int): the number of times the token's regexp matched
+        match_time (float): the time spent matching the token's regexp
+        instances (int): the number of tokens built
+        init_time (float): the time spent building tokens
+        nud_calls (int): the number of calls to nud()
+        nud_time (float): the time spent in nud()
+        led_calls (int): the number of calls to led()
+        led_time (float): the time spent in led()
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.matches = 0
+        self.match_time = 0.0
+        self.instances = 0
+        self.init_time = 0.0
+        self.nud_calls = 0
+        self.nud_time = 0.0
+        self.led_calls = 0
+        self.led_time = 0.0
+
+    @property
+    def total_time(self):
+        return self.match_time + self.init_time + self.nud_time + self.led_time
+
+
+class _ProfilingRegistry(object):
+    """Wraps a TokenRegistry, timing each regexp.
+
+    Candidate regexps are tried one at a time, so that their cost can be
+    attributed to their token class; the best match is selected as
+    TokenRegistry.get_token() does.
+    """
+
+    def __init__(self, registry, profiler):
+        self.registry = registry
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self.registry, name)
+
+    def __len__(self):
+        return len(self.registry)
+
+    def get_token(self, text, start=0):
+        profiler = self.profiler
+        timer = profiler.timer
+        best_class = best_match = None
+        best_end = -1
+        elapsed = 0.0
+        for token_class, regexp in self.registry.candidate_tokens(text, start):
+            stats = profiler.stats_for(token_class)
+            begin = timer()
+            match = regexp.match(text, start)
+            duration = timer() - begin
+            stats.attempts += 1
+            stats.match_time += duration
+            elapsed += duration
+            if match:
+                stats.matches += 1
+                if match.end() > best_end:
+                    best_class, best_match, best_end = token_class, match, match.end()
+
+        profiler._add_nested(elapsed)
+        return best_class, best_match
+
+
+class Profiler(object):
+    """Collects profiling data about lexing and parsing.
+
+    A Profiler shouldn't be used from several threads at once.
+
+    Attributes:
+        tokens (dict(Token => TokenStats)): the data for each token class
+        timer (callable): the clock used to measure time
+    """
+
+    def __init__(self, timer=_timer):
+        self.tokens = {}
+        self.timer = timer
+        # Time spent in nested profiled calls, for each running call.
+        self._nested = []
+
+    def stats_for(self, token_class):
+        """Retrieve the TokenStats for a token class."""
+        try:
+            return self.tokens[token_class]
+        except KeyError:
+            stats = self.tokens[token_class] = TokenStats()
+            return stats
+
+    def reset(self):
+        """Drop collected data."""
+        self.tokens = {}
+
+    @contextlib.contextmanager
+    def profile(self, lexer):
+        """Profile a lexer, and the parsing of its tokens, within a block.
+
+        The __init__(), nud() and led() methods of the registered token
+        classes (and of their keywords) are replaced in place by profiled
+        ones until the end of the block: tokens keep their classes, but the
+        tokens of other lexers sharing these classes are profiled too. The
+        regexps of the lexer are tried one at a time.
+        """
+        registry = lexer.tokens
+        replaced = self._instrument(registry)
+        lexer.tokens = _ProfilingRegistry(registry, self)
+        try:
+            yield self
+        finally:
+            lexer.tokens = registry
+            for token_class, name, method in reversed(replaced):
+                if method is _INHERITED:
+                    delattr(token_class, name)
+                else:
+                    setattr(token_class, name, method)
+
+    def _add_nested(self, elapsed):
+        if self._nested:
+            self._nested[-1] += elapsed
+
+    def _measure(self, token_class, kind, func, args, kwargs):
+        """Call func(*args, **kwargs), recording the call.
+
+        Args:
+            token_class (Token): the token class whose stats should be updated
+            kind (str): the kind of call: 'init', 'nud' or 'led'
+        """
+        nested = self._nested
+        nested.append(0.0)
+        begin = self.timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = self.timer() - begin
+            own = elapsed - nested.pop()
+            self._add_nested(elapsed)
+            stats = self.stats_for(token_class)
+            if kind == 'init':
+                stats.instances += 1
+                stats.init_time += own
+            elif kind == 'nud':
+                stats.nud_calls += 1
+                stats.nud_time += own
+            else:
+                stats.led_calls += 1
+                stats.led_time += own
+
+    def _instrument(self, registry):
+        """Replace the methods of the registered token classes with profiled ones.
+
+        Returns:
+            (Token, str, object) list: the replaced attributes, with their
+                previous value in the class, _INHERITED if there was none.
+        """
+        classes = []
+        pending = [token_class for token_class, _regexp in registry._tokens]
+        while pending:
+            token_class = pending.pop()
+            if token_class not in classes:
+                classes.append(token_class)
+                # Promoted keywords are profiled too.
+                pending.extend((token_class.keywords or {}).values())
+
+        # Registered classes may inherit from each other: look all methods up
+        # before replacing any.
+        methods = [(token_class, kind, name, getattr(token_class, name))
+            for token_class in classes for kind, name in _PROFILED_METHODS]
+        replaced = []
+        for token_class, kind, name, method in methods:
+            replaced.append((token_class, name, token_class.__dict__.get(name, _INHERITED)))
+            setattr(token_class, name, self._profiled_method(token_class, kind, method))
+        return replaced
+
+    def _profiled_method(self, token_class, kind, method):
+        """Wrap a method of a token class, recording its calls."""
+        profiler = self
+
+        def profiled(token, *args, **kwargs):
+            return profiler._measure(token_class, kind, method, (token,) + args, kwargs)
+
+        return profiled
+
+    def report(self):
+        """Format the collected data as a table, slowest token classes first.
+
+        Returns:
+            str: the report, with times in milliseconds.
+        """
+        columns = (
+            ('attempts', 'attempts', '%d'),
+            ('matches', 'matches', '%d'),
+            ('match ms', 'match_time', '%.3f'),
+            ('built', 'instances', '%d'),
+            ('init ms', 'init_time', '%.3f'),
+            ('nud', 'nud_calls', '%d'),
+            ('nud ms', 'nud_time', '%.3f'),
+            ('led', 'led_calls', '%d'),
+            ('led ms', 'led_time', '%.3f'),
+        )
+
+        rows = sorted(self.tokens.items(),
+            key=lambda item: (-item[1].total_time, item[0].__name__))
+        name_width = max([len('token')] + [len(token_class.__name__)
+            for token_class, _stats in rows])
+
+        lines = ['%-*s %s' % (name_width, 'token',
+            ' '.join('%10s' % title for title, _attr, _fmt in columns))]
+        for token_class, stats in rows:
+            values = []
+            for _title, attr, fmt in columns:
+                value = getattr(stats, attr)
+                if attr.endswith('_time'):
+                    value *= 1000
+                values.append('%10s' % (fmt % value))
+            lines.append('%-*s %s' % (name_width, token_class.__name__, ' '.join(values)))
+        return '\n'.join(lines)
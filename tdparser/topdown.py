@@ -12,9 +12,100 @@ In order to use it for parsing:
 
 from __future__ import unicode_literals
 
+import bisect
+import sys
+
+try:  # pragma: no cover
+    _intern = sys.intern
+except AttributeError:  # pragma: no cover
+    # Python2
+    _intern = intern
+
 
 class Error(Exception):
-    pass
+    """Base class for lexing and parsing errors.
+
+    Attributes:
+        position (int): the offset in the text where the error was found,
+            if known
+        line (int): the line of that offset, from 1, once located
+        column (int): the column of that offset, from 1, once located
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.position = kwargs.pop('position', None)
+        self.line = kwargs.pop('line', None)
+        self.column = kwargs.pop('column', None)
+        super(Error, self).__init__(*args, **kwargs)
+
+    def __reduce__(self):
+        return (_rebuild_error, (self.__class__, self.args, self.__dict__))
+
+    def __str__(self):
+        message = super(Error, self).__str__()
+        if self.line is not None:
+            message = '%s (line %d, column %d)' % (message, self.line, self.column)
+        return message
+
+    def locate(self, lines):
+        """Set the line and column of the error from its position.
+
+        Args:
+            lines (LineIndex): the line index of the text
+
+        Returns:
+            Error: the error itself.
+        """
+        if self.position is not None and self.line is None:
+            self.line, self.column = lines.position(self.position)
+        return self
+
+
+def _rebuild_error(error_class, args, attributes):
+    """Unpickle an error whose constructor takes keyword arguments."""
+    error = error_class(*args)
+    error.__dict__.update(attributes)
+    return error
+
+
+class LineIndex(object):
+    """Map offsets in a text to (line, column) pairs.
+
+    The offsets of line starts are only computed on the first lookup; each
+    lookup is then a binary search among them.
+
+    Attributes:
+        text (str): the indexed text
+        _starts (int list): the offset of the start of each line
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._starts = None
+
+    def _get_starts(self):
+        if self._starts is None:
+            text = self.text
+            starts = [0]
+            pos = text.find('\n')
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = text.find('\n', pos + 1)
+            self._starts = starts
+        return self._starts
+
+    def position(self, offset):
+        """Retrieve the line and column of an offset, both from 1.
+
+        Args:
+            offset (int): an offset in the text
+
+        Returns:
+            (int, int): the line and column of the offset
+        """
+        starts = self._get_starts()
+        line = bisect.bisect_right(starts, offset)
+        return line, offset - starts[line - 1] + 1
 
 
 class ParserError(Error):
@@ -32,22 +123,56 @@ class InvalidTokenError(ParserError):
 class Token(object):
     """Base class for tokens.
 
+    Tokens only hold their text and its start/end offsets in the lexed text,
+    in slots; subclasses may declare `__slots__ = ()` to avoid the memory
+    cost of a per-instance __dict__. Lexer.relex() also counts, in the
+    `_edits` slot, the edits made before each token since it was lexed.
+
     Ref:
         http://effbot.org/zone/simple-top-down-parsing.htm
         http://javascript.crockford.com/tdop/tdop.html
     """
 
+    __slots__ = ('text', 'start', 'end', '_edits')
+
     regexp = ''
 
     # Left binding power
     # Controls how much this token binds to a token on its right
     lbp = 0
 
-    def __init__(self, text=''):
+    # Declarative binding behavior, used by the default nud() and led()
+    # methods, and without recursion by the IterativeParser.
+    # - prefix_rbp: if set, the token is a prefix operator, whose operand is
+    #   the next expression with that right binding power; see apply_prefix().
+    # - rbp: if set, the token is an infix operator, whose right operand is
+    #   the next expression with that right binding power; see apply_infix().
+    #   Use rbp = lbp for left-associative operators, and rbp = lbp - 1 for
+    #   right-associative ones.
+    # - postfix: whether the token is a postfix operator; see apply_postfix().
+    prefix_rbp = None
+    rbp = None
+    postfix = False
+
+    # Whether to intern the text of tokens; useful for keywords and operators,
+    # whose many instances then share a single string.
+    intern_text = False
+
+    # Reserved words, for identifier-like tokens: a dict mapping the text of
+    # a token to the token class the lexer should build instead, e.g
+    # {'if': IfToken, 'else': ElseToken}; this avoids registering (and
+    # trying at each position) a regexp per keyword.
+    keywords = None
+
+    def __init__(self, text='', start=None, end=None):
+        if self.intern_text and type(text) is str:
+            text = _intern(text)
         self.text = text
+        self.start = start
+        self.end = end
 
     def __repr__(self):
-        return "<%s: %r>" % (self.__class__.__name__, self.text)
+        return "<%s: %r>" % (self.__class__.__name__, getattr(self, 'text', ''))
 
     def nud(self, context):
         """Null denotation.
@@ -62,9 +187,11 @@ class Token(object):
         Returns:
             object: Parsed value for this token (a node, a value, ...)
         """
+        if self.prefix_rbp is not None:
+            return self.apply_prefix(context.expression(self.prefix_rbp))
         raise InvalidTokenError(
-            "Unexpected token %s at the left of an expression (pos: %d)" % (
-            self, context.current_pos))
+            "Unexpected token %s at the left of an expression" % self,
+            position=getattr(self, 'start', None))
 
     def led(self, left, context):
         """Left denotation.
@@ -82,13 +209,55 @@ class Token(object):
             object built from this token, what is on its right, and
                 what was on its left.
         """
+        if self.rbp is not None:
+            return self.apply_infix(left, context.expression(self.rbp))
+        if self.postfix:
+            return self.apply_postfix(left)
         raise InvalidTokenError(
-            "Unexpected token %s in the middle of an expression (pos: %d)" % (
-            self, context.current_pos))
+            "Unexpected token %s in the middle of an expression" % self,
+            position=getattr(self, 'start', None))
+
+    def apply_prefix(self, operand):
+        """Compute the value of a prefix operator token.
+
+        Args:
+            operand (object): the value of the expression on its right
+
+        Returns:
+            object: the value of the "<token> <operand>" expression
+        """
+        raise NotImplementedError()
+
+    def apply_infix(self, left, right):
+        """Compute the value of an infix operator token.
+
+        Args:
+            left (object): the value of the expression on its left
+            right (object): the value of the expression on its right
+
+        Returns:
+            object: the value of the "<left> <token> <right>" expression
+        """
+        raise NotImplementedError()
+
+    def apply_postfix(self, operand):
+        """Compute the value of a postfix operator token.
+
+        Args:
+            operand (object): the value of the expression on its left
+
+        Returns:
+            object: the value of the "<operand> <token>" expression
+        """
+        raise NotImplementedError()
 
 
 class RightParen(Token):
     """A right parenthesis."""
+
+    __slots__ = ()
+    intern_text = True
+
     def __repr__(self):  # pragma: no cover
         return '<)>'
 
@@ -96,6 +265,9 @@ class RightParen(Token):
 class LeftParen(Token):
     """A left parenthesis."""
 
+    __slots__ = ()
+    intern_text = True
+
     match = RightParen
 
     def nud(self, context):
@@ -112,19 +284,54 @@ class LeftParen(Token):
 
 class EndToken(Token):
     """Marks the end of the input."""
+
+    __slots__ = ()
+
     lbp = 0
 
     def nud(self, context):
         # An 'end' token should never begin an expression.
-        raise MissingTokensError("Empty token flow.")
+        raise MissingTokensError("Empty token flow.",
+            position=getattr(self, 'start', None))
 
     def led(self, left, context):
-        raise MissingTokensError("Unfinished token flow.")
+        raise MissingTokensError("Unfinished token flow.",
+            position=getattr(self, 'start', None))
 
     def __repr__(self):
         return '<End>'
 
 
+class ErrorToken(Token):
+    """A run of invalid text, emitted by the lexer when recovering from errors.
+
+    Attributes:
+        error (Error): the error describing the invalid text, raised when
+            the token is reached by a parser
+    """
+
+    __slots__ = ('error',)
+
+    lbp = 0
+
+    def __init__(self, text='', start=None, end=None, error=None):
+        super(ErrorToken, self).__init__(text, start, end)
+        self.error = error
+
+    def get_error(self):
+        """Retrieve the error for this token, building one if unset."""
+        if self.error is None:
+            self.error = InvalidTokenError("Invalid text %r" % self.text,
+                position=getattr(self, 'start', None))
+        return self.error
+
+    def nud(self, context):
+        raise self.get_error()
+
+    def led(self, left, context):
+        raise self.get_error()
+
+
 class Parser(object):
     """Converts lexed tokens into their representation.
 
@@ -155,8 +362,8 @@ class Parser(object):
         try:
             self.current_token = next(self.tokens)
         except StopIteration:
-            raise MissingTokensError("Unexpected end of token stream at %d." %
-                self.current_pos)
+            raise MissingTokensError("Unexpected end of token stream.",
+                position=getattr(self.current_token, 'end', None))
         self.current_pos += 1
 
     def consume(self, expect_class=None):
@@ -176,8 +383,9 @@ class Parser(object):
                 token doesn't match that class.
         """
         if expect_class and not isinstance(self.current_token, expect_class):
-            raise InvalidTokenError("Unexpected token at %d: got %r, expected %s" % (
-                self.current_pos, self.current_token, expect_class.__name__))
+            raise InvalidTokenError("Unexpected token %r, expected %s" % (
+                self.current_token, expect_class.__name__),
+                position=getattr(self.current_token, 'start', None))
 
         current_token = self.current_token
         self._forward()
@@ -213,5 +421,337 @@ class Parser(object):
         """Parse the flow of tokens, and return their evaluation."""
         expr = self.expression()
         if not isinstance(self.current_token, EndToken):
-            raise InvalidTokenError("Unconsumed trailing tokens.")
+            raise InvalidTokenError("Unconsumed trailing tokens.",
+                position=getattr(self.current_token, 'start', None))
         return expr
+
+    def parse_sequence(self, separator=None):
+        """Parse successive expressions, until the end of the flow of tokens.
+
+        Args:
+            separator (Token subclass): if set, expressions must be separated
+                by tokens of this class (whose lbp should be 0); empty
+                expressions between separators are skipped.
+
+        Yields:
+            The evaluation of each expression.
+        """
+        while not isinstance(self.current_token, EndToken):
+            if separator is not None and isinstance(self.current_token, separator):
+                self._forward()
+                continue
+
+            yield self.expression()
+
+            if separator is not None and not isinstance(self.current_token, (separator, EndToken)):
+                raise InvalidTokenError("Unexpected token %r, expected %s" % (
+                    self.current_token, separator.__name__),
+                    position=getattr(self.current_token, 'start', None))
+
+    def parse_recovering(self, sync_tokens=()):
+        """Parse successive expressions, recording errors instead of raising them.
+
+        After an error, tokens are skipped up to the next synchronization
+        token, and parsing resumes after it; the errors of ErrorToken found
+        while skipping are recorded as well.
+
+        Args:
+            sync_tokens (Token subclass tuple): the classes of tokens
+                separating expressions, e.g statement terminators (whose lbp
+                should be 0); empty expressions between them are skipped.
+
+        Returns:
+            (list, Error list): the evaluation of each correct expression, and
+                the errors found in the flow of tokens, in order.
+        """
+        sync_tokens = tuple(sync_tokens)
+        stop_tokens = sync_tokens + (EndToken,)
+        self.tokens = self._recording(self.tokens)
+        results = []
+        errors = []
+        while not isinstance(self.current_token, EndToken):
+            if isinstance(self.current_token, sync_tokens):
+                self._forward()
+                continue
+
+            try:
+                result = self.expression()
+            except Error as e:
+                errors.append(e)
+                # The failing expression may have consumed a synchronization
+                # token, e.g in "1 + ;": resume right after it.
+                if isinstance(self._previous_token(), sync_tokens):
+                    continue
+            else:
+                if not sync_tokens or isinstance(self.current_token, stop_tokens):
+                    results.append(result)
+                    continue
+                # The error of an ErrorToken is recorded while synchronizing.
+                if not isinstance(self.current_token, ErrorToken):
+                    errors.append(InvalidTokenError("Unexpected token %r, expected %s" % (
+                        self.current_token,
+                        ' or '.join(token_class.__name__ for token_class in sync_tokens)),
+                        position=getattr(self.current_token, 'start', None)))
+
+            if not self._synchronize(stop_tokens, errors):
+                break
+
+        return results, errors
+
+    def _recording(self, tokens):
+        """Wrap a flow of tokens, keeping the last two tokens in self._recent."""
+        self._recent = [None, self.current_token]
+        for token in tokens:
+            self._recent = [self._recent[1], token]
+            yield token
+
+    def _previous_token(self):
+        """Retrieve the token preceding the current one, if recorded."""
+        recent = getattr(self, '_recent', None)
+        if recent is not None and recent[1] is self.current_token:
+            return recent[0]
+        return None
+
+    def _synchronize(self, stop_tokens, errors):
+        """Skip tokens up to the next instance of stop_tokens.
+
+        Returns:
+            bool: whether such a token was found before the end of the flow.
+        """
+        try:
+            while not isinstance(self.current_token, stop_tokens):
+                if isinstance(self.current_token, ErrorToken):
+                    errors.append(self.current_token.get_error())
+                self._forward()
+        except MissingTokensError:
+            return False
+        return True
+
+
+def _function(method):
+    """Retrieve the function of a (Python2 unbound) method."""
+    return getattr(method, '__func__', method)
+
+
+def _binding_kind(token_class):
+    """Find how the IterativeParser should handle tokens of a class.
+
+    Returns:
+        (str, str): how to handle the token at the beginning of an expression
+            ('prefix', 'group' or 'nud'), and within an expression ('infix',
+            'postfix' or 'led').
+    """
+    if _function(token_class.nud) is not _function(Token.nud):
+        if _function(token_class.nud) is _function(LeftParen.nud):
+            null_kind = 'group'
+        else:
+            null_kind = 'nud'
+    elif token_class.prefix_rbp is not None:
+        null_kind = 'prefix'
+    else:
+        null_kind = 'nud'
+
+    if _function(token_class.led) is not _function(Token.led):
+        left_kind = 'led'
+    elif token_class.rbp is not None:
+        left_kind = 'infix'
+    elif token_class.postfix:
+        left_kind = 'postfix'
+    else:
+        left_kind = 'led'
+
+    return null_kind, left_kind
+
+
+class IterativeParser(Parser):
+    """A Parser handling declarative tokens without recursion.
+
+    Prefix, infix and postfix operators declared through the prefix_rbp, rbp
+    and postfix attributes of Token, and LeftParen groups, are handled with
+    an explicit stack; deeply nested expressions thus don't hit Python's
+    recursion limit.
+
+    Other tokens' nud() and led() methods are called as usual.
+    """
+
+    # Cache of _binding_kind() results
+    _kinds = {}
+
+    def _kind(self, token):
+        try:
+            return self._kinds[token.__class__]
+        except KeyError:
+            kind = self._kinds[token.__class__] = _binding_kind(token.__class__)
+            return kind
+
+    def expression(self, rbp=0):
+        # Pending operators, as (kind, token, rbp, left) tuples:
+        # the operator token, the rbp to restore once its operand is parsed,
+        # and the value on its left for infix operators.
+        stack = []
+
+        while True:
+            # Beginning of an expression
+            token = self.consume()
+            null_kind = self._kind(token)[0]
+            if null_kind == 'prefix':
+                stack.append(('prefix', token, rbp, None))
+                rbp = token.prefix_rbp
+                continue
+            elif null_kind == 'group':
+                stack.append(('group', token, rbp, None))
+                rbp = 0
+                continue
+            left = token.nud(context=self)
+
+            # Within the expression
+            while True:
+                if rbp < self.current_token.lbp:
+                    token = self.consume()
+                    left_kind = self._kind(token)[1]
+                    if left_kind == 'infix':
+                        stack.append(('infix', token, rbp, left))
+                        rbp = token.rbp
+                        # Parse the right operand.
+                        break
+                    elif left_kind == 'postfix':
+                        left = token.apply_postfix(left)
+                    else:
+                        left = token.led(left, context=self)
+
+                elif stack:
+                    # The operand of the last pending operator is complete.
+                    kind, token, rbp, operand = stack.pop()
+                    if kind == 'prefix':
+                        left = token.apply_prefix(left)
+                    elif kind == 'infix':
+                        left = token.apply_infix(operand, left)
+                    else:
+                        self.consume(expect_class=token.match)
+
+                else:
+                    return left
+
+
+# Returned by IncrementalParser._reuse when no memoized result applies
+_MISSING = object()
+
+
+class IncrementalParser(Parser):
+    """A Parser reusing the subexpressions of a previous parse.
+
+    The steps of expression() are memoized along with the first and last
+    tokens they spanned (up to, and including, the token that ended them):
+    - the nud() of its first token, by that token
+    - each led() call, by the first and last tokens of its left operand and
+      the binding power; it is only reused on the same left operand value
+    - the whole expression, by its first token and the binding power
+    When parsing a list of tokens edited by Lexer.relex(), which keeps the
+    Token instances of unchanged text, a memoized result is reused if the
+    same first and last Token instances are found at the current position
+    and as many tokens apart, with no edit between them: relex() counts the
+    edits before each token, so that each check takes constant time.
+    Thus, only the subexpressions containing the edit are parsed again; and
+    in a chain of left-associative operators, the operations before the
+    edit are reused.
+
+    This requires that nud() and led() only depend on the tokens they consume,
+    and not on their offsets; and that tokens are only replaced through
+    relex(), or by lexing the text again.
+
+    Attributes:
+        token_list (Token list): the tokens to parse
+        subtrees (dict(tuple => tuple)): the memoized steps, with the first
+            and last tokens they spanned, their number, the edits between
+            them, their left operand and their result; pass it to the parser
+            of the next version of the tokens
+        reused (int): the number of steps reused during this parse
+    """
+
+    # Expressions spanning less tokens (including the token ending them)
+    # are cheaper to parse again than to check.
+    min_span = 3
+
+    def __init__(self, tokens, subtrees=None):
+        self.token_list = list(tokens)
+        self.subtrees = {} if subtrees is None else subtrees
+        self.reused = 0
+        super(IncrementalParser, self).__init__(self.token_list)
+
+    def _forward(self):
+        pos = self.current_pos + 1
+        if pos >= len(self.token_list):
+            raise MissingTokensError("Unexpected end of token stream.",
+                position=getattr(self.current_token, 'end', None))
+        self.current_token = self.token_list[pos]
+        self.current_pos = pos
+
+    def _previous_token(self):
+        if self.current_pos:
+            return self.token_list[self.current_pos - 1]
+        return None
+
+    def _reuse(self, key, left=None):
+        """Reuse a memoized step starting at the current position, if still valid.
+
+        Returns:
+            object: the result of the step, _MISSING if it must be parsed again.
+        """
+        entry = self.subtrees.get(key)
+        if entry is None:
+            return _MISSING
+        first, last, length, edits, previous_left, result = entry
+        start = self.current_pos
+        end = start + length - 1
+        if (previous_left is not left or end >= len(self.token_list)
+                or self.token_list[start] is not first
+                or self.token_list[end] is not last
+                or getattr(last, '_edits', 0) - getattr(first, '_edits', 0) != edits):
+            return _MISSING
+        self.current_pos = end
+        self.current_token = last
+        self.reused += 1
+        return result
+
+    def _memoize(self, key, start, result, left=None, min_span=1):
+        end = self.current_pos
+        if end + 1 - start >= min_span:
+            first, last = self.token_list[start], self.token_list[end]
+            self.subtrees[key] = (first, last, end + 1 - start,
+                getattr(last, '_edits', 0) - getattr(first, '_edits', 0), left, result)
+
+    def expression(self, rbp=0):
+        start = self.current_pos
+        first = self.current_token
+        key = (first, rbp)
+
+        left = self._reuse(key)
+        if left is not _MISSING:
+            return left
+
+        left = self._reuse((first,))
+        if left is _MISSING:
+            left = self.consume().nud(context=self)
+            self._memoize((first,), start, left)
+
+        while rbp < self.current_token.lbp:
+            step_start = self.current_pos
+            step_key = (first, self.token_list[step_start - 1], rbp)
+            result = self._reuse(step_key, left)
+            if result is _MISSING:
+                result = self.consume().led(left, context=self)
+                self._memoize(step_key, step_start, result, left)
+            left = result
+
+        self._memoize(key, start, left, min_span=self.min_span)
+        return left
+
+    def parse(self):
+        # Drop steps around tokens which disappeared.
+        if len(self.subtrees) > 4 * len(self.token_list):
+            alive = set(self.token_list)
+            for key in [key for key in self.subtrees
+                    if key[0] not in alive or (len(key) == 3 and key[1] not in alive)]:
+                del self.subtrees[key]
+
+        return super(IncrementalParser, self).parse()
@@ -2,7 +2,19 @@
 # This code is distributed under the two-clause BSD license.
 # Copyright (c) 2010-2013 Raphaël Barrois
 
+import sys
+
+from .test_batch import *
+from .test_cache import *
+from .test_dfa import *
 from .test_full import *
+from .test_grammar_cache import *
+from .test_imports import *
 from .test_lexer import *
+from .test_operators import *
 from .test_parser import *
+from .test_profiling import *
 from .test_tokens import *
+
+if sys.version_info >= (3, 5):
+    from .test_aio import *
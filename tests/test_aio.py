@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for asynchronous parsing (Python 3.5+)."""
+
+import asyncio
+import threading
+
+from .compat import unittest
+
+import tdparser
+
+
+class Integer(tdparser.Token):
+    regexp = r'\d+'
+
+    def nud(self, context):
+        return int(self.text)
+
+
+class Addition(tdparser.Token):
+    regexp = r'\+'
+    lbp = 10
+
+    def led(self, left, context):
+        return left + context.expression(self.lbp)
+
+
+class Word(tdparser.Token):
+    regexp = r'\w+'
+
+    def nud(self, context):
+        return self.text
+
+
+class AsyncChunks(object):
+    """An asynchronous iterable over chunks of a text."""
+
+    def __init__(self, text, chunk_size, wait=None):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.wait = wait
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            if self.wait is not None:
+                # Never-ending stream
+                await self.wait.wait()
+            raise StopAsyncIteration()
+        await asyncio.sleep(0)
+        return self.chunks.pop(0)
+
+
+class AsyncParseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lexer = tdparser.Lexer(with_parens=True)
+        self.lexer.register_tokens(Integer, Addition)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def aparse(self, chunks, **kwargs):
+        return self.loop.run_until_complete(self.lexer.aparse(chunks, **kwargs))
+
+    def test_chunks(self):
+        text = ' + '.join('(%d + 1)' % i for i in range(1000))
+        expected = self.lexer.parse(text)
+        for chunk_size in (1, 7, 100, 100000):
+            self.assertEqual(expected,
+                self.aparse(AsyncChunks(text, chunk_size), lookahead=10))
+
+    def test_encoding(self):
+        self.lexer.register_token(Word)
+        text = 'été'.encode('utf-8')
+        self.assertEqual('été',
+            self.aparse(AsyncChunks(text, 1), encoding='utf-8'))
+
+    def test_errors(self):
+        with self.assertRaises(tdparser.MissingTokensError):
+            self.aparse(AsyncChunks('1 + 2 +', 2))
+        with self.assertRaises(tdparser.InvalidTokenError):
+            self.aparse(AsyncChunks('(1 + 2', 2))
+        with self.assertRaises(tdparser.LexerError) as cm:
+            self.aparse(AsyncChunks('1 + $', 2))
+        # The text isn't kept: errors aren't located.
+        self.assertEqual(4, cm.exception.position)
+        self.assertIsNone(cm.exception.line)
+
+    def test_parse_error_stops_reading(self):
+        # The stream never ends, but the parser fails at the second token.
+        async def parse():
+            # Before Python 3.10, asyncio objects bind to the loop when built.
+            wait = asyncio.Event()
+            return await self.lexer.aparse(
+                AsyncChunks('1 2 + ' * 10, 2, wait=wait), lookahead=1)
+
+        with self.assertRaises(tdparser.InvalidTokenError):
+            self.loop.run_until_complete(parse())
+
+    def test_other_tasks_run(self):
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def parse():
+            task = asyncio.ensure_future(ticker())
+            try:
+                return await self.lexer.aparse(AsyncChunks('1 + 2 + 3 + 4', 1))
+            finally:
+                task.cancel()
+
+        self.assertEqual(10, self.loop.run_until_complete(parse()))
+        self.assertGreater(len(ticks), 5)
+
+    def test_cancel(self):
+        stopped = threading.Event()
+
+        class TrackingParser(tdparser.Parser):
+            def parse(self):
+                try:
+                    return super(TrackingParser, self).parse()
+                finally:
+                    stopped.set()
+
+        self.lexer.parser_class = TrackingParser
+
+        async def parse():
+            wait = asyncio.Event()
+            task = asyncio.ensure_future(
+                self.lexer.aparse(AsyncChunks('1 + 2 +', 2, wait=wait), lookahead=1))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            self.loop.run_until_complete(parse())
+        self.assertTrue(stopped.wait(5))
+
+    def slow_parser(self, release, stopped):
+        class SlowParser(tdparser.Parser):
+            def parse(self):
+                try:
+                    release.wait(5)
+                    return super(SlowParser, self).parse()
+                finally:
+                    stopped.set()
+
+        return SlowParser
+
+    def test_backpressure(self):
+        release = threading.Event()
+        self.lexer.parser_class = self.slow_parser(release, threading.Event())
+        chunks = AsyncChunks(' + '.join(['1'] * 1000), 2)
+        total = len(chunks.chunks)
+
+        async def parse():
+            task = asyncio.ensure_future(self.lexer.aparse(chunks, lookahead=1))
+            for _i in range(50):
+                await asyncio.sleep(0.001)
+            read = total - len(chunks.chunks)
+            release.set()
+            return read, await task
+
+        read, result = self.loop.run_until_complete(parse())
+        self.assertEqual(1000, result)
+        # Reading stops once the queue is full.
+        self.assertLess(read, 4 * tdparser.aio._MAX_PENDING_BATCHES)
+
+    def test_cancel_full_queue(self):
+        release = threading.Event()
+        stopped = threading.Event()
+        self.lexer.parser_class = self.slow_parser(release, stopped)
+        chunks = AsyncChunks(' + '.join(['1'] * 1000), 2)
+
+        async def parse():
+            task = asyncio.ensure_future(self.lexer.aparse(chunks, lookahead=1))
+            for _i in range(50):
+                await asyncio.sleep(0.001)
+            task.cancel()
+            try:
+                await task
+            finally:
+                release.set()
+
+        with self.assertRaises(asyncio.CancelledError):
+            self.loop.run_until_complete(parse())
+        self.assertTrue(stopped.wait(5))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for batch parsing."""
+
+import pickle
+
+from .compat import unittest
+
+try:
+    from concurrent import futures
+except ImportError:  # pragma: no cover
+    futures = None
+
+import tdparser
+from tdparser import lexer as tdparser_lexer
+
+
+# Token classes must be importable to be sent to worker processes.
+
+class Integer(tdparser.Token):
+    regexp = r'\d+'
+
+    def nud(self, context):
+        return int(self.text)
+
+
+class Addition(tdparser.Token):
+    regexp = r'\+'
+    lbp = 10
+
+    def led(self, left, context):
+        return left + context.expression(self.lbp)
+
+
+def make_lexer(**kwargs):
+    lexer = tdparser.Lexer(with_parens=True, **kwargs)
+    lexer.register_tokens(Integer, Addition)
+    return lexer
+
+
+class PickleTestCase(unittest.TestCase):
+
+    def test_pickle_lexer(self):
+        lexer = make_lexer(parse_cache=tdparser.ParseCache())
+        lexer.register_trivia(r'#.*')
+        self.assertEqual(3, lexer.parse('1 + 2'))
+
+        copy = pickle.loads(pickle.dumps(lexer))
+        self.assertEqual(6, copy.parse('(1 + 2) + 3 # comment'))
+        self.assertIsNone(copy.parse_cache)
+        self.assertEqual(len(lexer.tokens), len(copy.tokens))
+
+    def test_pickle_compiled_registry(self):
+        lexer = make_lexer(registry_class=tdparser_lexer.CompiledTokenRegistry)
+        self.assertEqual(3, lexer.parse('1 + 2'))
+        copy = pickle.loads(pickle.dumps(lexer))
+        self.assertEqual(3, copy.parse('1 + 2'))
+
+    def test_pickle_frozen_lexer(self):
+        lexer = make_lexer()
+        lexer.register_trivia(r'#.*')
+        frozen = lexer.freeze()
+        copy = pickle.loads(pickle.dumps(frozen))
+        self.assertEqual(6, copy.parse('(1 + 2) + 3 # comment'))
+        self.assertEqual(frozen.tokens._buckets.keys(), copy.tokens._buckets.keys())
+        self.assertIsNotNone(copy._skipper)
+        self.assertRaises(TypeError, copy.register_token, Integer)
+
+    def test_pickle_literals(self):
+        lexer = make_lexer()
+        lexer.register_literal(Addition, 'plus')
+        copy = pickle.loads(pickle.dumps(lexer))
+        self.assertEqual(6, copy.parse('1 plus 2 + 3'))
+
+    def test_pickle_lexer_error(self):
+        error = tdparser.LexerError('Invalid', position=3)
+        copy = pickle.loads(pickle.dumps(error))
+        self.assertEqual(error.args, copy.args)
+        self.assertEqual(3, copy.position)
+
+
+class ParseManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lexer = make_lexer()
+
+    def test_in_process(self):
+        results = self.lexer.parse_many(['1', '1 + 2', '(3 + 4) + 5'])
+        self.assertEqual([1, 3, 12], results)
+
+    def test_errors(self):
+        results = self.lexer.parse_many(['1', '1 +', 'a', '2'])
+        self.assertEqual(1, results[0])
+        self.assertIsInstance(results[1], tdparser.MissingTokensError)
+        self.assertIsInstance(results[2], tdparser.LexerError)
+        self.assertEqual(0, results[2].position)
+        self.assertEqual(2, results[3])
+
+    @unittest.skipIf(futures is None, "Worker processes need concurrent.futures")
+    def test_workers(self):
+        texts = ['%d + %d' % (i, i) for i in range(50)] + ['1 + a']
+        results = self.lexer.parse_many(texts, workers=2, chunksize=7)
+        self.assertEqual([2 * i for i in range(50)], results[:-1])
+        self.assertIsInstance(results[-1], tdparser.LexerError)
+        self.assertEqual(4, results[-1].position)
+
+    def test_chunk_with_lexer(self):
+        # Before Python 3.7, the lexer is sent along with each chunk.
+        from tdparser import batch
+        results = batch._parse_chunk(['1 + 2', '1 +'], self.lexer)
+        self.assertEqual(3, results[0])
+        self.assertIsInstance(results[1], tdparser.MissingTokensError)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for parse result caching."""
+
+from .compat import unittest
+
+import tdparser
+
+
+class ParseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def parse(self, text):
+        self.calls.append(text)
+        return text.upper()
+
+    def test_hit(self):
+        cache = tdparser.ParseCache()
+        self.assertEqual('FOO', cache.get('foo', self.parse))
+        self.assertEqual('FOO', cache.get('foo', self.parse))
+        self.assertEqual(['foo'], self.calls)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(3, cache.size)
+
+    def test_max_entries(self):
+        cache = tdparser.ParseCache(max_entries=2)
+        cache.get('a', self.parse)
+        cache.get('b', self.parse)
+        # 'a' becomes the most recently used entry
+        cache.get('a', self.parse)
+        cache.get('c', self.parse)
+        self.assertEqual(2, len(cache))
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(1, cache.evictions)
+
+    def test_max_size(self):
+        cache = tdparser.ParseCache(max_entries=None, max_size=5)
+        cache.get('aa', self.parse)
+        cache.get('bb', self.parse)
+        cache.get('cc', self.parse)
+        self.assertEqual(['bb', 'cc'], list(cache._entries))
+        self.assertEqual(4, cache.size)
+        self.assertEqual(1, cache.evictions)
+
+        # Too large to be cached
+        cache.get('dddddd', self.parse)
+        self.assertNotIn('dddddd', cache)
+        self.assertEqual(4, cache.size)
+
+    def test_errors_not_cached(self):
+        cache = tdparser.ParseCache()
+
+        def fail(text):
+            raise tdparser.ParserError(text)
+
+        self.assertRaises(tdparser.ParserError, cache.get, 'a', fail)
+        self.assertNotIn('a', cache)
+
+    def test_grammar_version(self):
+        cache = tdparser.ParseCache()
+        cache.get('a', self.parse, grammar_version=1)
+        cache.get('a', self.parse, grammar_version=1)
+        cache.get('a', self.parse, grammar_version=2)
+        self.assertEqual(['a', 'a'], self.calls)
+        self.assertEqual(1, cache.invalidations)
+
+    def test_clear(self):
+        cache = tdparser.ParseCache()
+        cache.get('a', self.parse)
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+
+class CachedParseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        calls = self.calls
+
+        class Integer(tdparser.Token):
+            regexp = r'\d+'
+
+            def nud(self, context):
+                calls.append(self.text)
+                return [int(self.text)]
+
+        class Letter(tdparser.Token):
+            regexp = r'[a-z]'
+
+            def nud(self, context):
+                return [self.text]
+
+        self.Integer = Integer
+        self.Letter = Letter
+
+    def test_lexer_parse_cache(self):
+        lexer = tdparser.Lexer(parse_cache=tdparser.ParseCache())
+        lexer.register_token(self.Integer)
+        self.assertEqual([42], lexer.parse('42'))
+        self.assertIs(lexer.parse('42'), lexer.parse('42'))
+        self.assertEqual(['42'], self.calls)
+        self.assertEqual(2, lexer.parse_cache.hits)
+
+    def test_cached_lexer(self):
+        lexer = tdparser.Lexer()
+        lexer.register_token(self.Integer)
+        cached = tdparser.CachedLexer(lexer, max_entries=10)
+        self.assertEqual([42], cached.parse('42'))
+        self.assertEqual([42], cached.parse('42'))
+        self.assertEqual(['42'], self.calls)
+        self.assertEqual(1, cached.cache.hits)
+        self.assertIs(lexer.tokens, cached.tokens)
+
+    def test_invalidation(self):
+        lexer = tdparser.Lexer(parse_cache=tdparser.ParseCache())
+        cached = tdparser.CachedLexer(lexer)
+        lexer.register_token(self.Integer)
+        self.assertRaises(tdparser.LexerError, lexer.parse, 'a')
+        self.assertRaises(tdparser.LexerError, cached.parse, 'a')
+        self.assertEqual([1], lexer.parse('1'))
+        self.assertEqual([1], cached.parse('1'))
+
+        lexer.register_token(self.Letter)
+        self.assertEqual(['a'], lexer.parse('a'))
+        self.assertEqual(['a'], cached.parse('a'))
+        self.assertEqual(1, lexer.parse_cache.invalidations)
+        self.assertEqual(1, cached.cache.invalidations)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
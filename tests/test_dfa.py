@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for the DFA-based token registry."""
+
+from __future__ import unicode_literals
+
+import pickle
+import random
+import re
+import sys
+
+from .compat import unittest
+
+import tdparser
+from tdparser import dfa
+
+from .test_lexer import RegistryEquivalenceMixin
+
+
+class Word(tdparser.Token):
+    """A token class that can be pickled."""
+
+
+class DFATokenRegistryTestCase(RegistryEquivalenceMixin, unittest.TestCase):
+    """DFATokenRegistry must behave as the TokenRegistry."""
+
+    registry_class = dfa.DFATokenRegistry
+
+    def test_first_alternative(self):
+        # Regexps match their first matching alternative, not the longest one.
+        self.assertSameTokens(
+            [(self.AToken, r'a|ab'), (self.BToken, r'(?:a|abc)(?:bcd|b)?'),
+                (self.CToken, r'ab?c')],
+            ['ab', 'abc', 'abcd', 'abcbcd', 'ac'])
+
+    def test_repeats(self):
+        self.assertSameTokens(
+            [(self.AToken, r'a{2,3}?'), (self.BToken, r'(?:ab){2}'),
+                (self.CToken, r'b{1,100}')],
+            ['aaaa', 'ababab', 'b' * 120, 'abba'])
+
+    def test_anchors_and_flags(self):
+        self.assertSameTokens(
+            [(self.AToken, r'if\b'), (self.BToken, re.compile(r'[a-z]+', re.I)),
+                (self.CToken, re.compile(r'.', re.S)), (self.AToken, r'^x')],
+            ['if iffy', 'IF', 'xx', '\n', 'Kelvin K'])
+
+    @unittest.skipIf(sys.version_info < (3, 6), "Scoped flags need Python 3.6+")
+    def test_scoped_flags(self):
+        self.assertSameTokens(
+            [(self.AToken, r'(?i:if)'), (self.CToken, r'(?s:.)')],
+            ['if IF', 'x\n'])
+
+    def test_unicode(self):
+        self.assertSameTokens(
+            [(self.AToken, r'\w+'), (self.BToken, r'\d+'), (self.CToken, r'[^\w\s]')],
+            ['été 42', '٣٤', 'K€'])
+
+    def test_empty_match(self):
+        self.assertSameTokens(
+            [(self.AToken, r'a*'), (self.BToken, r'b?')],
+            ['', 'ab', 'ba', 'c'])
+
+    def test_zero_width_match(self):
+        # The first registered zero-width regexp wins.
+        self.assertSameTokens(
+            [(self.AToken, r'x'), (self.BToken, r'$'), (self.CToken, r'$')],
+            ['y', 'xy', 'x', ''])
+
+    def test_fallbacks(self):
+        automaton = self.assertSameTokens(
+            [(self.AToken, r'(a)\1'), (self.BToken, r'a(?=b)'), (self.CToken, r'ab|a')],
+            ['aab', 'ab', 'aa', 'a'])
+        self.assertEqual([
+            (self.AToken, r'(a)\1', 'group reference'),
+            (self.BToken, r'a(?=b)', 'lookaround assertion'),
+        ], automaton.fallbacks())
+
+    def test_literals(self):
+        registry, automaton = self.make_registries([(self.AToken, r'\w+')])
+        for reg in (registry, automaton):
+            reg.register_literal(self.BToken, '**')
+            reg.register_literal(self.CToken, '*')
+        self.assertEqual([], automaton.fallbacks())
+        self.assertEqual(self.BToken, automaton.get_token('***')[0])
+        self.assertEqual(self.CToken, automaton.get_token('*a')[0])
+
+    def test_random_numbers(self):
+        rules = [
+            (self.AToken, r'if|in'),
+            (self.BToken, r'[a-z]+(?:\.[a-z]+)*'),
+            (self.CToken, r'\d+(?:\.\d+)?|\.'),
+            (self.AToken, r'i?f+'),
+        ]
+        rng = random.Random(42)
+        texts = [''.join(rng.choice('ifn0.1 ') for _i in range(30)) for _j in range(50)]
+        self.assertSameTokens(rules, texts)
+
+    def test_max_states(self):
+        registry, automaton = self.make_registries(
+            [(self.AToken, r'[ab]*a[ab]{6}'), (self.BToken, r'[ab]+')])
+        automaton.max_states = 20
+        rng = random.Random(0)
+        for _i in range(20):
+            text = ''.join(rng.choice('ab') for _j in range(40))
+            for start in range(len(text)):
+                self.assertEqual(
+                    registry.get_token(text, start)[1].span(),
+                    automaton.get_token(text, start)[1].span())
+        self.assertTrue(len(automaton._dfa) <= 20)
+
+    def test_register_invalidates(self):
+        registry = dfa.DFATokenRegistry()
+        registry.register(self.AToken, r'a')
+        self.assertEqual(self.AToken, registry.get_token('aa')[0])
+
+        registry.register(self.BToken, r'aa')
+        self.assertEqual(self.BToken, registry.get_token('aa')[0])
+
+    def test_lexer(self):
+        lexer = tdparser.Lexer(with_parens=True, registry_class=dfa.DFATokenRegistry)
+        lexer.register_token(Word, r'a+')
+        tokens = list(lexer.lex('(aa )a'))
+        self.assertEqual(
+            [tdparser.LeftParen, Word, tdparser.RightParen, Word, tdparser.EndToken],
+            [token.__class__ for token in tokens])
+
+        copy = pickle.loads(pickle.dumps(lexer))
+        self.assertEqual(
+            [token.text for token in tokens],
+            [token.text for token in copy.lex('(aa )a')])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -9,10 +9,14 @@ import re
 from .compat import unittest
 
 import tdparser
+from tdparser import lexer as tdparser_lexer
 
 
 class ArithmeticParserTestCase(unittest.TestCase):
     """Test parsing arithmetic expressions."""
+
+    lexer_kwargs = {}
+
     def setUp(self):
 
         class Integer(tdparser.Token):
@@ -57,7 +61,7 @@ class ArithmeticParserTestCase(unittest.TestCase):
             def led(self, left, context):
                 return left // context.expression(self.lbp)
 
-        l = tdparser.Lexer(with_parens=True)
+        l = tdparser.Lexer(with_parens=True, **self.lexer_kwargs)
         l.register_token(Integer, re.compile(r'[0-9]+'))
         l.register_token(Add, re.compile(r'\+'))
         l.register_token(Minus, re.compile(r'-'))
@@ -107,6 +111,58 @@ class ArithmeticParserTestCase(unittest.TestCase):
         self.assertEqual(2, self.lexer.parse('16/4/2'))
 
 
+    def test_parse_all(self):
+        class Semicolon(tdparser.Token):
+            regexp = r';'
+
+        self.lexer.register_token(Semicolon)
+        self.assertEqual([3, 6, -4],
+            list(self.lexer.parse_all('1 + 2; 2 * 3;; -4;', separator=Semicolon)))
+        self.assertEqual([3, 6], list(self.lexer.parse_all('1 + 2 (2 * 3)')))
+
+    def test_parse_all_lazy(self):
+        results = self.lexer.parse_all('1 + 2 3 $')
+        self.assertEqual(3, next(results))
+        self.assertRaises(tdparser.LexerError, next, results)
+
+    def test_error_line_column(self):
+        self.lexer.register_trivia(r'\n')
+        with self.assertRaises(tdparser.LexerError) as cm:
+            self.lexer.parse('1 +\n2 $ 3')
+        self.assertEqual((6, 2, 3),
+            (cm.exception.position, cm.exception.line, cm.exception.column))
+        self.assertIn('(line 2, column 3)', str(cm.exception))
+
+        with self.assertRaises(tdparser.InvalidTokenError) as cm:
+            self.lexer.parse('1 +\n2\n\n  3')
+        self.assertEqual((9, 4, 3),
+            (cm.exception.position, cm.exception.line, cm.exception.column))
+
+        with self.assertRaises(tdparser.MissingTokensError) as cm:
+            self.lexer.parse('1 +\n2 *')
+        self.assertEqual((2, 4), (cm.exception.line, cm.exception.column))
+
+    def test_parse_recovering(self):
+        class Semicolon(tdparser.Token):
+            regexp = r';'
+
+        self.lexer.register_token(Semicolon)
+        self.lexer.register_trivia(r'\n')
+        results, errors = self.lexer.parse_recovering(
+            '1 + 2;\n3 $$ 4;\n2 * ;\n(1 2);\n4 * 2', sync_tokens=(Semicolon,))
+        self.assertEqual([3, 8], results)
+        self.assertEqual(
+            [(tdparser.LexerError, 2, 3), (tdparser.InvalidTokenError, 3, 5),
+                (tdparser.InvalidTokenError, 4, 4)],
+            [(e.__class__, e.line, e.column) for e in errors])
+
+
+class CompiledArithmeticParserTestCase(ArithmeticParserTestCase):
+    """Test parsing arithmetic expressions with a CompiledTokenRegistry."""
+
+    lexer_kwargs = {'registry_class': tdparser_lexer.CompiledTokenRegistry}
+
+
 class ParenthesizedParserTestCase(unittest.TestCase):
     """Test lexing parenthesized expressions."""
 
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for the on-disk grammar cache."""
+
+import os
+import pickle
+import shutil
+import tempfile
+
+from .compat import unittest
+
+import tdparser
+from tdparser import lexer as tdparser_lexer
+
+
+# Token classes must be importable to be cached.
+
+class Integer(tdparser.Token):
+    regexp = r'\d+'
+
+    def nud(self, context):
+        return int(self.text)
+
+
+class Addition(tdparser.Token):
+    regexp = r'\+'
+    lbp = 10
+
+    def led(self, left, context):
+        return left + context.expression(self.lbp)
+
+
+class Name(tdparser.Token):
+    regexp = r'[a-z]+'
+
+    def nud(self, context):
+        return self.text
+
+
+class Word(Name):
+    regexp = r'[a-z]\w*'
+
+
+def make_lexer():
+    lexer = tdparser.Lexer(with_parens=True)
+    lexer.register_tokens(Integer, Addition, Name)
+    lexer.register_trivia(r'#.*')
+    return lexer
+
+
+class GrammarCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = tdparser.GrammarCache(os.path.join(self.directory, 'grammars'))
+        self.builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def build(self):
+        self.builds += 1
+        return make_lexer()
+
+    def test_get(self):
+        lexer = self.cache.get('v1', self.build)
+        self.assertIsInstance(lexer, tdparser.FrozenLexer)
+        self.assertEqual(6, lexer.parse('(1 + 2) + 3 # comment'))
+        self.assertTrue(os.path.exists(self.cache.path('v1')))
+
+        cached = self.cache.get('v1', self.build)
+        self.assertEqual(1, self.builds)
+        self.assertIsInstance(cached, tdparser.FrozenLexer)
+        self.assertEqual(6, cached.parse('(1 + 2) + 3 # comment'))
+        self.assertEqual(
+            [(t.__class__, t.text, t.start, t.end) for t in lexer.lex('a + 12 # b')],
+            [(t.__class__, t.text, t.start, t.end) for t in cached.lex('a + 12 # b')])
+        self.assertRaises(TypeError, cached.register_token, Name)
+
+    def test_lazy_regexps(self):
+        self.cache.save('v1', make_lexer())
+        lexer = self.cache.load('v1')
+        regexp = lexer.tokens._tokens[2][1]
+        self.assertIsInstance(regexp, tdparser_lexer._LazyRegexp)
+        self.assertEqual(r'\d+', regexp.pattern)
+        self.assertNotIn('match', regexp.__dict__)
+
+        self.assertEqual(12, lexer.parse('12'))
+        self.assertIn('match', regexp.__dict__)
+        # Shared regexps are loaded once.
+        self.assertIs(regexp, lexer.tokens._index['1'][0][1])
+
+    def test_keys(self):
+        self.cache.get('v1', self.build)
+        self.cache.get('v2', self.build)
+        self.assertEqual(2, self.builds)
+        self.assertNotEqual(self.cache.path('v1'), self.cache.path('v2'))
+        self.assertIsNone(self.cache.load('v3'))
+
+    def test_modified_token_class(self):
+        self.cache.get('v1', self.build)
+        self.addCleanup(setattr, Name, 'regexp', Name.regexp)
+        Name.regexp = r'[a-z_]+'
+        self.assertIsNone(self.cache.load('v1'))
+        self.assertEqual('a_b', self.cache.get('v1', self.build).parse('a_b'))
+        self.assertEqual(2, self.builds)
+        self.assertIsNotNone(self.cache.load('v1'))
+
+    @unittest.skipIf(os.name != 'posix', "Requires POSIX permissions")
+    def test_directory_mode(self):
+        self.cache.get('v1', self.build)
+        self.assertEqual(0o700, os.stat(self.cache.directory).st_mode & 0o777)
+
+    def test_unreadable(self):
+        self.cache.get('v1', self.build)
+        with open(self.cache.path('v1'), 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(self.cache.load('v1'))
+        self.assertEqual(3, self.cache.get('v1', self.build).parse('1 + 2'))
+        self.assertEqual(2, self.builds)
+        self.assertIsNotNone(self.cache.load('v1'))
+
+    def test_unwritable(self):
+        with open(os.path.join(self.directory, 'file'), 'w') as f:
+            f.write('')
+        cache = tdparser.GrammarCache(os.path.join(self.directory, 'file', 'grammars'))
+        self.assertEqual(3, cache.get('v1', self.build).parse('1 + 2'))
+        self.assertIsNone(cache.load('v1'))
+
+    def test_pickle_frozen_lexer(self):
+        lexer = make_lexer()
+        lexer.register_token(Word)
+        lexer = lexer.freeze()
+        self.assertEqual('a1', lexer.parse('a1'))
+        self.assertTrue(lexer.tokens._buckets['a'][1])
+        copy = pickle.loads(pickle.dumps(lexer))
+        # Neither regexps nor alternations are compiled when unpickling.
+        for _token_class, regexp in copy.tokens._tokens:
+            self.assertIsInstance(regexp, tdparser_lexer._LazyRegexp)
+            self.assertNotIn('match', regexp.__dict__)
+        self.assertEqual({}, copy.tokens._buckets['a'][1])
+        self.assertEqual(lexer.tokens._buckets.keys(), copy.tokens._buckets.keys())
+        self.assertEqual('a1', copy.parse('a1'))
+        self.assertEqual(3, copy.parse('1 + 2'))
+
+    def test_pickle_loaded_lexer(self):
+        self.cache.save('v1', make_lexer())
+        lexer = self.cache.load('v1')
+        copy = pickle.loads(pickle.dumps(lexer))
+        self.assertEqual(3, copy.parse('1 + 2'))
+        self.assertIsInstance(copy.tokens, tdparser_lexer.FrozenTokenRegistry)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
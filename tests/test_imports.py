@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for the import footprint of tdparser."""
+
+import os
+import subprocess
+import sys
+
+from .compat import unittest
+
+import tdparser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+_SCRIPT = """
+import sys
+before = set(sys.modules)
+%s
+print(' '.join(sorted(set(sys.modules) - before)))
+"""
+
+
+def imported_modules(code):
+    """Run code in a new interpreter, return the modules it imported.
+
+    Modules imported by the interpreter itself are ignored.
+
+    Returns:
+        str set: the names of the imported modules
+    """
+    # -S: don't import site, which may import many modules (e.g re).
+    output = subprocess.check_output(
+        [sys.executable, '-S', '-c', _SCRIPT % code],
+        cwd=ROOT, universal_newlines=True)
+    return set(output.split())
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "Requires PEP 562")
+class ImportedModulesTestCase(unittest.TestCase):
+
+    def test_package(self):
+        modules = imported_modules('import tdparser')
+        self.assertIn('tdparser', modules)
+        self.assertNotIn('tdparser.lexer', modules)
+        self.assertNotIn('re', modules)
+
+    def test_parser_path(self):
+        modules = imported_modules('import tdparser; tdparser.Parser; tdparser.Token')
+        self.assertEqual(['tdparser', 'tdparser.topdown'],
+            sorted(name for name in modules if name.startswith('tdparser')))
+        self.assertNotIn('re', modules)
+
+    def test_lexer_path(self):
+        modules = imported_modules('import tdparser; tdparser.Lexer')
+        self.assertIn('tdparser.lexer', modules)
+        self.assertNotIn('tdparser.operators', modules)
+        self.assertNotIn('tdparser.grammar_cache', modules)
+
+
+class LazyAttributesTestCase(unittest.TestCase):
+
+    def test_names(self):
+        for name in tdparser.__all__:
+            self.assertTrue(hasattr(tdparser, name), name)
+        self.assertIn('Lexer', dir(tdparser))
+        self.assertIs(tdparser.lexer.Lexer, tdparser.Lexer)
+
+    def test_unknown_name(self):
+        self.assertRaises(AttributeError, getattr, tdparser, 'Missing')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -5,7 +5,13 @@
 
 """Tests for lexer-related code."""
 
+from __future__ import unicode_literals
+
+import io
+import os
+import random
 import re
+import tempfile
 from .compat import unittest
 
 import tdparser
@@ -132,6 +138,487 @@ class TokenRegistryTestCase(unittest.TestCase):
         match = registry.get_token('aaa')
         self.assertEqual(AAToken, match[0])
 
+    def test_get_token_start(self):
+        class AToken(tdparser.Token):
+            pass
+
+        class BToken(tdparser.Token):
+            pass
+
+        registry = tdparser_lexer.TokenRegistry()
+        registry.register(AToken, r'a+')
+        registry.register(BToken, r'b+')
+
+        token_class, match = registry.get_token('aabbb', 2)
+        self.assertEqual(BToken, token_class)
+        self.assertEqual(2, match.start())
+        self.assertEqual(5, match.end())
+
+
+class LiteralTokensTestCase(unittest.TestCase):
+    """Tests for literal tokens, looked up in a trie."""
+
+    def setUp(self):
+        class Mult(tdparser.Token):
+            pass
+
+        class Power(tdparser.Token):
+            pass
+
+        class Keyword(tdparser.Token):
+            pass
+
+        class Word(tdparser.Token):
+            pass
+
+        self.Mult, self.Power, self.Keyword, self.Word = Mult, Power, Keyword, Word
+
+    def lex(self, lexer, text):
+        return [(token.__class__, token.text) for token in lexer.lex(text)][:-1]
+
+    def test_longest_literal(self):
+        for registry_class in (tdparser_lexer.TokenRegistry,
+                tdparser_lexer.CompiledTokenRegistry,
+                tdparser_lexer.AdaptiveTokenRegistry):
+            lexer = tdparser.Lexer(registry_class=registry_class)
+            lexer.register_literal(self.Mult, '*')
+            lexer.register_literal(self.Power, '**')
+            self.assertEqual(
+                [(self.Power, '**'), (self.Mult, '*'), (self.Power, '**')],
+                self.lex(lexer, '***  **'))
+
+    def test_literals_and_regexps(self):
+        lexer = tdparser.Lexer()
+        lexer.register_literal(self.Keyword, 'and', 'not in', 'in')
+        lexer.register_token(self.Word, r'\w+')
+        self.assertEqual(
+            [(self.Keyword, 'and'), (self.Word, 'android'), (self.Keyword, 'not in'),
+                (self.Word, 'not'), (self.Keyword, 'in'), (self.Word, 'inside'),
+                (self.Keyword, 'not in'), (self.Word, 'side')],
+            self.lex(lexer, 'and android not in not  in inside not inside'))
+
+    def test_first_registered_wins(self):
+        registry = tdparser_lexer.TokenRegistry()
+        registry.register(self.Word, r'\w+')
+        registry.register_literal(self.Keyword, 'and')
+        registry.register_literal(self.Mult, 'and')
+        token_class, match = registry.get_token('x and', 2)
+        self.assertEqual(self.Word, token_class)
+        self.assertEqual((2, 5), match.span())
+
+        registry = tdparser_lexer.TokenRegistry()
+        registry.register_literal(self.Keyword, 'and')
+        registry.register_literal(self.Mult, 'and')
+        registry.register(self.Word, r'\w+')
+        token_class, match = registry.get_token('x and', 2)
+        self.assertEqual(self.Keyword, token_class)
+        self.assertEqual((2, 5), match.span())
+        self.assertEqual((None, None), registry.get_token('x and', 5))
+
+    def test_special_chars(self):
+        lexer = tdparser.Lexer()
+        lexer.register_literal(self.Keyword, '.*', '(?')
+        self.assertEqual([(self.Keyword, '(?'), (self.Keyword, '.*')],
+            self.lex(lexer, '(? .*'))
+        with self.assertRaises(tdparser.LexerError):
+            self.lex(lexer, '..')
+
+    def test_empty_literal(self):
+        lexer = tdparser.Lexer()
+        self.assertRaises(ValueError, lexer.register_literal, self.Keyword, '')
+
+
+class FirstCharsTestCase(unittest.TestCase):
+    """Tests for the first characters analysis of regexps."""
+
+    def first_chars(self, regexp, flags=0):
+        return tdparser_lexer._first_chars(re.compile(regexp, flags))
+
+    def test_literals(self):
+        self.assertEqual((frozenset('+'), False), self.first_chars(r'\+'))
+        self.assertEqual((frozenset('*'), False), self.first_chars(r'\*\*?'))
+
+    def test_sets(self):
+        self.assertEqual((frozenset('abc_'), False), self.first_chars(r'[a-c_]\w*'))
+        self.assertEqual((frozenset('0123456789'), True),
+            self.first_chars(r'\d+', re.UNICODE))
+        self.assertEqual((frozenset('0123456789'), False),
+            self.first_chars(r'\d+', getattr(re, 'ASCII', 0)))
+
+    def test_optional_prefix(self):
+        self.assertEqual((frozenset('acd'), False), self.first_chars(r'(?:ab|c)?d'))
+        self.assertEqual((frozenset('f'), False), self.first_chars(r'\bfoo'))
+
+    def test_ignore_case(self):
+        self.assertEqual((frozenset('aA'), True), self.first_chars(r'ab', re.I))
+
+    def test_ignore_case_non_ascii(self):
+        # The Kelvin sign, the long s and the dotted capital I match ASCII
+        # letters while ignoring case.
+        for char in '\u212a\u017f\u0130':
+            self.assertIsNone(self.first_chars(char, re.I | re.UNICODE))
+
+    def test_unknown(self):
+        self.assertIsNone(self.first_chars(r'.'))
+        self.assertIsNone(self.first_chars(r'[^a]'))
+        self.assertIsNone(self.first_chars(r'\W'))
+
+    def test_nullable(self):
+        self.assertIsNone(self.first_chars(r'a?'))
+        self.assertIsNone(self.first_chars(r'a|'))
+
+
+class TokenIndexTestCase(unittest.TestCase):
+    """Tests for the first character index of the TokenRegistry."""
+
+    def setUp(self):
+        self.registry = tdparser_lexer.TokenRegistry()
+        self.classes = [type(str('Token%d' % i), (tdparser.Token,), {})
+            for i in range(6)]
+        rules = [r'\d+', r'[a-z]+', r'\+', r'.', r'x?', r'\w+']
+        for token_class, regexp in zip(self.classes, rules):
+            self.registry.register(token_class, re.compile(regexp, re.UNICODE))
+
+    def candidates(self, text, start=0):
+        return [token_class for token_class, _regexp
+            in self.registry.candidate_tokens(text, start)]
+
+    def test_candidates(self):
+        c = self.classes
+        self.assertEqual([c[0], c[3], c[4], c[5]], self.candidates('1'))
+        self.assertEqual([c[1], c[3], c[4], c[5]], self.candidates('a'))
+        self.assertEqual([c[2], c[3], c[4]], self.candidates('+'))
+        self.assertEqual([c[3], c[4]], self.candidates('+', 1))
+        self.assertEqual([c[0], c[3], c[4], c[5]], self.candidates('\u0663'))
+
+    def test_ignore_case_non_ascii(self):
+        registry = tdparser_lexer.TokenRegistry()
+        for char in '\u212a\u017f\u0130':
+            registry.register(self.classes[0], re.compile(char, re.I | re.UNICODE))
+        for char in 'kKsSiI':
+            expected = [self.classes[0]] if any(re.match(regexp, char)
+                for _token_class, regexp in registry._tokens) else []
+            self.assertEqual(expected, [token_class for token_class, _regexp
+                in registry.candidate_tokens(char, 0)][:1])
+
+    def test_register_resets_index(self):
+        self.assertEqual([self.classes[3], self.classes[4]], self.candidates('$'))
+        self.registry.register(self.classes[0], r'\$')
+        self.assertEqual([self.classes[3], self.classes[4], self.classes[0]],
+            self.candidates('$'))
+
+    def test_same_as_full_scan(self):
+        text = 'ab+12 x+\u0663'
+        for start in range(len(text) + 1):
+            expected = [(token_class, match.span())
+                for token_class, regexp in self.registry._tokens
+                for match in [regexp.match(text, start)] if match]
+            self.assertEqual(expected, [(token_class, match.span())
+                for token_class, match in self.registry.matching_tokens(text, start)])
+
+
+class RegistryEquivalenceMixin(object):
+    """Checks that a registry_class behaves as the TokenRegistry."""
+
+    registry_class = None
+    # Number of passes over the texts, for registries adapting to them.
+    rounds = 1
+
+    def setUp(self):
+        class AToken(tdparser.Token):
+            pass
+
+        class BToken(tdparser.Token):
+            pass
+
+        class CToken(tdparser.Token):
+            pass
+
+        self.AToken, self.BToken, self.CToken = AToken, BToken, CToken
+
+    def make_registry(self, rules):
+        """Build a registry_class with (token_class, regexp) rules."""
+        registry = self.registry_class()
+        for token_class, regexp in rules:
+            registry.register(token_class, regexp)
+        return registry
+
+    def make_registries(self, rules):
+        """Build a TokenRegistry and a registry_class with the same rules."""
+        reference = tdparser_lexer.TokenRegistry()
+        for token_class, regexp in rules:
+            reference.register(token_class, regexp)
+        return reference, self.make_registry(rules)
+
+    def assertSameTokens(self, rules, texts):
+        """Check that both registries return the same tokens."""
+        reference, registry = self.make_registries(rules)
+        for _round in range(self.rounds):
+            for text in texts:
+                for start in range(len(text) + 1):
+                    expected_class, expected_match = reference.get_token(text, start)
+                    token_class, match = registry.get_token(text, start)
+                    self.assertEqual(expected_class, token_class, (text, start))
+                    if expected_match is None:
+                        self.assertIsNone(match)
+                    else:
+                        self.assertEqual(expected_match.span(), match.span(),
+                            (text, start))
+        return registry
+
+    def test_no_tokens(self):
+        self.assertSameTokens([], ['', 'aaa'])
+
+    def test_longest_match(self):
+        self.assertSameTokens(
+            [(self.AToken, r'a'), (self.BToken, r'aa'), (self.CToken, r'a+b')],
+            ['aaa', 'aab', 'ab', 'ba'])
+
+    def test_first_registered_wins(self):
+        self.assertSameTokens(
+            [(self.AToken, r'a+'), (self.BToken, r'[ab]+'), (self.CToken, r'a+')],
+            ['aaa', 'aab', 'ba'])
+
+    def test_random(self):
+        rules = [
+            (self.AToken, r'if|in'),
+            (self.BToken, r'[a-z]+'),
+            (self.CToken, r'[0-9]{1,3}|i'),
+            (self.AToken, r'n1'),
+        ]
+        rng = random.Random(42)
+        texts = [''.join(rng.choice('ifn0 1') for _i in range(30)) for _j in range(20)]
+        self.assertSameTokens(rules, texts)
+
+
+class CompiledTokenRegistryTestCase(RegistryEquivalenceMixin, unittest.TestCase):
+    """CompiledTokenRegistry must behave as the TokenRegistry."""
+
+    registry_class = tdparser_lexer.CompiledTokenRegistry
+
+    def test_groups(self):
+        self.assertSameTokens(
+            [(self.AToken, r'(a)(b)?'), (self.BToken, r'(?P<name>a+)'),
+                (self.CToken, r'(?P<name>b+)')],
+            ['ab', 'aab', 'bab'])
+
+    def test_unfusable(self):
+        self.assertSameTokens(
+            [(self.AToken, r'(a)\1'), (self.BToken, re.compile(r'A+', re.I)),
+                (self.CToken, r'[ab]')],
+            ['aa', 'aAa', 'ba', 'ab'])
+
+    def test_fusable(self):
+        self.assertTrue(tdparser_lexer._is_fusable(re.compile(r'a(b)+|c')))
+        self.assertFalse(tdparser_lexer._is_fusable(re.compile(r'(a)b\1')))
+        self.assertFalse(tdparser_lexer._is_fusable(re.compile(r'(?P<x>a)(?P=x)')))
+        self.assertFalse(tdparser_lexer._is_fusable(re.compile(r'(?i)a')))
+
+    def test_buckets(self):
+        registry = tdparser_lexer.CompiledTokenRegistry()
+        registry.register(self.AToken, r'[a-z]+')
+        registry.register(self.BToken, r'[a-z]\w*')
+        registry.register(self.CToken, r'ab')
+        self.assertEqual((self.BToken, (0, 3)),
+            (registry.get_token('ab1')[0], registry.get_token('ab1')[1].span()))
+        self.assertEqual({2: 'ab'}, registry._literals)
+        self.assertIs(registry._buckets['a'], registry._buckets['z'])
+        fused, tails, others = registry._buckets['a']
+        self.assertEqual([0, 1], [entry[0] for entry in fused])
+        self.assertEqual([], others)
+        # Only the alternations needed so far are compiled.
+        self.assertEqual([0, 1], sorted(tails))
+        self.assertEqual([], list(registry._buckets['0'][1]))
+
+    def test_register_invalidates(self):
+        registry = tdparser_lexer.CompiledTokenRegistry()
+        registry.register(self.AToken, r'a')
+        self.assertEqual(self.AToken, registry.get_token('aa')[0])
+
+        registry.register(self.BToken, r'aa')
+        self.assertEqual(self.BToken, registry.get_token('aa')[0])
+
+    def test_lexer(self):
+        lexer = tdparser.Lexer(with_parens=True,
+            registry_class=tdparser_lexer.CompiledTokenRegistry)
+        lexer.register_token(self.AToken, r'a+')
+        tokens = list(lexer.lex('(aa )a'))
+        self.assertEqual(
+            [tdparser.LeftParen, self.AToken, tdparser.RightParen, self.AToken,
+                tdparser.EndToken],
+            [token.__class__ for token in tokens])
+
+
+class AdaptiveTokenRegistryTestCase(RegistryEquivalenceMixin, unittest.TestCase):
+    """AdaptiveTokenRegistry must behave as the TokenRegistry."""
+
+    registry_class = tdparser_lexer.AdaptiveTokenRegistry
+    rounds = 3
+
+    def make_registry(self, rules):
+        adaptive = super(AdaptiveTokenRegistryTestCase, self).make_registry(rules)
+        adaptive.reorder_interval = 4
+        return adaptive
+
+    def test_longest_match(self):
+        self.assertSameTokens(
+            [(self.AToken, r'a'), (self.BToken, r'aa'), (self.CToken, r'a+b')],
+            ['aaa', 'aab', 'ab', 'ba'] + ['bbbb'] * 10)
+
+    def test_first_registered_wins(self):
+        # BToken is selected most often, but AToken wins ties.
+        self.assertSameTokens(
+            [(self.AToken, r'ab'), (self.BToken, r'[ab]{2}|b'), (self.CToken, r'a\w*')],
+            ['ab', 'ba', 'aab', 'abc'] + ['bb'] * 10)
+
+    def test_empty_match(self):
+        self.assertSameTokens(
+            [(self.AToken, r'a*'), (self.BToken, r'(?=b)'), (self.CToken, r'b')],
+            ['', 'ab', 'ba', 'bbb'])
+
+    def test_max_width(self):
+        self.assertEqual(2, tdparser_lexer._max_width(re.compile(r'if')))
+        self.assertEqual(3, tdparser_lexer._max_width(re.compile(r'a|b(?=x)cd')))
+        self.assertEqual(5, tdparser_lexer._max_width(re.compile(r'a{2,5}')))
+        self.assertIsNone(tdparser_lexer._max_width(re.compile(r'\w+')))
+
+    def test_reordering(self):
+        _registry, adaptive = self.make_registries(
+            [(self.AToken, r'a'), (self.BToken, r'\w+')])
+        for _i in range(10):
+            adaptive.get_token('abc')
+        self.assertEqual([0, 10], adaptive.hits)
+        self.assertEqual([1, 0],
+            [entry[0] for entry in adaptive._ordered['a']])
+        self.assertEqual([(self.AToken, 0.0), (self.BToken, 1.0)], adaptive.hit_rates())
+        # The reordering interval grows.
+        self.assertEqual(8, adaptive.reorder_interval)
+
+    def test_register_invalidates(self):
+        registry = tdparser_lexer.AdaptiveTokenRegistry()
+        registry.register(self.AToken, r'a')
+        self.assertEqual(self.AToken, registry.get_token('aa')[0])
+
+        registry.register(self.BToken, r'aa')
+        self.assertEqual(self.BToken, registry.get_token('aa')[0])
+        self.assertEqual([1, 1], registry.hits)
+
+    def test_lexer(self):
+        lexer = tdparser.Lexer(with_parens=True,
+            registry_class=tdparser_lexer.AdaptiveTokenRegistry)
+        lexer.register_token(self.AToken, r'a+')
+        tokens = list(lexer.lex('(aa )a'))
+        self.assertEqual(
+            [tdparser.LeftParen, self.AToken, tdparser.RightParen, self.AToken,
+                tdparser.EndToken],
+            [token.__class__ for token in tokens])
+
+
+class FrozenTokenRegistryTestCase(RegistryEquivalenceMixin, unittest.TestCase):
+    """FrozenTokenRegistry must behave as the TokenRegistry."""
+
+    registry_class = tdparser_lexer.FrozenTokenRegistry
+
+    def make_registry(self, rules):
+        registry = tdparser_lexer.TokenRegistry()
+        for token_class, regexp in rules:
+            registry.register(token_class, regexp)
+        return self.registry_class(registry)
+
+    def test_groups(self):
+        self.assertSameTokens(
+            [(self.AToken, r'(?P<x>a)b?'), (self.BToken, r'(?P<x>a)+'),
+                (self.CToken, r'(a)\1c'), (self.AToken, r'(?i)A')],
+            ['ab', 'aaac', 'aac', 'Ab'])
+
+    def test_literal_extraction(self):
+        frozen = self.assertSameTokens(
+            [(self.AToken, r'\+\+'), (self.BToken, r'\+'), (self.CToken, r'(?i)x')],
+            ['+++', 'xX'])
+        self.assertEqual({0: '++', 1: '+'}, frozen._literals)
+        self.assertEqual('ab', tdparser_lexer._literal_text(re.compile(r'ab')))
+        self.assertIsNone(tdparser_lexer._literal_text(re.compile(r'a+')))
+        self.assertIsNone(tdparser_lexer._literal_text(re.compile(r'')))
+
+    def test_shared_buckets(self):
+        frozen = self.assertSameTokens(
+            [(self.AToken, r'[a-z]+'), (self.BToken, r'[a-z]\w*'), (self.CToken, r'\d+')],
+            ['abc1', '12a'])
+        self.assertIs(frozen._buckets['a'], frozen._buckets['z'])
+        fused, tails, _others = frozen._buckets['a']
+        self.assertEqual([0, 1], [entry[0] for entry in fused])
+        # Alternations are only compiled when needed.
+        self.assertEqual([0, 1], sorted(tails))
+
+    def test_conflicts(self):
+        registry = tdparser_lexer.TokenRegistry()
+        registry.register(self.AToken, r'[a-z]+')
+        registry.register_literal(self.BToken, 'if')
+        registry.register_literal(self.CToken, 'i')
+        frozen = tdparser_lexer.FrozenTokenRegistry(registry)
+        self.assertEqual([(self.BToken, self.AToken), (self.CToken, self.AToken)],
+            frozen.conflicts)
+
+    def test_immutable(self):
+        frozen = tdparser_lexer.FrozenTokenRegistry(tdparser_lexer.TokenRegistry())
+        self.assertRaises(TypeError, frozen.register, self.AToken, r'a')
+        self.assertRaises(TypeError, frozen.register_literal, self.AToken, 'a')
+
+
+class FrozenLexerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+
+        class BToken(tdparser.Token):
+            regexp = r'b'
+
+        self.AToken, self.BToken = AToken, BToken
+        self.lexer = tdparser.Lexer(with_parens=True,
+            registry_class=tdparser_lexer.CompiledTokenRegistry)
+        self.lexer.register_tokens(AToken, BToken)
+        self.lexer.register_trivia(r'#[^\n]*\n')
+
+    def test_lex(self):
+        frozen = self.lexer.freeze()
+        self.assertIsInstance(frozen.tokens, tdparser_lexer.FrozenTokenRegistry)
+        text = '(aa b) # comment\t\n ab'
+        self.assertEqual(
+            [(t.__class__, t.text, t.start, t.end) for t in self.lexer.lex(text)],
+            [(t.__class__, t.text, t.start, t.end) for t in frozen.lex(text)])
+        self.assertIs(frozen, frozen.freeze())
+
+    def test_immutable(self):
+        frozen = self.lexer.freeze()
+        self.assertRaises(TypeError, frozen.register_token, self.AToken, r'c')
+        self.assertRaises(TypeError, frozen.register_literal, self.AToken, 'c')
+        self.assertRaises(TypeError, frozen.register_tokens, self.AToken)
+        self.assertRaises(TypeError, frozen.register_trivia, r'c')
+
+    def test_independent_copy(self):
+        frozen = self.lexer.freeze()
+        self.lexer.register_literal(self.BToken, 'c')
+        self.assertRaises(tdparser.LexerError, list, frozen.lex('c'))
+
+    def test_threads(self):
+        import threading
+
+        frozen = self.lexer.freeze()
+        texts = ['(%s)' % ' '.join(['a' * (i % 5 + 1), 'b'] * 50) for i in range(20)]
+        expected = [[t.text for t in self.lexer.lex(text)] for text in texts]
+        results = {}
+
+        def lex(index):
+            results[index] = [[t.text for t in frozen.lex(text)] for text in texts]
+
+        threads = [threading.Thread(target=lex, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(dict((i, expected) for i in range(4)), results)
+
 
 class GetTokenTestCase(unittest.TestCase):
 
@@ -276,6 +763,12 @@ class LexTestCase(unittest.TestCase):
                 self.assertEqual(tdparser.RightParen, token.__class__)
         self.assertEqual(tdparser.EndToken, tokens[-1].__class__)
 
+    def test_lex_offsets(self):
+        lexer = tdparser.Lexer(with_parens=True)
+        tokens = list(lexer.lex(' ( )\t'))
+        self.assertEqual([(1, 2), (3, 4), (5, 5)],
+            [(token.start, token.end) for token in tokens])
+
     def test_lex_skips_blank(self):
         lexer = tdparser.Lexer(with_parens=True)
         tokens = list(lexer.lex('  ('))
@@ -307,6 +800,410 @@ class LexTestCase(unittest.TestCase):
             list(lexer.lex('aaaabaaa'))
         self.assertEqual(cm.exception.position, 4)
 
+    def test_lex_error_position_after_blanks(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_token(AToken)
+        with self.assertRaises(tdparser.LexerError) as cm:
+            list(lexer.lex('aa  a b'))
+        self.assertEqual(cm.exception.position, 6)
+
+    def test_lex_recover(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_token(AToken)
+        lexer.register_trivia(r'\n')
+        tokens = list(lexer.lex('aa b?a\n#a c', recover=True))
+        self.assertEqual(
+            [(AToken, 'aa', 0, 2), (tdparser.ErrorToken, 'b?', 3, 5),
+                (AToken, 'a', 5, 6), (tdparser.ErrorToken, '#', 7, 8),
+                (AToken, 'a', 8, 9), (tdparser.ErrorToken, 'c', 10, 11),
+                (tdparser.EndToken, '', 11, 11)],
+            [(t.__class__, t.text, t.start, t.end) for t in tokens])
+
+        error = tokens[3].error
+        self.assertIsInstance(error, tdparser.LexerError)
+        self.assertEqual((7, 2, 1), (error.position, error.line, error.column))
+
+    def test_lex_blank_runs(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+        lexer = tdparser.Lexer(with_parens=False, blank_chars=(' ', '\t', '-'))
+        lexer.register_token(AToken)
+        tokens = list(lexer.lex(' \t -aa  - \ta  '))
+        self.assertEqual(['aa', 'a'], [t.text for t in tokens[:-1]])
+
+    def test_lex_token_starting_with_blank(self):
+        class AToken(tdparser.Token):
+            regexp = r' +a'
+        class BToken(tdparser.Token):
+            regexp = r'b'
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_tokens(AToken, BToken)
+        tokens = list(lexer.lex('b  a \t b'))
+        self.assertEqual([BToken, AToken, BToken, tdparser.EndToken],
+            [t.__class__ for t in tokens])
+        self.assertEqual('  a', tokens[1].text)
+
+    def test_lex_trivia(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_token(AToken)
+        lexer.register_trivia(r'#[^\n]*')
+        lexer.register_trivia(r'\n')
+        tokens = list(lexer.lex('# comment\naa # aa\n\n  a#'))
+        self.assertEqual(['aa', 'a'], [t.text for t in tokens[:-1]])
+
+    def test_lex_trivia_error_position(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_token(AToken)
+        lexer.register_trivia(r'#[^\n]*\n')
+        with self.assertRaises(tdparser.LexerError) as cm:
+            list(lexer.lex('a #b\n b'))
+        self.assertEqual(cm.exception.position, 6)
+
+    def test_invalid_trivia(self):
+        lexer = tdparser.Lexer(with_parens=False)
+        self.assertRaises(ValueError, lexer.register_trivia, re.compile(r'a', re.I))
+        self.assertRaises(ValueError, lexer.register_trivia, r'(a)\1')
+
+    def test_lex_anchored_regexps(self):
+        class Integer(tdparser.Token):
+            regexp = re.compile(r'^\d+')
+
+            def nud(self, context):
+                return int(self.text)
+
+        class Addition(tdparser.Token):
+            regexp = re.compile(r'^\+')
+            lbp = 10
+
+            def led(self, left, context):
+                return left + context.expression(self.lbp)
+
+        class Name(tdparser.Token):
+            regexp = r'(?i)\A[a-z]+'
+
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_tokens(Integer, Addition, Name)
+        self.assertEqual(3, lexer.parse('1+2'))
+        self.assertEqual(['12', '+', 'Ab', '3'],
+            [t.text for t in lexer.lex('12 +Ab3')][:-1])
+
+    def test_lex_word_boundaries(self):
+        # Assertions see the text before the token.
+        class Integer(tdparser.Token):
+            regexp = r'\d+'
+
+        class Word(tdparser.Token):
+            regexp = r'\babc'
+
+        lexer = tdparser.Lexer()
+        lexer.register_tokens(Integer, Word)
+        self.assertEqual(['123', 'abc'], [t.text for t in lexer.lex('123 abc')][:-1])
+        self.assertRaises(tdparser.LexerError, list, lexer.lex('123abc'))
+
+    def test_unanchored(self):
+        unanchored = tdparser_lexer._unanchored
+        self.assertEqual(r'a', unanchored(re.compile(r'^a')).pattern)
+        self.assertEqual(r'(?x)a', unanchored(re.compile(r'(?x)\Aa')).pattern)
+        # Anchors on a single branch, or matching after newlines, are kept.
+        self.assertEqual(r'^a|b', unanchored(re.compile(r'^a|b')).pattern)
+        self.assertEqual(r'^a', unanchored(re.compile(r'^a', re.M)).pattern)
+        self.assertEqual(r'a^', unanchored(re.compile(r'a^')).pattern)
+
+    def test_lex_long_text(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+        lexer = tdparser.Lexer(with_parens=False)
+        lexer.register_token(AToken)
+        tokens = list(lexer.lex('aaa ' * 10000))
+        self.assertEqual(10001, len(tokens))
+        self.assertEqual(['aaa'] * 10000, [t.text for t in tokens[:-1]])
+
+
+class LexColumnarTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class AToken(tdparser.Token):
+            regexp = r'a+'
+
+        class BToken(tdparser.Token):
+            regexp = r'b+'
+
+        self.AToken, self.BToken = AToken, BToken
+        self.lexer = tdparser.Lexer(with_parens=True)
+        self.lexer.register_tokens(AToken, BToken)
+        self.lexer.register_token(AToken, r'c')
+
+    def test_empty(self):
+        tokens = self.lexer.lex_columnar('  ')
+        self.assertEqual(0, len(tokens))
+        self.assertEqual([], list(tokens))
+
+    def test_arrays(self):
+        tokens = self.lexer.lex_columnar('(aa b)c')
+        self.assertEqual(5, len(tokens))
+        self.assertEqual(
+            [tdparser.LeftParen, tdparser.RightParen, self.AToken, self.BToken],
+            tokens.token_classes)
+        self.assertEqual([0, 2, 3, 1, 2], list(tokens.kinds))
+        self.assertEqual([0, 1, 4, 5, 6], list(tokens.starts))
+        self.assertEqual([1, 3, 5, 6, 7], list(tokens.ends))
+        self.assertEqual(self.BToken, tokens.token_class(2))
+        self.assertEqual('aa', tokens.token_text(1))
+
+    def test_materialize(self):
+        text = '(aa b)c'
+        expected = list(self.lexer.lex(text))[:-1]
+        tokens = self.lexer.lex_columnar(text)
+
+        def describe(token_list):
+            return [(t.__class__, t.text, t.start, t.end) for t in token_list]
+
+        self.assertEqual(describe(expected), describe(tokens))
+        self.assertEqual(describe(expected[-1:]), describe([tokens[-1]]))
+        self.assertEqual(describe(expected[1:3]), describe(tokens[1:3]))
+
+    def test_invalid_char(self):
+        with self.assertRaises(tdparser.LexerError) as cm:
+            self.lexer.lex_columnar('aa d')
+        self.assertEqual(3, cm.exception.position)
+
+
+class LexStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Power(tdparser.Token):
+            regexp = r'\*\*'
+
+        class Mult(tdparser.Token):
+            regexp = r'\*'
+
+        class Word(tdparser.Token):
+            regexp = r'\w+'
+
+        class String(tdparser.Token):
+            regexp = r'"[^"]*"'
+
+        class Quote(tdparser.Token):
+            regexp = r'"'
+
+        self.lexer = tdparser.Lexer(with_parens=True)
+        self.lexer.register_tokens(Power, Mult, Word, String, Quote)
+        self.lexer.register_trivia(r'#[^\n]*')
+        self.lexer.register_trivia(r'\n')
+
+    def describe(self, tokens):
+        return [(t.__class__, t.text, t.start, t.end) for t in tokens]
+
+    def assertSameTokens(self, text, chunk_sizes=(1, 2, 3, 5, 100)):
+        expected = self.describe(self.lexer.lex(text))
+        for chunk_size in chunk_sizes:
+            stream = io.StringIO(text)
+            self.assertEqual(expected,
+                self.describe(self.lexer.lex_stream(stream, chunk_size)))
+
+    def test_empty(self):
+        self.assertSameTokens('')
+
+    def test_straddling_tokens(self):
+        self.assertSameTokens('foo ** bar***baz (*)')
+        self.assertSameTokens('a_very_long_identifier**another_long_one')
+
+    def test_straddling_trivia(self):
+        self.assertSameTokens('foo # a comment\n# another\nbar  # final')
+
+    def test_lookahead(self):
+        # Strings are only matched with their closing quote, when at least
+        # as many characters as the string are available.
+        self.assertSameTokens('"a" "b c d" ** "', chunk_sizes=(7, 8, 100))
+
+    def test_long_tokens(self):
+        # Without the Quote token, strings longer than the chunks are found
+        # by reading more text.
+        class String(tdparser.Token):
+            regexp = r'"[^"]*"'
+
+        self.lexer = tdparser.Lexer(with_parens=True)
+        self.lexer.register_tokens(String)
+        self.assertSameTokens('("%s") ("a")' % ('x' * 40), chunk_sizes=(1, 3, 16, 100))
+
+        # Up to max_token_size characters
+        stream = io.StringIO('("%s")' % ('x' * 40))
+        with self.assertRaises(tdparser.LexerError) as cm:
+            list(self.lexer.lex_stream(stream, 4, max_token_size=16))
+        self.assertEqual(1, cm.exception.position)
+
+    def test_blank_started_tokens(self):
+        class Suffix(tdparser.Token):
+            regexp = r'\s+x'
+
+        self.lexer = tdparser.Lexer()
+        self.lexer.register_tokens(Suffix)
+        self.assertSameTokens('  x', chunk_sizes=(1, 2, 100))
+        self.assertSameTokens(' x   x', chunk_sizes=(1, 2, 100))
+
+    def test_invalid_char(self):
+        for chunk_size in (1, 3, 100):
+            stream = io.StringIO('foo ** bar $ baz')
+            with self.assertRaises(tdparser.LexerError) as cm:
+                list(self.lexer.lex_stream(stream, chunk_size))
+            self.assertEqual(11, cm.exception.position)
+
+    def test_invalid_char_read_ahead(self):
+        stream = io.StringIO('$' + 'foo ' * 10000)
+        with self.assertRaises(tdparser.LexerError) as cm:
+            list(self.lexer.lex_stream(stream, 10, max_token_size=40))
+        self.assertEqual(0, cm.exception.position)
+        self.assertLessEqual(stream.tell(), 50)
+        self.assertLess(len(str(cm.exception)), 100)
+
+    def test_lex_file(self):
+        text = 'foo ** (bar * "\u00e9t\u00e9")\n# comment\n'
+        expected = self.describe(self.lexer.lex(text))
+        fd, path = tempfile.mkstemp()
+        try:
+            with io.open(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            self.assertEqual(expected, self.describe(
+                self.lexer.lex_file(path, encoding='utf-8', chunk_size=4)))
+        finally:
+            os.remove(path)
+
+
+class RelexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Power(tdparser.Token):
+            regexp = r'\*\*'
+
+        class Mult(tdparser.Token):
+            regexp = r'\*'
+
+        class Word(tdparser.Token):
+            regexp = r'\w+'
+
+        class String(tdparser.Token):
+            # Unterminated strings end with the line.
+            regexp = r'"[^"\n]*"?'
+
+        self.lexer = tdparser.Lexer(with_parens=True)
+        self.lexer.register_tokens(Power, Mult, Word, String)
+        self.lexer.register_trivia(r'#[^\n]*')
+        self.lexer.register_trivia(r'\n')
+
+    def describe(self, tokens):
+        return [(t.__class__, t.text, t.start, t.end) for t in tokens]
+
+    def relex(self, text, offset, removed, inserted):
+        """Apply an edit to a text, checking relex() against lex()."""
+        tokens = list(self.lexer.lex(text))
+        old_tokens = list(tokens)
+        new_text = text[:offset] + inserted + text[offset + removed:]
+        new_tokens = self.lexer.relex(tokens, new_text, offset, removed, inserted)
+        self.assertIs(tokens, new_tokens)
+        self.assertEqual(self.describe(self.lexer.lex(new_text)),
+            self.describe(new_tokens))
+        return old_tokens, new_tokens
+
+    def test_simple_edits(self):
+        text = 'foo ** (bar * baz) # comment\nqux'
+        self.relex(text, 0, 0, 'x')
+        self.relex(text, 3, 0, '1')
+        self.relex(text, 3, 1, '')
+        self.relex(text, 5, 1, '')
+        self.relex(text, 8, 3, 'a * b')
+        self.relex(text, 20, 0, '"')
+        self.relex(text, len(text), 0, ' ** 2')
+        self.relex(text, 0, len(text), 'a')
+        self.relex('', 0, 0, 'a b')
+
+    def test_resync(self):
+        text = ' '.join(['foo * bar'] * 100)
+        tokens, new_tokens = self.relex(text, 10, 3, 'quux')
+        # Tokens before and after the edit are reused.
+        self.assertIs(tokens[0], new_tokens[0])
+        self.assertIs(tokens[-1], new_tokens[-1])
+        self.assertIs(tokens[10], new_tokens[10])
+        self.assertEqual(len(text) + 1, new_tokens[-1].start)
+
+    def test_edits_changing_following_tokens(self):
+        # Opening a string or a comment changes all tokens up to its end.
+        self.relex('a "b" c "d" e', 2, 1, '')
+        self.relex('a * b\nc * d\ne', 2, 0, '#')
+        self.relex('a * b\nc * d\ne', 5, 1, '')
+
+    def test_random_edits(self):
+        rand = random.Random(42)
+        alphabet = 'ab *()"#\n'
+        for _ in range(500):
+            text = ''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 30)))
+            inserted = ''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 4)))
+            offset = rand.randint(0, len(text))
+            removed = rand.randint(0, len(text) - offset)
+            self.relex(text, offset, removed, inserted)
+
+    def test_invalid_char(self):
+        tokens = list(self.lexer.lex('foo bar'))
+        with self.assertRaises(tdparser.LexerError) as cm:
+            self.lexer.relex(tokens, 'foo $ bar', 4, 0, '$ ')
+        self.assertEqual(4, cm.exception.position)
+        # The previous tokens are left untouched.
+        self.assertEqual(4, tokens[1].start)
+
+
+class KeywordsTestCase(unittest.TestCase):
+    """Tests for the promotion of identifiers to keyword tokens."""
+
+    def setUp(self):
+        class If(tdparser.Token):
+            pass
+
+        class Else(tdparser.Token):
+            pass
+
+        class Name(tdparser.Token):
+            regexp = r'[a-z]+'
+            keywords = {'if': If, 'else': Else}
+
+        self.If, self.Else, self.Name = If, Else, Name
+        self.lexer = tdparser.Lexer()
+        self.lexer.register_token(Name)
+
+    def describe(self, tokens):
+        return [(t.__class__, t.text, t.start, t.end) for t in tokens]
+
+    def test_lex(self):
+        self.assertEqual(
+            [(self.If, 'if', 0, 2), (self.Name, 'iff', 3, 6),
+                (self.Else, 'else', 7, 11), (tdparser.EndToken, '', 11, 11)],
+            self.describe(self.lexer.lex('if iff else')))
+
+    def test_columnar(self):
+        tokens = self.lexer.lex_columnar('x if else')
+        self.assertEqual([self.Name, self.If, self.Else],
+            [tokens.token_class(i) for i in range(len(tokens))])
+        self.assertEqual(set([self.Name, self.If, self.Else]), set(tokens.token_classes))
+
+    def test_stream(self):
+        text = ' '.join(['if x else y'] * 100)
+        self.assertEqual(self.describe(self.lexer.lex(text)),
+            self.describe(self.lexer.lex_stream(io.StringIO(text), 7)))
+
+    def test_relex(self):
+        text = 'x if y'
+        tokens = list(self.lexer.lex(text))
+        new_tokens = self.lexer.relex(tokens, 'x iff y', 4, 0, 'f')
+        self.assertEqual(self.describe(self.lexer.lex('x iff y')),
+            self.describe(new_tokens))
+        self.assertEqual(self.Name, new_tokens[1].__class__)
+
 
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
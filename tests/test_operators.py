@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for operator tables."""
+
+import operator
+import sys
+
+from .compat import unittest
+
+import tdparser
+
+
+class OperatorTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        table = tdparser.OperatorTable()
+        table.atom(r'\d+', int, name='Integer')
+        table.infix_left(r'\+', 10, operator.add, name='Add')
+        minus = table.infix_left(r'-', 10, operator.sub, name='Minus')
+        table.prefix(minus, 100, operator.neg)
+        table.infix_left(r'\*', 20, operator.mul, name='Mult')
+        table.infix_right(r'\^', 30, operator.pow, name='Power')
+        table.postfix(r'!', 40, lambda n: n * 10, name='Tenfold')
+        table.group(r'\(', r'\)', name='LeftBracket', closing_name='RightBracket')
+        self.table = table
+
+        self.lexer = tdparser.Lexer(parser_class=table.parser)
+        self.lexer.register_tokens(*table.token_classes)
+
+    def test_token_classes(self):
+        self.assertEqual(
+            ['Integer', 'Add', 'Minus', 'Mult', 'Power', 'Tenfold',
+                'RightBracket', 'LeftBracket'],
+            [token_class.__name__ for token_class in self.table.token_classes])
+        self.assertEqual(r'\+', self.table.token_classes[1].regexp)
+
+    def test_parse(self):
+        self.assertEqual(7, self.lexer.parse('1 + 2 * 3'))
+        self.assertEqual(9, self.lexer.parse('(1 + 2) * 3'))
+        self.assertEqual(-4, self.lexer.parse('1 - 2 - 3'))
+        self.assertEqual(-5, self.lexer.parse('1 + -2 * 3'))
+        self.assertEqual(2 ** 9, self.lexer.parse('2 ^ 3 ^ 2'))
+        self.assertEqual(2 ** 30, self.lexer.parse('2 ^ 3!'))
+        self.assertEqual(300, self.lexer.parse('3!!'))
+
+    def test_same_results_with_other_parsers(self):
+        texts = ['1 + 2 * 3', '(1 + 2) * 3', '1 - -2 - 3', '2 ^ 3 ^ 2 * 2!']
+        for parser_class in (tdparser.Parser, tdparser.IterativeParser):
+            self.lexer.parser_class = parser_class
+            for text in texts:
+                self.assertEqual(
+                    tdparser.Lexer.parse(self.lexer, text),
+                    self.table.parser(self.lexer.lex(text)).parse())
+
+    def test_custom_tokens(self):
+        class Variable(tdparser.Token):
+            regexp = r'[a-z]+'
+
+            def nud(self, context):
+                return 'var:' + self.text
+
+        class Call(tdparser.Token):
+            regexp = r':'
+            lbp = 50
+
+            def led(self, left, context):
+                return (left, context.expression(50))
+
+        self.table.infix_left(r'\.', 60, lambda a, b: '%s.%s' % (a, b))
+        self.lexer.register_tokens(Variable, Call, self.table.token_classes[-1])
+        self.assertEqual(('var:a', 'var:b.var:c'), self.lexer.parse('a:b.c'))
+
+    def test_errors(self):
+        self.assertRaises(tdparser.MissingTokensError, self.lexer.parse, '1 +')
+        self.assertRaises(tdparser.InvalidTokenError, self.lexer.parse, '(1 + 2')
+        self.assertRaises(tdparser.InvalidTokenError, self.lexer.parse, '(1 2)')
+        self.assertRaises(tdparser.InvalidTokenError, self.lexer.parse, '1 2')
+        self.assertRaises(tdparser.InvalidTokenError, self.lexer.parse, ')')
+
+    def test_parse_recovering(self):
+        class Semicolon(tdparser.Token):
+            regexp = r';'
+
+        self.lexer.register_token(Semicolon)
+        results, errors = self.lexer.parse_recovering('1 + ; 2 $ ; (1 2) ; 3 * 2',
+            sync_tokens=(Semicolon,))
+        self.assertEqual([6], results)
+        self.assertEqual(
+            [tdparser.InvalidTokenError, tdparser.LexerError, tdparser.InvalidTokenError],
+            [error.__class__ for error in errors])
+
+    def test_deep_nesting(self):
+        depth = 5 * sys.getrecursionlimit()
+        self.assertEqual(1, self.lexer.parse('(' * depth + '1' + ')' * depth))
+        self.assertEqual(1, self.lexer.parse('^'.join(['1'] * depth)))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
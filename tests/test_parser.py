@@ -5,10 +5,13 @@
 
 """Tests for token-related code."""
 
+import random
+import sys
 
 from .compat import unittest
 
 import tdparser
+from tdparser import operators
 
 
 class BaseParserTestCase(unittest.TestCase):
@@ -36,6 +39,32 @@ class BaseParserTestCase(unittest.TestCase):
         parser = tdparser.Parser([NumToken('0'), NumToken('1'), tdparser.EndToken()])
         self.assertRaises(tdparser.InvalidTokenError, parser.parse)
 
+    def test_tokens_without_offsets(self):
+        # Tokens built without calling Token.__init__ have no text or offsets.
+        class Integer(tdparser.Token):
+            def __init__(self, text):
+                self.value = int(text)
+
+            def nud(self, context):
+                return self.value
+
+        def table_parser(tokens):
+            return operators.TableParser(tokens, operators.OperatorTable())
+
+        for parser_class in (tdparser.Parser, tdparser.IterativeParser,
+                tdparser.IncrementalParser, table_parser):
+            parser = parser_class([Integer('1'), Integer('2'), tdparser.EndToken()])
+            with self.assertRaises(tdparser.InvalidTokenError) as context:
+                parser.parse()
+            self.assertIsNone(context.exception.position)
+
+            parser = parser_class([Integer('1')])
+            with self.assertRaises(tdparser.MissingTokensError):
+                parser.parse()
+
+            parser = parser_class([Integer('1'), Integer('2')])
+            self.assertRaises(tdparser.InvalidTokenError, parser.consume, tdparser.EndToken)
+
     def test_consume_no_expect(self):
         a = tdparser.Token('a')
         b = tdparser.Token('b')
@@ -273,5 +302,303 @@ class AdvancedParserTestCase(unittest.TestCase):
             res)
 
 
+class DeclarativeTokensMixin(object):
+    """Tokens declaring their binding behavior."""
+
+    def setUp(self):
+        class Integer(tdparser.Token):
+            def nud(self, context):
+                return int(self.text)
+
+        class Plus(tdparser.Token):
+            lbp = 10
+            rbp = 10
+
+            def apply_infix(self, left, right):
+                return left + right
+
+        class Minus(tdparser.Token):
+            lbp = 10
+            rbp = 10
+            prefix_rbp = 100
+
+            def apply_prefix(self, operand):
+                return -operand
+
+            def apply_infix(self, left, right):
+                return left - right
+
+        class Power(tdparser.Token):
+            lbp = 30
+            rbp = 29
+
+            def apply_infix(self, left, right):
+                return ('**', left, right)
+
+        class Factorial(tdparser.Token):
+            lbp = 40
+            postfix = True
+
+            def apply_postfix(self, operand):
+                return ('!', operand)
+
+        class Call(tdparser.Token):
+            """A token with a custom led, calling context.expression()."""
+            lbp = 50
+
+            def led(self, left, context):
+                arg = context.expression()
+                context.consume(tdparser.RightParen)
+                return ('call', left, arg)
+
+        class Separator(tdparser.Token):
+            pass
+
+        self.tokens = {
+            ';': Separator,
+            '+': Plus,
+            '-': Minus,
+            '**': Power,
+            '!': Factorial,
+            '(': tdparser.LeftParen,
+            ')': tdparser.RightParen,
+            'call(': Call,
+            '?': tdparser.ErrorToken,
+        }
+        self.Integer = Integer
+        self.Separator = Separator
+
+    def tokenize(self, text):
+        tokens = []
+        for word in text.split():
+            token_class = self.tokens.get(word, self.Integer)
+            tokens.append(token_class(word))
+        tokens.append(tdparser.EndToken())
+        return tokens
+
+    def parse(self, text):
+        return self.parser_class(self.tokenize(text)).parse()
+
+    def test_infix(self):
+        self.assertEqual(6, self.parse('1 + 2 + 3'))
+        self.assertEqual(-4, self.parse('1 - 2 - 3'))
+
+    def test_prefix(self):
+        self.assertEqual(-1, self.parse('- 1'))
+        self.assertEqual(1, self.parse('- - 1'))
+        self.assertEqual(-3, self.parse('- 1 - 2'))
+
+    def test_right_associative(self):
+        self.assertEqual(('**', 1, ('**', 2, 3)), self.parse('1 ** 2 ** 3'))
+        self.assertEqual(('**', 1, 2), self.parse('( 1 ** 2 )'))
+
+    def test_postfix(self):
+        self.assertEqual(('**', 2, ('!', 3)), self.parse('2 ** 3 !'))
+        self.assertEqual(('!', ('!', 3)), self.parse('3 ! !'))
+
+    def test_groups(self):
+        self.assertEqual(-4, self.parse('1 - ( 2 + 3 )'))
+        self.assertEqual(3, self.parse('( ( ( 3 ) ) )'))
+
+    def test_custom_led(self):
+        self.assertEqual(('call', 1, 5), self.parse('1 call( 2 + 3 )'))
+
+    def test_errors(self):
+        self.assertRaises(tdparser.MissingTokensError, self.parse, '1 +')
+        self.assertRaises(tdparser.InvalidTokenError, self.parse, '( 1')
+        self.assertRaises(tdparser.InvalidTokenError, self.parse, '( 1 ( 2')
+        self.assertRaises(tdparser.InvalidTokenError, self.parse, '1 2')
+        self.assertRaises(tdparser.InvalidTokenError, self.parse, '!')
+
+    def parse_sequence(self, text, separator=None):
+        parser = self.parser_class(self.tokenize(text))
+        return list(parser.parse_sequence(separator))
+
+    def test_parse_sequence(self):
+        self.assertEqual([3, -3, 4],
+            self.parse_sequence('1 + 2 ; - 3 ; 4', self.Separator))
+        self.assertEqual([3, 4],
+            self.parse_sequence('; 1 + 2 ; ; 4 ;', self.Separator))
+        self.assertEqual([], self.parse_sequence('', self.Separator))
+        self.assertEqual([], self.parse_sequence('; ;', self.Separator))
+
+    def test_parse_sequence_without_separator(self):
+        self.assertEqual([3, ('!', 3), -4], self.parse_sequence('1 + 2 3 ! ( - 4 )'))
+        self.assertEqual([], self.parse_sequence(''))
+
+    def test_parse_sequence_errors(self):
+        self.assertRaises(tdparser.InvalidTokenError,
+            self.parse_sequence, '1 2 ; 3', self.Separator)
+        self.assertRaises(tdparser.MissingTokensError,
+            self.parse_sequence, '1 ; 2 +', self.Separator)
+
+
+    def parse_recovering(self, text, sync_tokens=()):
+        parser = self.parser_class(self.tokenize(text))
+        results, errors = parser.parse_recovering(sync_tokens)
+        return results, [error.__class__ for error in errors]
+
+    def test_parse_recovering(self):
+        self.assertEqual(([3, 4], []),
+            self.parse_recovering('1 + 2 ; ; 4 ;', (self.Separator,)))
+        self.assertEqual(([2, 4], [tdparser.InvalidTokenError, tdparser.InvalidTokenError,
+                tdparser.MissingTokensError]),
+            self.parse_recovering('1 2 3 ; 2 ; 1 + ; 4 ; 5 +', (self.Separator,)))
+        self.assertEqual(([3], [tdparser.InvalidTokenError]),
+            self.parse_recovering('( 1 ( 2 ; 1 + 2', (self.Separator,)))
+
+    def test_parse_recovering_error_tokens(self):
+        self.assertEqual(([1, 3], [tdparser.InvalidTokenError] * 4),
+            self.parse_recovering('1 ; 2 + ? ; ? ; - ? ? ; 3', (self.Separator,)))
+
+    def test_parse_recovering_without_sync_tokens(self):
+        self.assertEqual(([3, 1], []), self.parse_recovering('1 + 2 1'))
+        self.assertEqual(([3], [tdparser.InvalidTokenError]),
+            self.parse_recovering('1 + 2 ( 1 ; 2'))
+
+class DeclarativeTokensTestCase(DeclarativeTokensMixin, unittest.TestCase):
+    parser_class = tdparser.Parser
+
+
+class IterativeParserTestCase(DeclarativeTokensMixin, unittest.TestCase):
+    parser_class = tdparser.IterativeParser
+
+    def test_deep_groups(self):
+        depth = 5 * sys.getrecursionlimit()
+        self.assertEqual(3, self.parse('( ' * depth + '3' + ' )' * depth))
+
+    def test_long_right_associative_chain(self):
+        length = 5 * sys.getrecursionlimit()
+        result = self.parse(' ** '.join(['2'] * length))
+        for _i in range(length - 1):
+            self.assertEqual('**', result[0])
+            result = result[2]
+        self.assertEqual(2, result)
+
+    def test_deep_prefix(self):
+        depth = 5 * sys.getrecursionlimit()
+        self.assertEqual(3, self.parse('- ' * depth + '3'))
+
+
+class IncrementalParserTestCase(DeclarativeTokensMixin, unittest.TestCase):
+    parser_class = tdparser.IncrementalParser
+
+    def edit(self, tokens, start, stop, text):
+        """Replace tokens[start:stop] with the tokens of a text.
+
+        Other tokens are kept, and those after the edit count one more edit,
+        as Lexer.relex() does.
+        """
+        for token in tokens[stop:]:
+            token._edits = getattr(token, '_edits', 0) + 1
+        return tokens[:start] + self.tokenize(text)[:-1] + tokens[stop:]
+
+    def assertSameResults(self, tokens, subtrees):
+        """Check an incremental parse against a full parse."""
+        expected = tdparser.Parser(tokens).parse()
+        parser = tdparser.IncrementalParser(tokens, subtrees)
+        self.assertEqual(expected, parser.parse())
+        return parser
+
+    # The following texts only use operators building tuples, whose values
+    # can be compared with a full parse.
+
+    def test_reuse(self):
+        text = '( 1 ** 2 ) ** ( 3 ! ** ( 4 ** 5 ) ) call( 6 ** 7 ) ! ** 8'
+        tokens = self.tokenize(text)
+        parser = self.assertSameResults(tokens, None)
+        self.assertEqual(0, parser.reused)
+
+        # Replace the 8
+        tokens = self.edit(tokens, 23, 24, '9 !')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        # The groups ( 1 ** 2 ) and ( 3 ! ** ( 4 ** 5 ) ), and the call( 6 ** 7 )
+        # and ! applied to the latter are reused.
+        self.assertEqual(4, parser.reused)
+
+        # Unchanged tokens
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        self.assertEqual(1, parser.reused)
+
+    def test_reused_values(self):
+        tokens = self.tokenize('( 1 ** 2 ) ** ( 3 ** 4 )')
+        parser = tdparser.IncrementalParser(tokens)
+        parser.parse()
+        first = parser.subtrees[tokens[1], 0][-1]
+        self.assertEqual(('**', 1, 2), first)
+
+        tokens = self.edit(tokens, 6, 11, '5')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        self.assertIs(first, parser.subtrees[tokens[1], 0][-1])
+
+    def test_edit_between_reused_tokens(self):
+        tokens = self.tokenize('( 1 ** ( 2 ** 3 ) ) ** 4')
+        parser = self.assertSameResults(tokens, None)
+
+        # The groups keep their first and last tokens, and their length.
+        tokens = self.edit(tokens, 4, 5, '5')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        parser = tdparser.IncrementalParser(tokens, parser.subtrees)
+        self.assertEqual(('**', ('**', 1, ('**', 5, 3)), 4), parser.parse())
+
+    def test_left_associative_chain(self):
+        tokens = self.tokenize(' + '.join(['1'] * 200))
+        parser = self.assertSameResults(tokens, None)
+
+        # Replace the last operand: the previous additions are reused.
+        tokens = self.edit(tokens, 398, 399, '2')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        self.assertEqual(1 + 198, parser.reused)
+
+        # Replace the first operand: all additions depend on it, only the
+        # nud() of the other operands are reused.
+        tokens = self.edit(tokens, 0, 1, '2')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        self.assertEqual(199, parser.reused)
+
+    def test_right_associative_chain(self):
+        tokens = self.tokenize(' ** '.join(['1'] * 200))
+        parser = self.assertSameResults(tokens, None)
+
+        # Replace the last operand: only the nud() of the other operands are
+        # reused, as each right operand contains the edit.
+        tokens = self.edit(tokens, 398, 399, '2')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        self.assertEqual(199, parser.reused)
+
+        # Replace the first operand: its right operand is reused.
+        tokens = self.edit(tokens, 0, 1, '3')
+        parser = self.assertSameResults(tokens, parser.subtrees)
+        self.assertEqual(1, parser.reused)
+
+    def test_random_edits(self):
+        rand = random.Random(42)
+        words = ['1', '2', '**', '!', '(', ')', 'call(']
+        subtrees = {}
+        tokens = self.tokenize('1')
+        for _ in range(2000):
+            start = rand.randint(0, len(tokens) - 1)
+            stop = rand.randint(start, min(len(tokens) - 1, start + 3))
+            text = ' '.join(rand.choice(words) for _ in range(rand.randint(0, 3)))
+            new_tokens = self.edit(tokens, start, stop, text)
+            try:
+                tdparser.Parser(new_tokens).parse()
+            except tdparser.ParserError:
+                # Don't accumulate invalid edits.
+                continue
+            tokens = new_tokens
+            subtrees = self.assertSameResults(tokens, subtrees).subtrees
+
+    def test_prune(self):
+        tokens = self.tokenize('( 1 ** 2 ) ** ( 3 ** 4 )')
+        parser = tdparser.IncrementalParser(tokens)
+        parser.parse()
+        for _ in range(10):
+            tokens = self.tokenize('( 1 ** 2 ) ** ( 3 ** 4 )')
+            parser = tdparser.IncrementalParser(tokens, parser.subtrees)
+            parser.parse()
+        self.assertTrue(len(parser.subtrees) <= 5 * len(tokens))
+
+
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This code is distributed under the two-clause BSD license.
+# Copyright (c) 2010-2013 Raphaël Barrois
+
+"""Tests for profiling."""
+
+import operator
+import sys
+
+from .compat import unittest
+
+import tdparser
+from tdparser import lexer as tdparser_lexer
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Integer(tdparser.Token):
+            regexp = r'\d+'
+
+            def nud(self, context):
+                return int(self.text)
+
+        class Addition(tdparser.Token):
+            regexp = r'\+'
+            lbp = 10
+
+            def led(self, left, context):
+                return left + context.expression(self.lbp)
+
+        class Word(tdparser.Token):
+            regexp = r'\w+'
+
+        self.Integer = Integer
+        self.Addition = Addition
+        self.Word = Word
+        self.lexer = tdparser.Lexer(with_parens=True)
+        self.lexer.register_tokens(Integer, Addition, Word)
+
+    def test_counts(self):
+        profiler = tdparser.Profiler()
+        with profiler.profile(self.lexer):
+            self.assertEqual(6, self.lexer.parse('1 + (2 + 3)'))
+
+        integer = profiler.tokens[self.Integer]
+        # Integer and Word may match at each digit.
+        self.assertEqual(3, integer.attempts)
+        self.assertEqual(3, integer.matches)
+        self.assertEqual(3, integer.instances)
+        self.assertEqual(3, integer.nud_calls)
+        self.assertEqual(0, integer.led_calls)
+        self.assertEqual(3, profiler.tokens[self.Word].attempts)
+        self.assertEqual(3, profiler.tokens[self.Word].matches)
+        self.assertEqual(0, profiler.tokens[self.Word].instances)
+
+        addition = profiler.tokens[self.Addition]
+        self.assertEqual(2, addition.attempts)
+        self.assertEqual(2, addition.led_calls)
+        self.assertEqual(1, profiler.tokens[tdparser.LeftParen].nud_calls)
+
+        for stats in profiler.tokens.values():
+            self.assertTrue(stats.match_time >= 0)
+            self.assertTrue(stats.nud_time >= 0)
+            self.assertTrue(stats.led_time >= 0)
+
+    def test_nested_time(self):
+        clock = [0]
+
+        class Integer(tdparser.Token):
+            regexp = r'\d+'
+
+            def nud(self, context):
+                clock[0] += 10
+                return int(self.text)
+
+        class Addition(tdparser.Token):
+            regexp = r'\+'
+            lbp = 10
+
+            def led(self, left, context):
+                clock[0] += 1
+                return left + context.expression(self.lbp)
+
+        lexer = tdparser.Lexer()
+        lexer.register_tokens(Integer, Addition)
+        profiler = tdparser.Profiler(timer=lambda: clock[0])
+        with profiler.profile(lexer):
+            self.assertEqual(6, lexer.parse('1 + 2 + 3'))
+
+        # The time of nested nud() calls isn't included in led() times.
+        self.assertEqual(30, profiler.tokens[Integer].nud_time)
+        self.assertEqual(2, profiler.tokens[Addition].led_time)
+
+    def test_profile_restores_lexer(self):
+        registry = self.lexer.tokens
+        nud = self.Integer.__dict__['nud']
+        profiler = tdparser.Profiler()
+        with profiler.profile(self.lexer):
+            tokens = list(self.lexer.lex('1 + 2'))
+        self.assertIs(registry, self.lexer.tokens)
+        self.assertIs(self.Integer, tokens[0].__class__)
+        self.assertIs(nud, self.Integer.__dict__['nud'])
+        self.assertNotIn('led', self.Integer.__dict__)
+        self.assertNotIn('__init__', self.Integer.__dict__)
+
+    def test_same_results(self):
+        text = '1 + (2 + 3) + 4'
+        for parser_class in (tdparser.Parser, tdparser.IterativeParser,
+                tdparser.IncrementalParser):
+            self.lexer.parser_class = parser_class
+            profiler = tdparser.Profiler()
+            with profiler.profile(self.lexer):
+                self.assertEqual(10, self.lexer.parse(text))
+                self.assertEqual(['1', '+', '2'], [
+                    self.lexer.lex_columnar('1 + 2').token_text(i) for i in range(3)])
+            self.assertEqual(4, profiler.tokens[self.Integer].nud_calls)
+
+    def test_compiled_registry(self):
+        lexer = tdparser.Lexer(registry_class=tdparser_lexer.CompiledTokenRegistry)
+        lexer.register_tokens(self.Integer, self.Addition)
+        profiler = tdparser.Profiler()
+        with profiler.profile(lexer):
+            self.assertEqual(3, lexer.parse('1 + 2'))
+        self.assertEqual(2, profiler.tokens[self.Integer].matches)
+
+    def test_operator_table(self):
+        table = tdparser.OperatorTable()
+        integer = table.atom(r'\d+', int, name='Integer')
+        table.infix_left(r'\+', 10, operator.add, name='Addition')
+        lexer = tdparser.Lexer(parser_class=table.parser)
+        lexer.register_tokens(*table.token_classes)
+
+        profiler = tdparser.Profiler()
+        with profiler.profile(lexer):
+            self.assertEqual(6, lexer.parse('1 + 2 + 3'))
+        self.assertEqual(3, profiler.tokens[integer].instances)
+
+    def test_operator_table_groups(self):
+        # Table parsers look operators up by the class of tokens.
+        table = tdparser.OperatorTable()
+        table.atom(r'\d+', int, name='Integer')
+        table.group(r'\(', r'\)', name='LeftBracket', closing_name='RightBracket')
+        lexer = tdparser.Lexer(parser_class=table.parser)
+        lexer.register_tokens(*table.token_classes)
+
+        depth = 3 * sys.getrecursionlimit()
+        profiler = tdparser.Profiler()
+        with profiler.profile(lexer):
+            self.assertEqual(1, lexer.parse('(' * depth + '1' + ')' * depth))
+        classes = dict((token_class.__name__, token_class)
+            for token_class in table.token_classes)
+        self.assertEqual(depth, profiler.tokens[classes['LeftBracket']].instances)
+
+    def test_inherited_methods(self):
+        class Negative(self.Integer):
+            regexp = r'-\d+'
+
+        self.lexer.register_token(Negative)
+        profiler = tdparser.Profiler()
+        with profiler.profile(self.lexer):
+            self.assertEqual(-1, self.lexer.parse('1 + -2'))
+        self.assertEqual(1, profiler.tokens[self.Integer].nud_calls)
+        self.assertEqual(1, profiler.tokens[Negative].nud_calls)
+        self.assertNotIn('nud', Negative.__dict__)
+
+    def test_keywords(self):
+        class Keyword(tdparser.Token):
+            pass
+
+        class Name(tdparser.Token):
+            regexp = r'[a-z]+'
+            keywords = {'if': Keyword}
+
+        lexer = tdparser.Lexer()
+        lexer.register_token(Name)
+        profiler = tdparser.Profiler()
+        with profiler.profile(lexer):
+            tokens = list(lexer.lex('if x if'))
+        self.assertTrue(isinstance(tokens[0], Keyword))
+        self.assertTrue(isinstance(tokens[1], Name))
+        self.assertEqual(2, profiler.tokens[Keyword].instances)
+        self.assertEqual(1, profiler.tokens[Name].instances)
+
+    def test_report(self):
+        profiler = tdparser.Profiler()
+        self.assertEqual(1, len(profiler.report().splitlines()))
+        with profiler.profile(self.lexer):
+            self.lexer.parse('1 + 2')
+        lines = profiler.report().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[0].startswith('token '))
+        self.assertEqual(set(['Integer', 'Addition', 'Word']),
+            set(line.split()[0] for line in lines[1:]))
+
+        profiler.reset()
+        self.assertEqual({}, profiler.tokens)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
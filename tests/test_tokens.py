@@ -24,6 +24,77 @@ class TokenTestCase(unittest.TestCase):
         token = tdparser.EndToken()
         self.assertIn("End", repr(token))
 
+    def test_offsets(self):
+        token = tdparser.Token('foo', 3, 6)
+        self.assertEqual('foo', token.text)
+        self.assertEqual(3, token.start)
+        self.assertEqual(6, token.end)
+
+        token = tdparser.Token('foo')
+        self.assertIsNone(token.start)
+        self.assertIsNone(token.end)
+
+
+class LineIndexTestCase(unittest.TestCase):
+    def test_position(self):
+        lines = tdparser.LineIndex('ab\ncd\n\nef')
+        self.assertEqual((1, 1), lines.position(0))
+        self.assertEqual((1, 3), lines.position(2))
+        self.assertEqual((2, 1), lines.position(3))
+        self.assertEqual((3, 1), lines.position(6))
+        self.assertEqual((4, 2), lines.position(8))
+        self.assertEqual((4, 3), lines.position(9))
+
+    def test_locate(self):
+        error = tdparser.InvalidTokenError("Oops", position=4)
+        self.assertEqual('Oops', str(error))
+        self.assertIs(error, error.locate(tdparser.LineIndex('ab\ncd')))
+        self.assertEqual((2, 2), (error.line, error.column))
+        self.assertEqual('Oops (line 2, column 2)', str(error))
+
+    def test_locate_without_position(self):
+        error = tdparser.MissingTokensError("Oops")
+        error.locate(tdparser.LineIndex('ab\ncd'))
+        self.assertIsNone(error.line)
+
+
+class SlotsTestCase(unittest.TestCase):
+    """Tests for the memory-compact representation of tokens."""
+
+    def test_base_tokens_slotted(self):
+        for token_class in (tdparser.Token, tdparser.EndToken,
+                tdparser.LeftParen, tdparser.RightParen):
+            token = token_class()
+            self.assertFalse(hasattr(token, '__dict__'))
+            with self.assertRaises(AttributeError):
+                token.foo = 1
+
+    def test_subclass_without_slots(self):
+        class Integer(tdparser.Token):
+            def __init__(self, text):
+                super(Integer, self).__init__(text)
+                self.value = int(text)
+
+        token = Integer('42')
+        self.assertEqual(42, token.value)
+        self.assertEqual('42', token.text)
+
+    def test_intern_text(self):
+        class Keyword(tdparser.Token):
+            __slots__ = ()
+            intern_text = True
+
+        text = ''.join(['not', ' in'])
+        token1 = Keyword(text)
+        token2 = Keyword(''.join(['not ', 'in']))
+        self.assertIs(token1.text, token2.text)
+
+    def test_no_intern_text(self):
+        token1 = tdparser.Token(''.join(['not', ' in']))
+        token2 = tdparser.Token(''.join(['not ', 'in']))
+        self.assertEqual(token1.text, token2.text)
+        self.assertIsNot(token1.text, token2.text)
+
 
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()